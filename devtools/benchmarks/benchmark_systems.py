@@ -0,0 +1,45 @@
+"""
+benchmark_systems.py:  The test systems shared by the benchmarks.
+
+"""
+
+import os
+
+import openmm.app as openmm_app
+import openmm.unit as unit
+
+TEMPERATURE = 300.0 * unit.kelvin
+DT = 0.002 * unit.picoseconds
+BOOST_TYPES = ["lower-total", "lower-dihedral", "lower-dual",
+               "lower-nonbonded", "lower-dual-nonbonded-dihedral"]
+
+
+def create_system(pdb_filename=None):
+    """
+        Build the system for a structure in vacuum with amber14.  By default,
+        this is the villin headpiece bundled with OpenMM, with its waters
+        removed.
+
+        :return: The topology, system, and positions.
+    """
+    if pdb_filename is None:
+        data_directory = os.path.join(os.path.dirname(openmm_app.__file__),
+                                      "data")
+        pdb_filename = os.path.join(data_directory, "test.pdb")
+    pdb = openmm_app.PDBFile(pdb_filename)
+    modeller = openmm_app.Modeller(pdb.topology, pdb.positions)
+    modeller.deleteWater()
+    forcefield = openmm_app.ForceField("amber14-all.xml",
+                                       "amber14/tip3pfb.xml")
+    system = forcefield.createSystem(modeller.topology,
+                                     nonbondedMethod=openmm_app.NoCutoff,
+                                     constraints=openmm_app.HBonds)
+    return modeller.topology, system, modeller.positions
+
+
+def add_common_arguments(argparser):
+    argparser.add_argument("--platform", default="CPU")
+    argparser.add_argument("--boost-types", nargs="+", default=BOOST_TYPES)
+    argparser.add_argument("--pdb", default=None,
+                           help="The structure to use instead of the "
+                                "villin headpiece bundled with OpenMM.")
@@ -0,0 +1,143 @@
+"""
+force_evaluations.py:  Benchmark the number of force evaluations per step.
+
+For each boost type, this reports how many times each force group is
+evaluated on a step in each stage, both from the integration program and as
+measured by OpenMM (when PythonForce is available), along with the cost of a
+production step relative to a plain LangevinMiddleIntegrator step, which
+performs exactly one force evaluation.  The fused and unfused modes of the
+integrators are compared side by side.
+
+Usage:
+    python devtools/benchmarks/force_evaluations.py [--platform CPU]
+        [--steps 2000] [--boost-types lower-dual lower-dihedral ...]
+        [--pdb villin.pdb]
+
+"""
+
+import argparse
+import collections
+import copy
+import time
+
+import numpy as np
+import openmm
+import openmm.app as openmm_app
+import openmm.unit as unit
+
+from benchmark_systems import DT, TEMPERATURE, add_common_arguments, \
+    create_system
+from gamd.integrator_factory import GamdIntegratorFactory
+
+STAGE_STEPS = (50, 100, 50, 100)
+NTAVE = 50
+
+
+def create_gamd_simulation(boost_type_str, topology, system, positions,
+                           platform, number_of_production_steps,
+                           count_force_groups=False, fused=True):
+    system = copy.deepcopy(system)
+    ntcmdprep, ntcmd, ntebprep, nteb = STAGE_STEPS
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, system, TEMPERATURE, DT, ntcmdprep, ntcmd, ntebprep,
+        nteb, ntcmd + nteb + number_of_production_steps, NTAVE,
+        fused_force_groups=fused)
+    integrator = result[2]
+    counts = collections.Counter()
+    if count_force_groups:
+        number_of_particles = system.getNumParticles()
+        for group in set(integrator.get_group_dict()) | {0}:
+            def count_evaluation(state, group=group):
+                counts[group] += 1
+                return 0.0, np.zeros((number_of_particles, 3))
+            counting_force = openmm.PythonForce(count_evaluation)
+            counting_force.setForceGroup(group)
+            system.addForce(counting_force)
+    simulation = openmm_app.Simulation(topology, system, integrator, platform)
+    simulation.context.setPositions(positions)
+    simulation.context.setVelocitiesToTemperature(TEMPERATURE, 2021)
+    return simulation, integrator, counts
+
+
+def measure_force_group_evaluations(boost_type_str, topology, system,
+                                    positions, platform, fused=True):
+    simulation, integrator, counts = create_gamd_simulation(
+        boost_type_str, topology, system, positions, platform, 50,
+        count_force_groups=True, fused=fused)
+    results = {}
+    for stage in sorted(integrator.stage_computations):
+        start = getattr(integrator, "stage_%d_start" % stage)
+        end = getattr(integrator, "stage_%d_end" % stage)
+        #
+        # We leave out the first and last step of each stage, since OpenMM
+        # may evaluate the forces for the following step early.
+        #
+        simulation.step(start - simulation.currentStep)
+        counts.clear()
+        simulation.step(end - start - 1)
+        results[stage] = {group: count / (end - start - 1)
+                          for group, count in sorted(counts.items())}
+    return results
+
+
+def time_production_step(boost_type_str, topology, system, positions,
+                         platform, number_of_steps, fused=True):
+    simulation, integrator, unused_counts = create_gamd_simulation(
+        boost_type_str, topology, system, positions, platform,
+        number_of_steps, fused=fused)
+    simulation.step(integrator.stage_5_start - 1)
+    start_time = time.perf_counter()
+    simulation.step(number_of_steps)
+    return (time.perf_counter() - start_time) / number_of_steps
+
+
+def time_reference_step(topology, system, positions, platform,
+                        number_of_steps):
+    integrator = openmm.LangevinMiddleIntegrator(TEMPERATURE,
+                                                 1.0 / unit.picoseconds, DT)
+    simulation = openmm_app.Simulation(topology, copy.deepcopy(system),
+                                       integrator, platform)
+    simulation.context.setPositions(positions)
+    simulation.context.setVelocitiesToTemperature(TEMPERATURE, 2021)
+    simulation.step(100)
+    start_time = time.perf_counter()
+    simulation.step(number_of_steps)
+    return (time.perf_counter() - start_time) / number_of_steps
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_common_arguments(argparser)
+    argparser.add_argument("--steps", type=int, default=2000,
+                           help="The number of production steps to time.")
+    args = argparser.parse_args()
+
+    platform = openmm.Platform.getPlatformByName(args.platform)
+    topology, system, positions = create_system(args.pdb)
+    reference_time = time_reference_step(topology, system, positions,
+                                         platform, args.steps)
+    print("LangevinMiddleIntegrator: %.3f ms/step" % (reference_time * 1000))
+
+    for boost_type_str in args.boost_types:
+        for fused in (True, False):
+            mode = "fused" if fused else "unfused"
+            unused_simulation, integrator, unused_counts = \
+                create_gamd_simulation(boost_type_str, topology, system,
+                                       positions, platform, 1, fused=fused)
+            print("\n%s (%s)" % (boost_type_str, mode))
+            print("  program:  %s" %
+                  integrator.get_force_group_evaluations_per_step())
+            if hasattr(openmm, "PythonForce"):
+                print("  measured: %s" % measure_force_group_evaluations(
+                    boost_type_str, topology, system, positions, platform,
+                    fused))
+            step_time = time_production_step(boost_type_str, topology,
+                                             system, positions, platform,
+                                             args.steps, fused)
+            print("  production: %.3f ms/step, %.2fx the cost of a "
+                  "LangevinMiddleIntegrator step" %
+                  (step_time * 1000, step_time / reference_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+import_time.py:  Benchmark the time it takes to import gamd and start
+gamdRunner.
+
+For each gamd module, this imports the module in a fresh interpreter under
+'python -X importtime' and reports the total time of the import, along with
+the slowest of the modules it pulls in.  The wall clock time of
+'gamdRunner --help' is reported against a budget, and the script exits with
+a non-zero status when it goes over the budget.
+
+Usage:
+    python devtools/benchmarks/import_time.py [--modules gamd.runners ...]
+        [--top 10] [--budget 1.0]
+
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                              "..", ".."))
+MODULES = ["gamd.config", "gamd.parser", "gamd.integrator_factory",
+           "gamd.system_cache", "gamd.gamdSimulation", "gamd.runners",
+           "gamd.ensemble", "gamd.reweighting"]
+
+
+def get_import_times(module):
+    """
+        :return: The cumulative import time of each module imported along
+                 with the given one, in seconds, keyed by module name.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=True)
+    import_times = {}
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        unused_self, cumulative, name = line.split(":", 1)[1].split("|")
+        import_times[name.strip()] = int(cumulative) / 1e6
+    return import_times
+
+
+def time_runner_help():
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(ROOT_DIRECTORY, "gamdRunner"),
+                    "--help"], cwd=ROOT_DIRECTORY, capture_output=True,
+                   check=True)
+    return time.perf_counter() - start_time
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    argparser.add_argument("--modules", nargs="+", default=MODULES)
+    argparser.add_argument("--top", type=int, default=5,
+                           help="The number of slowest imports to list for "
+                                "each module.")
+    argparser.add_argument("--budget", type=float, default=1.0,
+                           help="The most seconds 'gamdRunner --help' may "
+                                "take.")
+    args = argparser.parse_args()
+
+    for module in args.modules:
+        import_times = get_import_times(module)
+        print("\n%-40s %8.3f s" % (module, import_times[module]))
+        slowest = sorted(
+            ((seconds, name) for name, seconds in import_times.items()
+             if name != module and
+             ("." not in name or name.startswith("gamd."))),
+            reverse=True)[:args.top]
+        for seconds, name in slowest:
+            print("    %-36s %8.3f s" % (name, seconds))
+
+    help_seconds = time_runner_help()
+    print("\n%-40s %8.3f s  (budget %.3f s)" % ("gamdRunner --help",
+                                                 help_seconds, args.budget))
+    if help_seconds > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+integrator_construction.py:  Break down the startup cost of a GaMD
+integrator.
+
+For each boost type, this reports the time it takes to build the integrator
+in Python, to serialize it and to deserialize it again (which is what
+reusing a serialized integrator would cost instead of building it), to
+create a context for it, and to take the first step, which is when OpenMM
+compiles the kernels of the integration program, against the time of a
+later step.  On the CUDA platform, the context and the first step are timed
+with a kernel cache directory that starts out empty and again once it holds
+the kernels of the first context (see <kernel-cache> in docs/example.xml).
+
+Usage:
+    python devtools/benchmarks/integrator_construction.py [--platform CUDA]
+        [--boost-types lower-dual lower-dihedral ...] [--pdb villin.pdb]
+
+"""
+
+import argparse
+import copy
+import tempfile
+import time
+
+import openmm
+
+from benchmark_systems import DT, TEMPERATURE, add_common_arguments, \
+    create_system
+from gamd.integrator_factory import GamdIntegratorFactory
+
+STAGE_STEPS = (50, 100, 50, 100)
+NTAVE = 50
+
+
+def build_integrator(boost_type_str, system):
+    ntcmdprep, ntcmd, ntebprep, nteb = STAGE_STEPS
+    start_time = time.perf_counter()
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, system, TEMPERATURE, DT, ntcmdprep, ntcmd, ntebprep,
+        nteb, ntcmd + nteb + 100, NTAVE)
+    return result[2], time.perf_counter() - start_time
+
+
+def time_serialization(integrator):
+    start_time = time.perf_counter()
+    xml = openmm.XmlSerializer.serialize(integrator)
+    serialize_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    openmm.XmlSerializer.deserialize(xml)
+    return serialize_seconds, time.perf_counter() - start_time
+
+
+def time_context(system, integrator, positions, platform, properties):
+    """
+        :return: The seconds it takes to create the context, to take the
+                 first step and to take a later step.
+    """
+    start_time = time.perf_counter()
+    context = openmm.Context(system, integrator, platform, properties)
+    context.setPositions(positions)
+    context.setVelocitiesToTemperature(TEMPERATURE, 2021)
+    context.getState()
+    context_seconds = time.perf_counter() - start_time
+    step_seconds = []
+    for unused_step in range(2):
+        start_time = time.perf_counter()
+        integrator.step(1)
+        context.getState()
+        step_seconds.append(time.perf_counter() - start_time)
+    return context_seconds, step_seconds[0], step_seconds[1]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_common_arguments(argparser)
+    args = argparser.parse_args()
+
+    platform = openmm.Platform.getPlatformByName(args.platform)
+    topology, system, positions = create_system(args.pdb)
+
+    print("%-34s %9s %9s %9s %9s %9s %9s" % (
+        "boost type / kernel cache", "build", "serial.", "deserial.",
+        "context", "1st step", "step"))
+    for boost_type_str in args.boost_types:
+        # Each boost type starts out with an empty kernel cache.
+        with tempfile.TemporaryDirectory() as kernel_cache_directory:
+            properties = {}
+            kernel_caches = ["-"]
+            if args.platform == "CUDA":
+                properties["CudaTempDirectory"] = kernel_cache_directory
+                kernel_caches = ["cold", "warm"]
+            for kernel_cache in kernel_caches:
+                gamd_system = copy.deepcopy(system)
+                integrator, build_seconds = build_integrator(boost_type_str,
+                                                             gamd_system)
+                serialize_seconds, deserialize_seconds = time_serialization(
+                    integrator)
+                context_seconds, first_step_seconds, step_seconds = \
+                    time_context(gamd_system, integrator, positions,
+                                 platform, properties)
+                print("%-34s %9.4f %9.4f %9.4f %9.4f %9.4f %9.4f" % (
+                    "%s / %s" % (boost_type_str, kernel_cache),
+                    build_seconds, serialize_seconds, deserialize_seconds,
+                    context_seconds, first_step_seconds, step_seconds))
+
+
+if __name__ == "__main__":
+    main()
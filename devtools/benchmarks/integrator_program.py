@@ -0,0 +1,107 @@
+"""
+integrator_program.py:  Benchmark the size of the GaMD integration program.
+
+For each boost type, this reports the number of computations the program of
+the integrator runs on a step in each stage, the time it takes to create a
+context for the integrator (which is when OpenMM compiles the program), and
+the cost of a production step, both with the optimized program and with the
+program as it was built before the constants were hoisted out of it, the
+stage guards were replaced with a single stage index, and the repeated
+computations of the boost potential and the force scaling factor were
+folded together.  The per-DOF variables of the integrator are listed along
+with the memory they take up on the device, assuming double precision.
+
+Usage:
+    python devtools/benchmarks/integrator_program.py [--platform CPU]
+        [--steps 2000] [--boost-types lower-dual lower-dihedral ...]
+        [--pdb villin.pdb]
+
+"""
+
+import argparse
+import copy
+import time
+
+import openmm
+import openmm.app as openmm_app
+
+from benchmark_systems import DT, TEMPERATURE, add_common_arguments, \
+    create_system
+from gamd.integrator_factory import GamdIntegratorFactory
+
+STAGE_STEPS = (50, 100, 50, 100)
+NTAVE = 50
+
+
+def create_gamd_simulation(boost_type_str, topology, system, positions,
+                           platform, number_of_production_steps,
+                           optimized=True):
+    system = copy.deepcopy(system)
+    ntcmdprep, ntcmd, ntebprep, nteb = STAGE_STEPS
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, system, TEMPERATURE, DT, ntcmdprep, ntcmd, ntebprep,
+        nteb, ntcmd + nteb + number_of_production_steps, NTAVE,
+        optimized_program=optimized)
+    integrator = result[2]
+    #
+    # OpenMM compiles the program when the context is created, and some
+    # platforms only finish the job on the first step.
+    #
+    start_time = time.perf_counter()
+    simulation = openmm_app.Simulation(topology, system, integrator, platform)
+    simulation.context.setPositions(positions)
+    simulation.context.setVelocitiesToTemperature(TEMPERATURE, 2021)
+    simulation.step(1)
+    context_seconds = time.perf_counter() - start_time
+    return simulation, integrator, context_seconds
+
+
+def get_per_dof_variables(integrator, number_of_particles):
+    """
+        :return: The names of the per-DOF variables of the integrator, and
+                 the number of bytes they take up in double precision.
+    """
+    names = [integrator.getPerDofVariableName(index)
+             for index in range(integrator.getNumPerDofVariables())]
+    return names, len(names) * number_of_particles * 3 * 8
+
+
+def time_production_step(simulation, integrator, number_of_steps):
+    simulation.step(integrator.stage_5_start - 1 - simulation.currentStep)
+    start_time = time.perf_counter()
+    simulation.step(number_of_steps)
+    return (time.perf_counter() - start_time) / number_of_steps
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_common_arguments(argparser)
+    argparser.add_argument("--steps", type=int, default=2000,
+                           help="The number of production steps to time.")
+    args = argparser.parse_args()
+
+    platform = openmm.Platform.getPlatformByName(args.platform)
+    topology, system, positions = create_system(args.pdb)
+
+    for boost_type_str in args.boost_types:
+        print("\n%s" % boost_type_str)
+        for optimized in (False, True):
+            mode = "optimized" if optimized else "unoptimized"
+            simulation, integrator, context_seconds = create_gamd_simulation(
+                boost_type_str, topology, system, positions, platform,
+                args.steps, optimized)
+            step_time = time_production_step(simulation, integrator,
+                                             args.steps)
+            print("  %-11s  computations: %d in total, %s per step" % (
+                mode, integrator.getNumComputations(),
+                integrator.get_computations_per_step()))
+            print("  %-11s  context creation: %.3f s, production: %.3f "
+                  "ms/step" % ("", context_seconds, step_time * 1000))
+            per_dof_names, per_dof_bytes = get_per_dof_variables(
+                integrator, system.getNumParticles())
+            print("  %-11s  per-DOF variables: %s, %.1f kB" % (
+                "", ", ".join(per_dof_names), per_dof_bytes / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+production_integrator.py:  Benchmark the production only integrator.
+
+For each boost type, this runs the full GaMD integrator up to the end of the
+GaMD equilibration, and then times the production stage both with the full
+integrator, which still carries all five stages, and after switching to the
+production only integrator that the runner uses with lean-production.  The
+time it takes to switch (creating the new context and handing over the
+state) is reported as well.
+
+Usage:
+    python devtools/benchmarks/production_integrator.py [--platform CPU]
+        [--steps 5000] [--boost-types lower-dual lower-dihedral ...]
+        [--pdb villin.pdb]
+
+"""
+
+import argparse
+import copy
+import time
+
+import openmm
+import openmm.app as openmm_app
+
+from benchmark_systems import DT, TEMPERATURE, add_common_arguments, \
+    create_system
+from gamd.gamdSimulation import GamdSimulation
+from gamd.integrator_factory import GamdIntegratorFactory
+
+STAGE_STEPS = (200, 1000, 200, 1000)
+NTAVE = 200
+
+
+def create_gamd_simulation(boost_type_str, topology, system, positions,
+                           platform, number_of_production_steps):
+    gamd_simulation = GamdSimulation()
+    gamd_simulation.system = copy.deepcopy(system)
+    ntcmdprep, ntcmd, ntebprep, nteb = STAGE_STEPS
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, gamd_simulation.system, TEMPERATURE, DT, ntcmdprep,
+        ntcmd, ntebprep, nteb, ntcmd + nteb + number_of_production_steps,
+        NTAVE)
+    gamd_simulation.integrator = result[2]
+    gamd_simulation.integrator.setRandomNumberSeed(2021)
+    gamd_simulation.simulation = openmm_app.Simulation(
+        topology, gamd_simulation.system, gamd_simulation.integrator,
+        platform)
+    gamd_simulation.simulation.context.setPositions(positions)
+    gamd_simulation.simulation.context.setVelocitiesToTemperature(
+        TEMPERATURE, 2021)
+    gamd_simulation.simulation.step(ntcmd + nteb)
+    return gamd_simulation
+
+
+def switch_to_production_integrator(boost_type_str, gamd_simulation):
+    integrator = gamd_simulation.integrator
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, gamd_simulation.system, TEMPERATURE, DT, 0, 0, 0, 0,
+        integrator.nstlim, NTAVE)
+    production_integrator = result[2]
+    production_integrator.setRandomNumberSeed(2022)
+    gamd_simulation.switch_integrator(production_integrator)
+
+
+def time_steps(simulation, number_of_steps):
+    start_time = time.perf_counter()
+    simulation.step(number_of_steps)
+    return (time.perf_counter() - start_time) / number_of_steps
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_common_arguments(argparser)
+    argparser.add_argument("--steps", type=int, default=5000,
+                           help="The number of production steps to time.")
+    args = argparser.parse_args()
+
+    platform = openmm.Platform.getPlatformByName(args.platform)
+    topology, system, positions = create_system(args.pdb)
+    print("%-32s %12s %12s %10s %10s %12s" % (
+        "boost type", "full ms/step", "lean ms/step", "speedup",
+        "computes", "switch (s)"))
+    for boost_type_str in args.boost_types:
+        gamd_simulation = create_gamd_simulation(
+            boost_type_str, topology, system, positions, platform,
+            args.steps)
+        full_computations = gamd_simulation.integrator.getNumComputations()
+        full_time = time_steps(gamd_simulation.simulation, args.steps)
+
+        gamd_simulation = create_gamd_simulation(
+            boost_type_str, topology, system, positions, platform,
+            args.steps)
+        start_time = time.perf_counter()
+        switch_to_production_integrator(boost_type_str, gamd_simulation)
+        #
+        # The first step includes compiling the kernels for the new context,
+        # which is part of the cost of switching.
+        #
+        gamd_simulation.simulation.step(1)
+        switch_time = time.perf_counter() - start_time
+        lean_computations = gamd_simulation.integrator.getNumComputations()
+        lean_time = time_steps(gamd_simulation.simulation, args.steps - 1)
+
+        print("%-32s %12.3f %12.3f %9.2fx %4d -> %3d %12.3f" % (
+            boost_type_str, full_time * 1000, lean_time * 1000,
+            full_time / lean_time, full_computations, lean_computations,
+            switch_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+startup.py:  Benchmark the startup of a GaMD simulation.
+
+This reports how long GamdSimulationFactory.createGamdSimulation() spends in
+each phase (building the System, the integrator and the context, the
+minimization and the velocities) for a fresh start, and for a restart from
+a checkpoint, which skips the state that loading the checkpoint replaces.
+Both are timed with and without the system cache.
+
+Usage:
+    python devtools/benchmarks/startup.py [--platform CPU]
+        [--boost-types lower-dual ...] [--pdb villin.pdb]
+
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import openmm.app as openmm_app
+
+from benchmark_systems import DT, TEMPERATURE, add_common_arguments
+from gamd import config as config_module
+from gamd.checkpointer import RESTART_CHECKPOINT_FILENAME, CheckpointWriter
+from gamd.gamdSimulation import GamdSimulationFactory
+
+
+def create_config(directory, boost_type_str, pdb_filename=None):
+    if pdb_filename is None:
+        data_directory = os.path.join(os.path.dirname(openmm_app.__file__),
+                                      "data")
+        pdb_filename = os.path.join(data_directory, "test.pdb")
+    pdb = openmm_app.PDBFile(pdb_filename)
+    modeller = openmm_app.Modeller(pdb.topology, pdb.positions)
+    modeller.deleteWater()
+    structure_filename = os.path.join(directory, "structure.pdb")
+    with open(structure_filename, "w") as structure_file:
+        openmm_app.PDBFile.writeFile(modeller.topology, modeller.positions,
+                                     structure_file)
+
+    config = config_module.Config()
+    config.temperature = TEMPERATURE
+    config.system.nonbonded_method = "nocutoff"
+    config.system.constraints = "hbonds"
+    config.run_minimization = True
+    config.integrator.boost_type = boost_type_str
+    config.integrator.dt = DT
+    config.integrator.number_of_steps.compute_total_simulation_length()
+    config.input_files.forcefield = config_module.ForceFieldConfig()
+    config.input_files.forcefield.coordinates = structure_filename
+    config.input_files.forcefield.forcefield_list_native = [
+        "amber14-all.xml", "amber14/tip3pfb.xml"]
+    config.outputs.directory = os.path.join(directory, "output")
+    config.outputs.reporting.coordinates_file_type = "dcd"
+    return config
+
+
+def time_startup(config, platform_name, restart):
+    start_time = time.perf_counter()
+    gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+        config, platform_name, "0", restart=restart)
+    return gamd_simulation, time.perf_counter() - start_time
+
+
+def print_startup(label, gamd_simulation, seconds):
+    phases = ", ".join("%s %.3f s" % item
+                       for item in gamd_simulation.startup_seconds.items())
+    print("  %-18s  %.3f s  (%s)" % (label, seconds, phases))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_common_arguments(argparser)
+    args = argparser.parse_args()
+
+    for boost_type_str in args.boost_types:
+        print("\n%s" % boost_type_str)
+        with tempfile.TemporaryDirectory() as directory:
+            config = create_config(directory, boost_type_str, args.pdb)
+            os.makedirs(config.outputs.directory)
+            for cached in (False, True):
+                if cached:
+                    config.system_cache = config_module.SystemCacheConfig()
+                    config.system_cache.directory = os.path.join(
+                        directory, "system-cache")
+                    # Fill the cache.
+                    time_startup(config, args.platform, False)
+                mode = "cached" if cached else "uncached"
+                gamd_simulation, fresh_seconds = time_startup(
+                    config, args.platform, False)
+                print_startup("fresh, " + mode, gamd_simulation,
+                              fresh_seconds)
+                writer = CheckpointWriter(
+                    os.path.join(config.outputs.directory,
+                                 RESTART_CHECKPOINT_FILENAME),
+                    asynchronous=False)
+                writer.save(gamd_simulation.simulation)
+                gamd_simulation, restart_seconds = time_startup(
+                    config, args.platform, True)
+                print_startup("restart, " + mode, gamd_simulation,
+                              restart_seconds)
+                print("  %-18s  %.3f s" % ("saved", fresh_seconds
+                                           - restart_seconds))
+
+
+if __name__ == "__main__":
+    main()
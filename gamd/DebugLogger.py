@@ -2,6 +2,32 @@ import sys
 from abc import ABC
 from abc import abstractmethod
 
+from gamd.stage_integrator import GlobalVariableSnapshot
+
+#
+# Globals that never change over a run, and are left out of the debug logs.
+#
+IGNORED_GLOBALS = {"stageOneIfValueIsZeroOrNegative",
+                   "stageTwoIfValueIsZeroOrNegative",
+                   "stageThreeIfValueIsZeroOrNegative",
+                   "stageFourIfValueIsZeroOrNegative",
+                   "stageFiveIfValueIsZeroOrNegative",
+                   "thermal_energy", "collision_rate",
+                   "vscale", "fscale", "noisescale"}
+
+
+def get_debug_global_names(integrator, names=None):
+    """
+        The globals of the integrator to debug:  the given names, or all of
+        them apart from the ignored ones and the offsets of the histories.
+    """
+    all_names = [integrator.getGlobalVariableName(index)
+                 for index in range(integrator.getNumGlobalVariables())]
+    if names:
+        return [name for name in names if name in all_names]
+    return [name for name in all_names if name not in IGNORED_GLOBALS
+            and not name.endswith("HistoryOffset")]
+
 
 class BaseDebugLogger(ABC):
 
@@ -17,6 +43,13 @@ class BaseDebugLogger(ABC):
     def write_global_variables_values(self, integrator):
         raise NotImplementedError("must implement write_global_variables_values")
 
+    def flush(self, integrator):
+        """
+            Write out anything that the integrator holds for the log, such
+            as before the simulation moves on to another integrator.
+        """
+        return
+
     @staticmethod
     def print_integration_algorithm_to_screen(integrator):
         for i in range(integrator.getNumComputations()):
@@ -69,6 +102,8 @@ class DebugLogger(BaseDebugLogger):
             self.denyList = []
         else:
             self.denyList = denyList
+        self.__integrator = None
+        self.__snapshot = None
 
     def __del__(self):
         self.debugLog.close()
@@ -89,6 +124,17 @@ class DebugLogger(BaseDebugLogger):
         headers = [header for header in all_headers if header not in self.denyList]
         return headers
 
+    def __get_snapshot(self, integrator):
+        """
+            The headers are only filtered again when the simulation has
+            moved on to another integrator.
+        """
+        if integrator is not self.__integrator:
+            self.__integrator = integrator
+            self.__snapshot = GlobalVariableSnapshot(
+                integrator, self.__get_filtered_headers(integrator))
+        return self.__snapshot
+
     def write_global_variables_headers(self, integrator):
         headers = self.__get_filtered_headers(integrator)
         headers_string = ",".join(map(str, headers))
@@ -96,11 +142,58 @@ class DebugLogger(BaseDebugLogger):
         self.debugLog.write("\n")
 
     def write_global_variables_values(self, integrator):
-        headers = self.__get_filtered_headers(integrator)
-        values = []
-        for header in headers:
-            values.append(integrator.getGlobalVariableByName(header))
+        values = self.__get_snapshot(integrator).update().tolist()
         values_string = ",".join(map(str, values))
         self.debugLog.write(str(values_string))
         self.debugLog.write("\n")
 
+
+
+class DebugHistoryLogger(BaseDebugLogger):
+    """
+    Writes the records of the "debug" history that the integrator keeps on
+    the device (see add_globals_history()), so that the run only stops once
+    per history rather than on every step.  Each row is a record of the
+    globals of the history on one step.
+    """
+
+    def __init__(self, filename, mode, last_step=0):
+        self.filename = filename
+        self.debugLog = open(filename, mode)
+        self.last_step = last_step
+        self.headers = None
+
+    def __del__(self):
+        self.debugLog.close()
+
+    def close(self):
+        self.debugLog.close()
+
+    def write_global_variables_headers(self, integrator):
+        self.headers = integrator.get_globals_history_names("debug")
+        self.debugLog.write(",".join(self.headers))
+        self.debugLog.write("\n")
+
+    def write_global_variables_values(self, integrator):
+        """
+            Write the records since the last call.  The columns follow the
+            header, even after a switch to an integrator that has fewer of
+            the globals, which are left empty.
+        """
+        names = integrator.get_globals_history_names("debug")
+        if self.headers is None:
+            self.headers = names
+        positions = [names.index(name) if name in names else None
+                     for name in self.headers]
+        rows = integrator.get_globals_history("debug", self.last_step)
+        for row in rows.tolist():
+            self.debugLog.write(",".join(
+                "" if position is None else str(row[position])
+                for position in positions))
+            self.debugLog.write("\n")
+        if len(rows) > 0:
+            self.last_step = int(rows[-1][0])
+
+    def flush(self, integrator):
+        self.write_global_variables_values(integrator)
+        self.debugLog.flush()
@@ -1,6 +1,8 @@
 import openmm.unit as unit
+from . import binlog
 from .stage_integrator import BoostType
 from .stage_integrator import GamdStageIntegrator
+from .stage_integrator import GlobalVariableSnapshot
 from abc import ABC
 from abc import abstractmethod
 
@@ -17,8 +19,45 @@ class TrackedValue:
             self.__boost_type, "ForceScalingFactor")
         self.__effective_harmonic_constant_name = tracked_integrator.get_variable_name_by_type(
             self.__boost_type, "k0")
+        self.__unboosted_energy_name = tracked_integrator.get_variable_name_by_type(
+            self.__boost_type, "UnboostedPotentialEnergy")
+
+        #
+        # The integrator latches the unboosted energies it needs for boosting
+        # at the start of every step, so we read those rather than asking the
+        # context for another energy evaluation.  Only an energy that is purely
+        # informational for this boost type (e.g. the dihedral energy under a
+        # total boost) still has to be evaluated by us.
+        #
+        self.__is_energy_latched = (self.__unboosted_energy_name in
+                                    tracked_integrator.get_unboosted_energy_names())
+        self.__snapshot = self.__create_snapshot()
+
+    def __create_snapshot(self):
+        return GlobalVariableSnapshot(
+            self.__integrator,
+            [self.__boost_potential_name, self.__force_scaling_factor_name,
+             self.__effective_harmonic_constant_name,
+             self.__unboosted_energy_name])
+
+    def is_energy_latched(self):
+        return self.__is_energy_latched
+
+    def set_integrator(self, integrator):
+        self.__integrator = integrator
+        self.__snapshot = self.__create_snapshot()
+
+    def read_values(self):
+        """
+            Read the values of the globals that get reported for this boost
+            type.  The get_reporting methods return the values as of the
+            last call.
+        """
+        self.__snapshot.update()
 
     def mark_energy(self):
+        if self.__is_energy_latched:
+            return
         if self.__boost_type == BoostType.TOTAL:
             state = self.__simulation.context.getState(getEnergy=True)
             self.__starting_potential_energy = state.getPotentialEnergy()
@@ -26,24 +65,39 @@ class TrackedValue:
             state = self.__simulation.context.getState(getEnergy=True, groups={self.__group})
             self.__starting_potential_energy = state.getPotentialEnergy()
 
+    def __get_starting_potential_energy(self):
+        if self.__is_energy_latched:
+            return (self.__snapshot[self.__unboosted_energy_name]
+                    * unit.kilojoules_per_mole)
+        return self.__starting_potential_energy
+
+    def get_force_scaling_factor(self):
+        return self.__snapshot.get(self.__force_scaling_factor_name, 1.0)
+
+    def get_boost_potential(self):
+        return self.__snapshot.get(self.__boost_potential_name, 0.0) / 4.184
+
+    def get_starting_energy(self):
+        return (self.__get_starting_potential_energy() /
+                (unit.kilojoules_per_mole * 4.184))
+
+    def get_effective_harmonic_constant(self):
+        return self.__snapshot.get(self.__effective_harmonic_constant_name, 0.0)
+
     def get_reporting_force_scaling_factor(self):
-        scaling_factors = self.__integrator.get_force_scaling_factors()
-        return str(scaling_factors[self.__force_scaling_factor_name])
+        return str(self.get_force_scaling_factor())
 
     def get_reporting_boost_potential(self):
-        boost_potentials = self.__integrator.get_boost_potentials()
-        return str(boost_potentials[self.__boost_potential_name] / 4.184)
+        return str(self.get_boost_potential())
 
     def get_reporting_starting_energy(self):
-        return str(self.__starting_potential_energy /
-                   (unit.kilojoules_per_mole * 4.184))
+        return str(self.get_starting_energy())
 
     def get_boost_type(self):
         return self.__boost_type
 
     def get_reporting_effective_harmonic_constant(self):
-        effective_harmonic_constants = self.__integrator.get_effective_harmonic_constants()
-        return str(effective_harmonic_constants[self.__effective_harmonic_constant_name])
+        return str(self.get_effective_harmonic_constant())
 
 
 class BaseGamdLogger(ABC):
@@ -63,6 +117,14 @@ class BaseGamdLogger(ABC):
     def write_to_gamd_log(self, step):
         raise NotImplementedError("must implement write_to_gamd_log")
 
+    @abstractmethod
+    def set_integrator(self, integrator):
+        raise NotImplementedError("must implement set_integrator")
+
+    @abstractmethod
+    def flush(self):
+        raise NotImplementedError("must implement flush")
+
 
 class NoOpGamdLogger(BaseGamdLogger):
 
@@ -78,6 +140,12 @@ class NoOpGamdLogger(BaseGamdLogger):
     def write_to_gamd_log(self, step):
         pass
 
+    def set_integrator(self, integrator):
+        pass
+
+    def flush(self):
+        pass
+
 
 class GamdLogger:
 
@@ -99,7 +167,7 @@ class GamdLogger:
         """
 
         self.filename = filename
-        self.gamdLog = open(filename, mode)
+        self._open_log(filename, mode)
         self.integrator = integrator
         self.simulation = simulation
         self.tracked_values = []
@@ -115,25 +183,62 @@ class GamdLogger:
             self.tracked_values.append(TrackedValue(first_boost_type, first_boost_group, integrator, simulation))
             self.tracked_values.append(TrackedValue(second_boost_type, second_boost_group, integrator, simulation))
 
+    def _open_log(self, filename, mode):
+        self.gamdLog = open(filename, mode)
+
     def __del__(self):
         self.gamdLog.close()
 
     def close(self):
         self.gamdLog.close()
 
-    def write_header(self):
-        self.gamdLog.write("# Gaussian accelerated Molecular Dynamics log file\n")
-        self.gamdLog.write("# All energy terms are stored in unit of kcal/mol\n")
-        header_str = "# ntwx,total_nstep,Unboosted-{0}-Energy,Unboosted-{1}-Energy,{0}-Force-Weight,{1}-Force-Weight,{0}-Boost-Energy-Potential,{1}-Boost-Energy,{0}-Effective-Harmonic-Constant,{1}-Effective-Harmonic-Constant\n"
+    def flush(self):
+        self.gamdLog.flush()
+
+    def get_header_lines(self):
+        header_str = "# ntwx,total_nstep,Unboosted-{0}-Energy,Unboosted-{1}-Energy,{0}-Force-Weight,{1}-Force-Weight,{0}-Boost-Energy-Potential,{1}-Boost-Energy,{0}-Effective-Harmonic-Constant,{1}-Effective-Harmonic-Constant"
         header = header_str.format(self.tracked_values[0].get_boost_type().value,
                                    self.tracked_values[1].get_boost_type().value)
-        self.gamdLog.write(header)
+        return ["# Gaussian accelerated Molecular Dynamics log file",
+                "# All energy terms are stored in unit of kcal/mol",
+                header]
+
+    def write_header(self):
+        for line in self.get_header_lines():
+            self.gamdLog.write(line + "\n")
+
+    def get_log_values(self):
+        """
+            The values of a row of the log, in the order of the header, for
+            the current step.
+        """
+        for tracked_value in self.tracked_values:
+            tracked_value.read_values()
+        first, second = self.tracked_values
+        return [first.get_starting_energy(), second.get_starting_energy(),
+                first.get_force_scaling_factor(),
+                second.get_force_scaling_factor(),
+                first.get_boost_potential(), second.get_boost_potential(),
+                first.get_effective_harmonic_constant(),
+                second.get_effective_harmonic_constant()]
 
     def mark_energies(self):
         for tracked_value in self.tracked_values:
             tracked_value.mark_energy()
 
+    def set_integrator(self, integrator):
+        """
+            Follow the simulation over to a new integrator, such as the
+            production only integrator.
+        """
+        self.integrator = integrator
+        for tracked_value in self.tracked_values:
+            tracked_value.set_integrator(integrator)
+
     def write_to_gamd_log(self, step):
+        for tracked_value in self.tracked_values:
+            tracked_value.read_values()
+
         first_energy = self.tracked_values[0].get_reporting_starting_energy()
         second_energy = self.tracked_values[1].get_reporting_starting_energy()
 
@@ -156,3 +261,121 @@ class GamdLogger:
                            first_effective_harmonic_constant + "\t" +
                            second_effective_harmonic_constant + "\n")
 
+
+
+class BinaryGamdLogger(GamdLogger):
+    """
+        Writes the same rows as the GamdLogger into a binary log directory
+        next to where the text log would have gone, such as gamd.log.bin.
+        binlog.convert_to_text() turns it back into the text log.
+    """
+
+    def _open_log(self, filename, mode):
+        self.__directory = binlog.get_binary_log_directory(filename)
+        self.__mode = mode
+        self.__writer = None
+
+    def __get_writer(self):
+        if self.__writer is None:
+            header_lines = self.get_header_lines()
+            columns = ([binlog.STEP_COLUMN]
+                       + header_lines[-1].split(",")[2:])
+            self.__writer = binlog.BinaryLogWriter(
+                self.__directory, columns, self.__mode,
+                {"type": "gamd-log", "header": header_lines})
+        return self.__writer
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+
+    def flush(self):
+        if self.__writer is not None:
+            self.__writer.flush()
+
+    def write_header(self):
+        self.__get_writer()
+
+    def write_to_gamd_log(self, step):
+        self.__get_writer().append([step] + self.get_log_values())
+
+
+class BoostHistoryLogger(BaseGamdLogger):
+    """
+        Writes the boost potentials of every step, from the boost history
+        that the integrator keeps on the device, to a csv file (or a binary
+        log) with a row per step.  Each write_to_gamd_log() call fetches the
+        whole history in one transfer, and writes the rows of the steps
+        since the last call, so it has to be called at least once per
+        boost_history_length steps.
+    """
+
+    def __init__(self, filename, mode, integrator, last_step=0,
+                 log_format="text"):
+        """
+        Parameters
+        ----------
+        :param filename:   The gamd-boost-history.log path and file name.
+        :param mode:       The write mode to output the file.
+        :param integrator: The GaMD integrator, with a boost history.
+        :param last_step:  The last step that is already in the log.
+        :param log_format: "text" for the csv file, or "binary" for a
+                           binary log next to where it would have gone.
+        """
+        self.integrator = integrator
+        self.last_step = last_step
+        self.headers = integrator.boost_history_names[1:]
+        self.historyLog = None
+        self.binaryLog = None
+        if log_format == "binary":
+            self.binaryLog = binlog.BinaryLogWriter(
+                binlog.get_binary_log_directory(filename),
+                [binlog.STEP_COLUMN] + self.headers, mode,
+                {"type": "csv", "header": self.get_header_lines()})
+        else:
+            self.historyLog = open(filename, mode)
+
+    def get_header_lines(self):
+        return ["# All energy terms are stored in unit of kcal/mol",
+                "# " + ", ".join(["step"] + self.headers)]
+
+    def close(self):
+        if self.binaryLog is not None:
+            self.binaryLog.close()
+        elif not self.historyLog.closed:
+            self.historyLog.close()
+
+    def flush(self):
+        if self.binaryLog is not None:
+            self.binaryLog.flush()
+        else:
+            self.historyLog.flush()
+
+    def write_header(self):
+        if self.historyLog is not None:
+            for line in self.get_header_lines():
+                self.historyLog.write(line + "\n")
+
+    def mark_energies(self):
+        pass
+
+    def set_integrator(self, integrator):
+        self.integrator = integrator
+
+    def write_to_gamd_log(self, step):
+        rows = self.integrator.get_boost_history(self.last_step)
+        if len(rows) == 0:
+            return
+        rows[:, 1:] /= 4.184
+        if self.binaryLog is not None:
+            for row in rows:
+                self.binaryLog.append(row)
+        else:
+            self.historyLog.write("".join(
+                ", ".join([str(int(row[0]))] + [str(value)
+                                                for value in row[1:]]) + "\n"
+                for row in rows.tolist()))
+        self.last_step = int(rows[-1, 0])
@@ -0,0 +1,67 @@
+"""
+atomic_write.py:  Replace files and directories in one step.
+
+The outputs that other programs read while a run is going, or that a
+restart depends on, are written to a temporary file (or directory) next to
+their final name, and renamed into place once they are complete.  A rename
+within a directory is atomic, so a reader only ever sees the old contents or
+all of the new ones, and a crash in the middle of a write never leaves a
+truncated file behind.
+
+This module only depends on the standard library, so that the light
+modules, such as binlog and telemetry, can use it.
+
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+
+TEMPORARY_SUFFIX = ".tmp"
+
+
+@contextlib.contextmanager
+def atomic_write(filename, mode="w", sync=False):
+    """
+        Open a temporary file next to filename for writing, and rename it
+        over filename when the block finishes.  If the block fails, the
+        temporary file is removed and filename is left as it was.
+
+        :param filename: The file to replace.
+        :param mode:     The mode to open the temporary file with.
+        :param sync:     Whether to flush the file to the disk before the
+                         rename, for files that have to survive a crash of
+                         the machine, such as checkpoints.
+    """
+    temporary_filename = filename + TEMPORARY_SUFFIX
+    try:
+        with open(temporary_filename, mode) as temporary_file:
+            yield temporary_file
+            if sync:
+                temporary_file.flush()
+                os.fsync(temporary_file.fileno())
+        os.replace(temporary_filename, filename)
+    except BaseException:
+        if os.path.exists(temporary_filename):
+            os.remove(temporary_filename)
+        raise
+
+
+@contextlib.contextmanager
+def atomic_directory(directory):
+    """
+        Create a temporary directory next to directory, for the block to
+        fill, and rename it to directory when the block finishes.  Unlike
+        files, a directory that is already there is not replaced:  the
+        rename then raises an OSError, and the temporary directory is
+        removed either way.
+    """
+    temporary_directory = tempfile.mkdtemp(
+        prefix="." + os.path.basename(directory) + TEMPORARY_SUFFIX + "-",
+        dir=os.path.dirname(directory))
+    try:
+        yield temporary_directory
+        os.rename(temporary_directory, directory)
+    finally:
+        shutil.rmtree(temporary_directory, ignore_errors=True)
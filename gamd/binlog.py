@@ -0,0 +1,227 @@
+"""
+binlog.py:  An append-only, columnar binary format for the GaMD logs.
+
+A binary log is a directory, named after the text log it replaces with a
+.bin extension (gamd.log.bin, for instance).  It holds a series of .npy
+segments and an index.json file.  Each segment is a two dimensional array
+with one row per column of the log, and one entry per logged step, so that
+a column of a segment is a contiguous block of the file.  The first column
+is always the step.  Rows are buffered in memory and written out as a new
+segment when the buffer fills up, or when the log is flushed, after which
+the index is replaced in one go, so a reader never sees a segment that is
+only half written.
+
+The BinaryLogReader memory maps the segments, and convert_to_text() writes
+a binary log back out in the layout of the text log, for tools such as the
+PyReweighting scripts.
+
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from gamd.atomic_write import atomic_write
+
+LOG_FORMATS = ["text", "binary"]
+BINARY_LOG_EXTENSION = ".bin"
+INDEX_FILENAME = "index.json"
+STEP_COLUMN = "step"
+
+
+def get_binary_log_directory(filename):
+    return filename + BINARY_LOG_EXTENSION
+
+
+def write_index(directory, index):
+    with atomic_write(os.path.join(directory, INDEX_FILENAME)) as index_file:
+        json.dump(index, index_file, indent=1)
+
+
+def read_index(directory):
+    with open(os.path.join(directory, INDEX_FILENAME)) as index_file:
+        return json.load(index_file)
+
+
+class BinaryLogWriter:
+    def __init__(self, directory, columns, mode="w", layout=None,
+                 buffer_rows=4096):
+        """
+        Parameters
+        ----------
+        :param directory:   The directory of the binary log.
+        :param columns:     The names of the columns, starting with "step".
+        :param mode:        "w" to start a new log, and "a" to append to the
+                            log in the directory, if there is one.
+        :param layout:      How convert_to_text() lays out the text log, as
+                            a dictionary with the "type" of the layout
+                            ("gamd-log" or "csv") and its "header" lines.
+        :param buffer_rows: The number of rows held in memory before they
+                            are written out as a segment.
+        """
+        if columns[0] != STEP_COLUMN:
+            raise ValueError("The first column of a binary log must be the "
+                             "step.")
+        self.directory = directory
+        index_filename = os.path.join(directory, INDEX_FILENAME)
+        if mode == "a" and os.path.exists(index_filename):
+            self.index = read_index(directory)
+            if self.index["columns"] != list(columns):
+                raise ValueError("Cannot append to the binary log in %s, "
+                                 "since its columns differ." % directory)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            for filename in os.listdir(directory):
+                if filename.endswith(".npy"):
+                    os.remove(os.path.join(directory, filename))
+            self.index = {"columns": list(columns),
+                          "layout": layout if layout is not None else {},
+                          "segments": []}
+            write_index(directory, self.index)
+        self.__buffer = np.zeros((len(columns), buffer_rows))
+        self.__number_of_rows = 0
+
+    def append(self, values):
+        """
+            Add a row to the log, with the step as its first value.
+        """
+        self.__buffer[:, self.__number_of_rows] = values
+        self.__number_of_rows += 1
+        if self.__number_of_rows == self.__buffer.shape[1]:
+            self.flush()
+
+    def flush(self):
+        """
+            Write the buffered rows out as a new segment.
+        """
+        if self.__number_of_rows == 0:
+            return
+        rows = self.__buffer[:, :self.__number_of_rows]
+        segment_filename = "segment-%06d.npy" % len(self.index["segments"])
+        np.save(os.path.join(self.directory, segment_filename), rows)
+        self.index["segments"].append({
+            "filename": segment_filename,
+            "rows": self.__number_of_rows,
+            "first_step": int(rows[0, 0]),
+            "last_step": int(rows[0, -1])})
+        write_index(self.directory, self.index)
+        self.__number_of_rows = 0
+
+    def close(self):
+        self.flush()
+
+
+class BinaryLogReader:
+    def __init__(self, directory):
+        self.directory = directory
+        index = read_index(directory)
+        self.columns = index["columns"]
+        self.layout = index["layout"]
+        self.segments = index["segments"]
+        self.__positions = {column: position
+                            for position, column in enumerate(self.columns)}
+
+    def get_number_of_rows(self):
+        return sum(segment["rows"] for segment in self.segments)
+
+    def read_segment(self, segment):
+        """
+            The memory mapped array of the segment, with a row per column.
+        """
+        return np.load(os.path.join(self.directory, segment["filename"]),
+                       mmap_mode="r")
+
+    def read(self, columns=None, first_step=None, last_step=None):
+        """
+            The values of the columns over the range of steps, as a
+            dictionary of arrays by column name.  When the range falls
+            within a single segment, the arrays are read only views of the
+            memory mapped segment, and nothing is copied.
+
+            :param columns:    The names of the columns, or None for all.
+            :param first_step: The first step to include, or None.
+            :param last_step:  The last step to include, or None.
+        """
+        if columns is None:
+            columns = self.columns
+        positions = [self.__positions[column] for column in columns]
+        parts = []
+        for segment in self.segments:
+            if first_step is not None and segment["last_step"] < first_step:
+                continue
+            if last_step is not None and segment["first_step"] > last_step:
+                continue
+            rows = self.read_segment(segment)
+            steps = rows[0]
+            start = 0
+            end = len(steps)
+            if first_step is not None:
+                start = int(np.searchsorted(steps, first_step, side="left"))
+            if last_step is not None:
+                end = int(np.searchsorted(steps, last_step, side="right"))
+            parts.append([rows[position, start:end]
+                          for position in positions])
+
+        result = {}
+        for column_number, column in enumerate(columns):
+            if len(parts) == 1:
+                result[column] = parts[0][column_number]
+            elif parts:
+                result[column] = np.concatenate(
+                    [part[column_number] for part in parts])
+            else:
+                result[column] = np.zeros(0)
+        return result
+
+
+def format_text_row(layout_type, step, values):
+    if layout_type == "gamd-log":
+        return ("\t1\t" + str(step) + "\t"
+                + "\t".join(str(value) for value in values) + "\n")
+    return ", ".join([str(step)] + [str(value) for value in values]) + "\n"
+
+
+def convert_to_text(directory, filename=None):
+    """
+        Write the binary log in the directory out in the layout of the text
+        log that it replaces, by default next to the binary log.
+
+        :return: The filename of the text log.
+    """
+    if filename is None:
+        filename = directory[:-len(BINARY_LOG_EXTENSION)] \
+            if directory.endswith(BINARY_LOG_EXTENSION) \
+            else directory + ".txt"
+    reader = BinaryLogReader(directory)
+    layout_type = reader.layout.get("type", "csv")
+    with open(filename, "w") as text_file:
+        for line in reader.layout.get("header", []):
+            text_file.write(line + "\n")
+        for segment in reader.segments:
+            rows = reader.read_segment(segment)
+            for row in rows.T.tolist():
+                text_file.write(format_text_row(layout_type, int(row[0]),
+                                                row[1:]))
+    return filename
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Convert a binary GaMD log to the text layout of the "
+                    "log it replaces.")
+    argparser.add_argument("directory", metavar="DIRECTORY", type=str,
+                           help="The binary log directory, such as "
+                                "gamd.log.bin.")
+    argparser.add_argument("-o", "--output", dest="output", default=None,
+                           type=str,
+                           help="The text log to write.  Defaults to the "
+                                "binary log directory without its .bin "
+                                "extension.")
+    args = argparser.parse_args()
+    print("Wrote:", convert_to_text(args.directory, args.output))
+
+
+if __name__ == "__main__":
+    main()
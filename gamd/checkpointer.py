@@ -0,0 +1,207 @@
+"""
+checkpointer.py:  Writes OpenMM checkpoints on their own cadence.
+
+Checkpoints are captured from the context on the calling thread, but the
+file I/O happens on a background thread, so the MD loop never waits on the
+filesystem.  Each checkpoint replaces the last one in a single step (see
+atomic_write), so a crash in the middle of a write never leaves a truncated
+restart file behind.  The previous checkpoints are kept in rotation as
+<filename>.1, <filename>.2, ...
+
+"""
+
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+
+from gamd.atomic_write import atomic_write
+
+RESTART_CHECKPOINT_FILENAME = "gamd_restart.checkpoint"
+CHECKPOINT_MAGIC = b"OpenMM Binary Checkpoint\n\x00"
+MAX_PLATFORM_NAME_LENGTH = 64
+
+
+def read_checkpoint_header(filename):
+    """
+        Read the name of the platform that wrote an OpenMM checkpoint and
+        the number of particles in it, without loading it into a context.
+        This follows the layout that OpenMM writes at the start of its
+        checkpoints, which it does not document.
+
+        :return: The platform name and the number of particles, or None
+                 when the start of the file does not follow that layout.
+    """
+    with open(filename, "rb") as checkpoint_file:
+        if checkpoint_file.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            return None
+        try:
+            name_length, = struct.unpack("=i", checkpoint_file.read(4))
+            if not 0 < name_length <= MAX_PLATFORM_NAME_LENGTH:
+                return None
+            platform_name = checkpoint_file.read(name_length).decode("ascii")
+            number_of_particles, = struct.unpack("=i",
+                                                 checkpoint_file.read(4))
+        except (struct.error, UnicodeDecodeError):
+            return None
+    if not platform_name.isalnum() or number_of_particles < 0:
+        return None
+    return platform_name, number_of_particles
+
+
+def check_restart_checkpoint(filename, platform_name, number_of_particles):
+    """
+        Make sure that a checkpoint can be loaded into a context of the
+        given platform for a system with the given number of particles,
+        before any time goes into creating that context.  A checkpoint whose
+        header is not recognized is left for loadCheckpoint() to judge.
+    """
+    if not os.path.exists(filename):
+        raise ValueError("No checkpoint to restart from: %s" % filename)
+    header = read_checkpoint_header(filename)
+    if header is None:
+        print("Warning: the header of the checkpoint %s is not recognized, "
+              "so it is not checked before the context is created."
+              % filename)
+        return
+    checkpoint_platform_name, checkpoint_number_of_particles = header
+    if checkpoint_platform_name.lower() != platform_name.lower():
+        raise ValueError("The checkpoint %s was written on the %s platform, "
+                         "and cannot be loaded on the %s platform."
+                         % (filename, checkpoint_platform_name,
+                            platform_name))
+    if checkpoint_number_of_particles != number_of_particles:
+        raise ValueError("The checkpoint %s has %d particles, but the "
+                         "system of the configuration has %d."
+                         % (filename, checkpoint_number_of_particles,
+                            number_of_particles))
+
+
+class CheckpointWriter:
+
+    def __init__(self, filename, interval=0, wall_clock_minutes=None,
+                 keep=1, asynchronous=True):
+        """
+        Parameters
+        ----------
+        :param filename:           The checkpoint path and file name.  This
+                                   is always the newest checkpoint.
+        :param interval:           The number of steps between checkpoints.
+                                   A value of 0 disables step based
+                                   checkpoints.
+        :param wall_clock_minutes: If set, a checkpoint is also written at the
+                                   first opportunity after this many minutes
+                                   have passed since the last one.
+        :param keep:               The number of checkpoints to keep,
+                                   including the newest one.
+        :param asynchronous:       Whether to write the files on a background
+                                   thread.
+        """
+        if keep < 1:
+            raise ValueError("CheckpointWriter:  keep must be at least 1.")
+        self.filename = filename
+        self.interval = interval
+        self.wall_clock_minutes = wall_clock_minutes
+        self.keep = keep
+        self.asynchronous = asynchronous
+        self.last_checkpoint_time = time.monotonic()
+        self.__error = None
+        self.__queue = None
+        self.__thread = None
+        if asynchronous:
+            #
+            # A single slot means that at most one checkpoint is waiting to be
+            # written while another one is being written, which bounds the
+            # memory held by pending checkpoints.
+            #
+            self.__queue = queue.Queue(maxsize=1)
+            self.__thread = threading.Thread(target=self.__write_loop,
+                                             name="gamd-checkpoint-writer",
+                                             daemon=True)
+            self.__thread.start()
+
+    def is_checkpoint_step(self, step):
+        if self.interval and step % self.interval == 0:
+            return True
+        if self.wall_clock_minutes is not None:
+            elapsed_seconds = time.monotonic() - self.last_checkpoint_time
+            return elapsed_seconds >= self.wall_clock_minutes * 60.0
+        return False
+
+    def save(self, simulation):
+        """
+            Capture a checkpoint of the simulation's context and write it
+            out.  The capture itself has to happen on this thread, since it
+            synchronizes with the device.
+        """
+        self.__raise_pending_error()
+        checkpoint = simulation.context.createCheckpoint()
+        self.last_checkpoint_time = time.monotonic()
+        if self.asynchronous:
+            self.__queue.put(checkpoint)
+        else:
+            self.__write(checkpoint)
+
+    def flush(self):
+        """
+            Block until all of the queued checkpoints are on disk.
+        """
+        if self.asynchronous:
+            self.__queue.join()
+        self.__raise_pending_error()
+
+    def close(self):
+        if self.__thread is not None:
+            self.__queue.join()
+            self.__queue.put(None)
+            self.__thread.join()
+            self.__thread = None
+        self.__raise_pending_error()
+
+    def get_rotated_filenames(self):
+        return [self.filename] + ["%s.%d" % (self.filename, index)
+                                  for index in range(1, self.keep)]
+
+    def __raise_pending_error(self):
+        if self.__error is not None:
+            error = self.__error
+            self.__error = None
+            raise error
+
+    def __write_loop(self):
+        while True:
+            checkpoint = self.__queue.get()
+            try:
+                if checkpoint is None:
+                    return
+                self.__write(checkpoint)
+            except Exception as e:
+                self.__error = e
+            finally:
+                self.__queue.task_done()
+
+    def __write(self, checkpoint):
+        with atomic_write(self.filename, "wb", sync=True) as checkpoint_file:
+            checkpoint_file.write(checkpoint)
+            self.__rotate()
+
+    def __rotate(self):
+        """
+            Shift the previous checkpoints down the rotation.  The current
+            checkpoint is linked, or copied, to <filename>.1 rather than
+            moved, so <filename> is there to restart from until the new
+            checkpoint replaces it.
+        """
+        filenames = self.get_rotated_filenames()
+        for index in range(len(filenames) - 1, 1, -1):
+            if os.path.exists(filenames[index - 1]):
+                os.replace(filenames[index - 1], filenames[index])
+        if len(filenames) > 1 and os.path.exists(self.filename):
+            if os.path.exists(filenames[1]):
+                os.remove(filenames[1])
+            try:
+                os.link(self.filename, filenames[1])
+            except OSError:
+                shutil.copyfile(self.filename, filenames[1])
@@ -103,6 +103,9 @@ class IntegratorConfig:
         self.dt = 0.002 * unit.picoseconds
         self.friction_coefficient = 1.0 * unit.picoseconds ** -1
         self.number_of_steps = IntegratorNumberOfStepsConfig()
+        # Switch to an integrator that only contains the production stage,
+        # once the GaMD equilibration is done.
+        self.lean_production = False
         return
 
     def serialize(self, root):
@@ -115,6 +118,7 @@ class IntegratorConfig:
         assign_tag(root, "friction-coefficient", self.friction_coefficient.value_in_unit(unit.picoseconds**-1))
         xml_number_of_steps_tags = ET.SubElement(root, "number-of-steps")
         self.number_of_steps.serialize(xml_number_of_steps_tags)
+        assign_tag(root, "lean-production", self.lean_production)
         return
 
 
@@ -191,12 +195,30 @@ class ForceFieldConfig:
         return
 
 
+class GamdRestartConfig:
+    def __init__(self):
+        # The gamd-restart.dat file with the boost parameters at the end of
+        # an earlier GaMD equilibration.
+        self.parameters = ""
+        # An optional OpenMM state XML file, such as gamd-restart.xml, with
+        # the positions, velocities and box vectors to start from.
+        self.state = None
+        return
+
+    def serialize(self, root):
+        assign_tag(root, "parameters", self.parameters)
+        if self.state is not None:
+            assign_tag(root, "state", self.state)
+        return
+
+
 class InputFilesConfig:
     def __init__(self):
         self.amber = None
         self.charmm = None
         self.gromacs = None
         self.forcefield = None
+        self.gamd_restart = None
         return
 
     def serialize(self, root):
@@ -212,6 +234,51 @@ class InputFilesConfig:
         if self.forcefield is not None:
             xml_forcefield_tags = ET.SubElement(root, "forcefield")
             self.forcefield.serialize(xml_forcefield_tags)
+        if self.gamd_restart is not None:
+            xml_gamd_restart_tags = ET.SubElement(root, "gamd-restart")
+            self.gamd_restart.serialize(xml_gamd_restart_tags)
+        return
+
+
+class ReactionCoordinateConfig:
+    def __init__(self):
+        # One of distance, angle or dihedral, between the atoms with these
+        # (zero based) indices.  Distances are in angstroms, and angles and
+        # dihedrals in degrees.
+        self.type = "distance"
+        self.atoms = []
+        self.minimum = 0.0
+        self.maximum = 10.0
+        self.bins = 50
+        return
+
+    def serialize(self, root):
+        assign_tag(root, "type", self.type)
+        assign_tag(root, "atoms", ", ".join(str(atom) for atom in self.atoms))
+        assign_tag(root, "minimum", self.minimum)
+        assign_tag(root, "maximum", self.maximum)
+        assign_tag(root, "bins", self.bins)
+        return
+
+
+class OnlineReweightingConfig:
+    def __init__(self):
+        # The PMF that is written at every checkpoint, from the running sums
+        # of the production frames.
+        self.method = "cumulant"
+        self.order = 2
+        self.cutoff = 10
+        self.reaction_coordinates = []
+        return
+
+    def serialize(self, root):
+        assign_tag(root, "method", self.method)
+        assign_tag(root, "order", self.order)
+        assign_tag(root, "cutoff", self.cutoff)
+        for reaction_coordinate in self.reaction_coordinates:
+            xml_reaction_coordinate_tags = ET.SubElement(
+                root, "reaction-coordinate")
+            reaction_coordinate.serialize(xml_reaction_coordinate_tags)
         return
 
 
@@ -221,7 +288,31 @@ class OutputsReportingConfig:
         self.coordinates_file_type = "DCD"
         self.coordinates_interval = 500
         self.restart_checkpoint_interval = 50000
+        self.restart_checkpoint_wall_clock_minutes = None
+        self.restart_checkpoint_keep = 1
         self.statistics_interval = 500
+        # How often the metrics file in the output directory is rewritten,
+        # in seconds of wall clock time.  None (or 0) disables the metrics
+        # file.
+        self.metrics_wall_clock_seconds = None
+        # Either "json" (metrics.json) or "prometheus" (metrics.prom).
+        self.metrics_format = "json"
+        # Either "text" for the usual logs, or "binary" for the binary logs
+        # of binlog.py, which binlog.convert_to_text() turns into text.
+        self.log_format = "text"
+        # Whether the integrator records the boost potentials of every step
+        # on the device, for gamd-boost-history.log.
+        self.boost_history = False
+        # In debug mode, the debug log records the globals of the integrator
+        # every debug_interval steps into a buffer on the device, which is
+        # only fetched once per coordinates interval, rather than stopping
+        # the run on every step.  0 keeps stopping on every step.
+        self.debug_interval = 0
+        # The names of the globals to record, or all of them if empty.
+        self.debug_globals = []
+        # An OnlineReweightingConfig, to keep the reweighting sums of the
+        # production frames during the run, or None.
+        self.reweighting = None
         return
 
     def compute_chunk_size(self):
@@ -237,6 +328,44 @@ class OutputsReportingConfig:
         assign_tag(xml_coordinates_tags, "file-type", self.coordinates_file_type)
         xml_statistics_tags = ET.SubElement(root, "statistics")
         assign_tag(xml_statistics_tags, "interval", self.statistics_interval)
+        xml_restart_checkpoint_tags = ET.SubElement(root, "restart-checkpoint")
+        assign_tag(xml_restart_checkpoint_tags, "interval", self.restart_checkpoint_interval)
+        if self.restart_checkpoint_wall_clock_minutes is not None:
+            assign_tag(xml_restart_checkpoint_tags, "wall-clock-minutes",
+                       self.restart_checkpoint_wall_clock_minutes)
+        assign_tag(xml_restart_checkpoint_tags, "keep", self.restart_checkpoint_keep)
+        if self.metrics_wall_clock_seconds is not None:
+            xml_metrics_tags = ET.SubElement(root, "metrics")
+            assign_tag(xml_metrics_tags, "wall-clock-seconds",
+                       self.metrics_wall_clock_seconds)
+            assign_tag(xml_metrics_tags, "format", self.metrics_format)
+        assign_tag(root, "log-format", self.log_format)
+        assign_tag(root, "boost-history", self.boost_history)
+        if self.debug_interval:
+            xml_debug_tags = ET.SubElement(root, "debug")
+            assign_tag(xml_debug_tags, "interval", self.debug_interval)
+            if self.debug_globals:
+                assign_tag(xml_debug_tags, "globals",
+                           ", ".join(self.debug_globals))
+        if self.reweighting is not None:
+            xml_reweighting_tags = ET.SubElement(root, "reweighting")
+            self.reweighting.serialize(xml_reweighting_tags)
+        return
+
+
+class SystemCacheConfig:
+    def __init__(self):
+        # The directory of the cache of the Systems built from the input
+        # files (see system_cache.py), which can be shared between runs.
+        # Empty puts it in system-cache next to the output directory.
+        self.directory = ""
+        # The least recently used Systems are evicted past this size.
+        self.max_size = 2048  # megabytes
+        return
+
+    def serialize(self, root):
+        assign_tag(root, "directory", self.directory)
+        assign_tag(root, "max-size", self.max_size)
         return
 
 
@@ -266,6 +395,12 @@ class Config:
         self.integrator = IntegratorConfig()
         self.input_files = InputFilesConfig()
         self.outputs = OutputsConfig()
+        self.system_cache = None #SystemCacheConfig()
+        # A directory in which the CUDA platform keeps the kernels it
+        # compiles, so that later runs and ensemble members load them
+        # instead of compiling them again.  The default is the temporary
+        # directory, which is often per job on clusters.
+        self.kernel_cache = None
 
     def serialize(self, filename):
         root = ET.Element('gamd')
@@ -282,6 +417,11 @@ class Config:
         self.input_files.serialize(xml_input_files)
         xml_outputs = ET.SubElement(root, "outputs")
         self.outputs.serialize(xml_outputs)
+        if self.system_cache is not None:
+            xml_system_cache = ET.SubElement(root, "system-cache")
+            self.system_cache.serialize(xml_system_cache)
+        if self.kernel_cache is not None:
+            assign_tag(root, "kernel-cache", self.kernel_cache)
 
         xmlstr = minidom.parseString(ET.tostring(root)).toprettyxml(
             indent="    ")
@@ -0,0 +1,316 @@
+"""
+ensemble.py:  Run a campaign of many GaMD simulations side by side.
+
+The EnsembleLauncher runs its jobs in a pool of worker processes, where each
+worker owns a slot:  a GPU device, or a subset of the CPU cores on the CPU
+platform.  Only a bounded number of jobs is handed to the pool at a time,
+and a job that fails is run again from its last checkpoint.
+
+"""
+
+import collections
+import concurrent.futures
+import copy
+import datetime
+import multiprocessing
+import os
+import shutil
+import time
+
+import openmm.unit as unit
+
+from gamd.checkpointer import RESTART_CHECKPOINT_FILENAME
+from gamd.gamdSimulation import GamdSimulationFactory
+from gamd.runners import Runner
+
+# The slot that the jobs in this worker process run on.
+_worker_slot = None
+
+
+class WorkerSlot:
+    def __init__(self, device_index="0", properties=None, cpu_set=None):
+        """
+        Parameters
+        ----------
+        :param device_index: The device index handed to the simulation
+                             factory, for the CUDA and OpenCL platforms.
+        :param properties:   Additional platform properties, such as the
+                             number of threads of the CPU platform.
+        :param cpu_set:      The CPU cores that the worker is pinned to, or
+                             None to leave the worker unpinned.
+        """
+        self.device_index = device_index
+        self.properties = properties if properties is not None else {}
+        self.cpu_set = cpu_set
+
+
+class EnsembleJob:
+    def __init__(self, config, restart=False):
+        self.config = config
+        self.restart = restart
+        self.attempts = 0
+        # Whether the output directory was there before the first attempt.
+        self.output_existed = None
+
+    def get_name(self):
+        return self.config.outputs.directory
+
+    def get_number_of_steps(self):
+        number_of_steps = self.config.integrator.number_of_steps
+        if self.config.input_files.gamd_restart is not None:
+            return number_of_steps.gamd_production
+        return number_of_steps.total_simulation_length
+
+    def get_simulation_time(self):
+        return self.get_number_of_steps() * self.config.integrator.dt
+
+    def get_checkpoint_filename(self):
+        return os.path.join(self.config.outputs.directory,
+                            RESTART_CHECKPOINT_FILENAME)
+
+    def prepare_retry(self):
+        """
+            Run the job again from its checkpoint.  A job that failed before
+            its first checkpoint starts over, so the output directory its
+            failed attempt created is removed first.  An output directory
+            that was there before the job is left alone.
+        """
+        self.restart = os.path.exists(self.get_checkpoint_filename())
+        if not self.restart and not self.output_existed:
+            shutil.rmtree(self.get_name(), ignore_errors=True)
+
+
+def get_available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def create_worker_slots(platform_name, device_indices, number_of_workers=None):
+    """
+        Create one slot per device index for the GPU platforms.  For the CPU
+        platform, the available cores are split into number_of_workers
+        subsets, one per worker, and each worker's context only starts as
+        many threads as it has cores.
+    """
+    user_platform_name = platform_name.lower()
+    if user_platform_name in ["cuda", "opencl"]:
+        return [WorkerSlot(device_index) for device_index in device_indices]
+
+    if number_of_workers is None:
+        number_of_workers = len(device_indices)
+    if number_of_workers < 1:
+        raise ValueError("The number of workers must be at least 1.")
+    if user_platform_name != "cpu":
+        return [WorkerSlot() for unused_index in range(number_of_workers)]
+
+    cpus = get_available_cpus()
+    if number_of_workers > len(cpus):
+        raise ValueError("Cannot run %d CPU workers on %d cores."
+                         % (number_of_workers, len(cpus)))
+    slots = []
+    for index in range(number_of_workers):
+        cpu_set = cpus[index * len(cpus) // number_of_workers:
+                       (index + 1) * len(cpus) // number_of_workers]
+        slots.append(WorkerSlot(properties={"Threads": str(len(cpu_set))},
+                                cpu_set=cpu_set))
+    return slots
+
+
+def create_replica_configs(config, number_of_replicas):
+    """
+        Create the configuration of each replica of a simulation, with its
+        own output directory below the configured one and its own random
+        seed.  A random seed of 0 is left as it is, since OpenMM then picks a
+        new seed for each context.
+    """
+    if number_of_replicas < 1:
+        raise ValueError("The number of replicas must be at least 1.")
+
+    replica_configs = []
+    for index in range(number_of_replicas):
+        replica_config = copy.deepcopy(config)
+        replica_config.outputs.directory = os.path.join(
+            config.outputs.directory, "replica-%d" % (index + 1))
+        if config.integrator.random_seed != 0:
+            replica_config.integrator.random_seed = \
+                config.integrator.random_seed + index
+        replica_configs.append(replica_config)
+    return replica_configs
+
+
+def _initialize_worker(slot_queue):
+    global _worker_slot
+    _worker_slot = slot_queue.get()
+    if _worker_slot.cpu_set is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, _worker_slot.cpu_set)
+
+
+def run_job(config, platform_name, restart=False, runner_class=Runner,
+            profile=False, debug=False):
+    """
+        Run a single simulation on the slot of this worker.
+
+        :return: The number of seconds the simulation took.
+    """
+    start_time = time.time()
+    gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+        config, platform_name, _worker_slot.device_index,
+        _worker_slot.properties, debug=debug, restart=restart)
+    runner = runner_class(config, gamd_simulation, debug)
+    runner.run(restart, profile)
+    return time.time() - start_time
+
+
+def print_ensemble_throughput(results, elapsed_seconds):
+    total_nanoseconds = 0.0
+    for name, number_of_steps, simulation_time, seconds in results:
+        nanoseconds = simulation_time.value_in_unit(unit.nanoseconds)
+        total_nanoseconds += nanoseconds
+        print("Job:", name, "\t", str(number_of_steps), "steps in",
+              "%.1f" % seconds, "seconds,",
+              "%.3f" % (nanoseconds / seconds * 3600 * 24), "ns per day.")
+    print("Aggregate daily execution rate:",
+          str(total_nanoseconds / elapsed_seconds * 3600 * 24),
+          " ns per day.")
+
+
+class EnsembleLauncher:
+    def __init__(self, platform_name, worker_slots, runner_class=Runner,
+                 max_retries=2, max_queued_jobs=None, profile=False,
+                 debug=False):
+        """
+        Parameters
+        ----------
+        :param platform_name:   The OpenMM platform to run all jobs on.
+        :param worker_slots:    The WorkerSlot of each worker process.
+        :param runner_class:    The Runner class to run each job with.
+        :param max_retries:     How many times a failed job is run again
+                                before the launcher gives up on it.
+        :param max_queued_jobs: The most jobs handed to the pool at a time.
+                                By default, each worker has one job running
+                                and one waiting.
+        :param profile:         Whether to profile each job, into its own
+                                output directory.
+        :param debug:           Whether to run each job in debug mode, with
+                                the debug logs in its own output directory.
+        """
+        self.platform_name = platform_name
+        self.worker_slots = worker_slots
+        self.runner_class = runner_class
+        self.max_retries = max_retries
+        if max_queued_jobs is None:
+            max_queued_jobs = 2 * len(worker_slots)
+        self.max_queued_jobs = max_queued_jobs
+        self.profile = profile
+        self.debug = debug
+        self.failed_jobs = []
+
+    def __create_executor(self):
+        #
+        # Worker processes are spawned rather than forked, since a forked
+        # process cannot safely use a GPU platform that its parent already
+        # initialized.
+        #
+        mp_context = multiprocessing.get_context("spawn")
+        slot_queue = mp_context.Queue()
+        for slot in self.worker_slots:
+            slot_queue.put(slot)
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=len(self.worker_slots), mp_context=mp_context,
+            initializer=_initialize_worker, initargs=(slot_queue,))
+
+    def __retry_or_fail(self, job, error, pending_jobs):
+        print("Job failed:", job.get_name(), "on attempt", job.attempts,
+              "with:", repr(error))
+        if job.attempts > self.max_retries:
+            self.failed_jobs.append(job)
+            return
+        job.prepare_retry()
+        pending_jobs.append(job)
+
+    @staticmethod
+    def __print_progress(completed_nanoseconds, total_nanoseconds,
+                         number_completed, number_of_jobs, elapsed_seconds):
+        nanoseconds_per_second = completed_nanoseconds / elapsed_seconds
+        remaining_seconds = ((total_nanoseconds - completed_nanoseconds)
+                             / nanoseconds_per_second)
+        print("Campaign:", number_completed, "of", number_of_jobs,
+              "jobs done, ", "%.3f" % (nanoseconds_per_second * 3600 * 24),
+              "ns per day, ETA:",
+              str(datetime.timedelta(seconds=round(remaining_seconds))))
+
+    def run(self, jobs):
+        """
+            Run all of the jobs, and return the name, number of steps,
+            simulated time and wall clock seconds of each job that finished.
+            Jobs that kept failing are left in failed_jobs.
+        """
+        pending_jobs = collections.deque(jobs)
+        running_jobs = {}
+        results = []
+        total_nanoseconds = sum(
+            job.get_simulation_time().value_in_unit(unit.nanoseconds)
+            for job in jobs)
+        completed_nanoseconds = 0.0
+        start_time = time.time()
+        executor = self.__create_executor()
+        try:
+            while pending_jobs or running_jobs:
+                while (pending_jobs and
+                       len(running_jobs) < self.max_queued_jobs):
+                    job = pending_jobs.popleft()
+                    if job.output_existed is None:
+                        job.output_existed = os.path.exists(job.get_name())
+                    job.attempts += 1
+                    future = executor.submit(
+                        run_job, job.config, self.platform_name, job.restart,
+                        self.runner_class, self.profile, self.debug)
+                    running_jobs[future] = job
+
+                done, unused_not_done = concurrent.futures.wait(
+                    running_jobs,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                pool_is_broken = False
+                for future in done:
+                    job = running_jobs.pop(future)
+                    try:
+                        seconds = future.result()
+                    except (Exception, SystemExit) as error:
+                        if isinstance(error, concurrent.futures.process
+                                      .BrokenProcessPool):
+                            pool_is_broken = True
+                        self.__retry_or_fail(job, error, pending_jobs)
+                        continue
+                    simulation_time = job.get_simulation_time()
+                    results.append([job.get_name(),
+                                    job.get_number_of_steps(),
+                                    simulation_time, seconds])
+                    completed_nanoseconds += simulation_time.value_in_unit(
+                        unit.nanoseconds)
+                    self.__print_progress(
+                        completed_nanoseconds, total_nanoseconds,
+                        len(results), len(jobs), time.time() - start_time)
+
+                if pool_is_broken:
+                    #
+                    # A worker process died, which takes down every job
+                    # that is still in the pool.  Those jobs did not fail
+                    # themselves, so they are queued again without counting
+                    # the attempt.
+                    #
+                    executor.shutdown(wait=False)
+                    for job in running_jobs.values():
+                        job.attempts -= 1
+                        job.prepare_retry()
+                        pending_jobs.appendleft(job)
+                    running_jobs = {}
+                    executor = self.__create_executor()
+        finally:
+            executor.shutdown()
+
+        print_ensemble_throughput(results, time.time() - start_time)
+        for job in self.failed_jobs:
+            print("Job gave up after", job.attempts, "attempts:",
+                  job.get_name())
+        return results
@@ -7,24 +7,26 @@ GaMD simulation.
 @author: lvotapka
 """
 import os
+import time
 
-import parmed
 import openmm as openmm
 import openmm.app as openmm_app
 import openmm.unit as unit
 
 from gamd import parser
-# change to generic integrator someday
-from gamd.langevin.total_boost_integrators import LowerBoundIntegrator as TotalLowerBoundIntegrator
-from gamd.langevin.total_boost_integrators import UpperBoundIntegrator as TotalUpperBoundIntegrator
-from gamd.langevin.dihedral_boost_integrators import LowerBoundIntegrator as DihedralLowerBoundIntegrator
-from gamd.langevin.dihedral_boost_integrators import UpperBoundIntegrator as DihedralUpperBoundIntegrator
-from gamd.langevin.dual_boost_integrators import LowerBoundIntegrator as DualLowerBoundIntegrator
-from gamd.langevin.dual_boost_integrators import UpperBoundIntegrator as DualUpperBoundIntegrator
-from gamd.integrator_factory import *
+from gamd.checkpointer import RESTART_CHECKPOINT_FILENAME, \
+    check_restart_checkpoint
+from gamd.DebugLogger import get_debug_global_names
+from gamd.system_cache import SystemCache, get_gromacs_include_dir, \
+    get_system_cache_directory, get_system_cache_key
+from gamd.integrator_factory import GamdIntegratorFactory
 
 
 def load_pdb_positions_and_box_vectors(pdb_coords_filename, need_box):
+    # ParmEd takes longer to import than the rest of gamd put together, and
+    # it is only needed for the box vectors of PDB files.
+    import parmed
+
     positions = openmm_app.PDBFile(pdb_coords_filename)
     pdb_parmed = parmed.load_file(pdb_coords_filename)
     if need_box:
@@ -48,13 +50,48 @@ class GamdSimulation:
         self.second_boost_type = None
         self.platform = "CUDA"
         self.device_index = 0
+        # The seconds each phase of createGamdSimulation() took.
+        self.startup_seconds = {}
+
+    def switch_integrator(self, integrator):
+        """
+            Replace the integrator of the simulation with another GaMD
+            integrator for the same system.  The new context is created on
+            the same platform with the same properties, and picks up the
+            positions, velocities, box vectors, time and step count of the
+            old one, along with the global variables that the integrators
+            share, which includes the boost statistics.
+        """
+        old_context = self.simulation.context
+        platform = old_context.getPlatform()
+        properties = {name: platform.getPropertyValue(old_context, name)
+                      for name in platform.getPropertyNames()}
+        state = old_context.getState(getPositions=True, getVelocities=True,
+                                     getParameters=True)
+        context = openmm.Context(self.system, integrator, platform,
+                                 properties)
+        context.setState(state)
+        integrator.take_over_globals(self.integrator)
+        self.simulation.context = context
+        self.simulation.integrator = integrator
+        self.integrator = integrator
 
 
 class GamdSimulationFactory:
     def __init__(self):
         return
 
-    def createGamdSimulation(self, config, platform_name, device_index):
+    def createGamdSimulation(self, config, platform_name, device_index,
+                             platform_properties=None, debug=False,
+                             restart=False):
+        """
+            Create the System, the integrator and the Simulation of the
+            configuration.  With restart, the checkpoint in the output
+            directory is checked against the System before the context is
+            created, and the positions, box vectors, minimization and
+            velocities are left out, since loading the checkpoint replaces
+            all of them.
+        """
         need_box = True
         if config.system.nonbonded_method == "pme":
             nonbondedMethod = openmm_app.PME
@@ -93,8 +130,147 @@ class GamdSimulationFactory:
             raise Exception("constraints not found: %s",
                             config.system.constraints)
 
-        box_vectors = None
         gamdSimulation = GamdSimulation()
+        startup_seconds = gamdSimulation.startup_seconds
+        start_time = time.perf_counter()
+        system_cache = None
+        loaded_system = None
+        if config.system_cache is not None:
+            system_cache = SystemCache(
+                get_system_cache_directory(config),
+                config.system_cache.max_size)
+            system_cache_key = get_system_cache_key(config)
+            loaded_system = system_cache.load(system_cache_key)
+        if loaded_system is None:
+            loaded_system = self.load_system(config, nonbondedMethod,
+                                             constraints, need_box)
+            if system_cache is not None:
+                system_cache.store(system_cache_key, *loaded_system)
+        topology, gamdSimulation.system, positions, box_vectors = \
+            loaded_system
+        startup_seconds["system"] = time.perf_counter() - start_time
+
+        if restart:
+            check_restart_checkpoint(
+                os.path.join(config.outputs.directory,
+                             RESTART_CHECKPOINT_FILENAME),
+                platform_name, gamdSimulation.system.getNumParticles())
+
+        start_time = time.perf_counter()
+        [gamdSimulation.first_boost_group,
+         gamdSimulation.second_boost_group,
+         gamdSimulation.integrator, gamdSimulation.first_boost_type,
+         gamdSimulation.second_boost_type] = self.createGamdIntegrator(
+            config, gamdSimulation.system,
+            production_only=config.input_files.gamd_restart is not None,
+            debug=debug)
+
+        if config.barostat is not None:
+            barostat = openmm.MonteCarloBarostat(
+                config.barostat.pressure,
+                config.temperature,
+                config.barostat.frequency)
+            gamdSimulation.system.addForce(barostat)
+        startup_seconds["integrator"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        properties = {}
+        if platform_properties is not None:
+            properties.update(platform_properties)
+        user_platform_name = platform_name.lower()
+        #
+        # NOTE:  The Platform names are case sensitive.  From the OpenMM
+        # docs "The platform name should be one of OpenCL, CUDA, CPU,
+        # or Reference."
+        #
+        if user_platform_name == "cuda":
+            platform = openmm.Platform.getPlatformByName('CUDA')
+            properties.setdefault('CudaPrecision', 'mixed')
+            if config.kernel_cache is not None:
+                os.makedirs(config.kernel_cache, exist_ok=True)
+                properties.setdefault('CudaTempDirectory',
+                                      os.path.abspath(config.kernel_cache))
+            properties['DeviceIndex'] = device_index
+            gamdSimulation.simulation = openmm_app.Simulation(
+                topology, gamdSimulation.system,
+                gamdSimulation.integrator, platform, properties)
+            gamdSimulation.device_index = device_index
+            gamdSimulation.platform = 'CUDA'
+        elif user_platform_name == "opencl":
+            platform = openmm.Platform.getPlatformByName('OpenCL')
+            properties['DeviceIndex'] = device_index
+            gamdSimulation.simulation = openmm_app.Simulation(
+                topology, gamdSimulation.system,
+                gamdSimulation.integrator, platform, properties)
+            gamdSimulation.device_index = device_index
+            gamdSimulation.platform = 'OpenCL'
+        else:
+            platform = openmm.Platform.getPlatformByName(platform_name)
+            gamdSimulation.simulation = openmm_app.Simulation(
+                topology, gamdSimulation.system,
+                gamdSimulation.integrator, platform, properties)
+            gamdSimulation.platform = platform_name
+        startup_seconds["context"] = time.perf_counter() - start_time
+
+        if restart:
+            print("Restarting:  skipped the positions, minimization and "
+                  "velocities that the checkpoint replaces.  Startup took "
+                  "%.2f s." % sum(startup_seconds.values()))
+        else:
+            self.initialize_state(config, gamdSimulation, positions,
+                                  box_vectors)
+
+        if config.outputs.reporting.coordinates_file_type == "dcd":
+            gamdSimulation.traj_reporter = openmm_app.DCDReporter
+
+        elif config.outputs.reporting.coordinates_file_type == "pdb":
+            gamdSimulation.traj_reporter = openmm_app.PDBReporter
+
+        else:
+            raise Exception("Reporter type not found:",
+                            config.outputs.reporting.coordinates_file_type)
+    
+        return gamdSimulation
+
+    def initialize_state(self, config, gamdSimulation, positions,
+                         box_vectors):
+        """
+            Set the positions and box vectors read from the input files on
+            the context, minimize the energy if the configuration asks for
+            it, and draw the velocities.
+        """
+        startup_seconds = gamdSimulation.startup_seconds
+        start_time = time.perf_counter()
+        gamdSimulation.simulation.context.setPositions(positions)
+        #
+        # If this isn't a charmm configuration, but box vectors were defined,
+        # then we can setup the box vectors after the simulation
+        # object has been created.  (charmm psf requires it prior to the
+        # simulation creation.)
+        #
+        if box_vectors is not None and config.input_files.charmm is None:
+            gamdSimulation.simulation.context.setPeriodicBoxVectors(
+                *box_vectors)
+        if config.run_minimization:
+            gamdSimulation.simulation.minimizeEnergy()
+            startup_seconds["minimization"] = \
+                time.perf_counter() - start_time
+            start_time = time.perf_counter()
+
+        gamdSimulation.simulation.context.setVelocitiesToTemperature(
+            config.temperature)
+        startup_seconds["velocities"] = time.perf_counter() - start_time
+
+    def load_system(self, config, nonbondedMethod, constraints, need_box):
+        """
+            Read the input files of the configuration, and create the
+            System from them.
+
+            :return: The topology, the System, the positions and the box
+                     vectors, which are None when the input files do not
+                     set them on the context.
+        """
+        box_vectors = None
         if config.input_files.amber is not None:
             prmtop = openmm_app.AmberPrmtopFile(
                 config.input_files.amber.topology)
@@ -111,7 +287,7 @@ class GamdSimulationFactory:
             else:
                 raise Exception("Invalid input type: %s. Allowed types are: "\
                                 "'pdb' and 'rst7'/'inpcrd'.")
-            gamdSimulation.system = prmtop.createSystem(
+            system = prmtop.createSystem(
                 nonbondedMethod=nonbondedMethod,
                 nonbondedCutoff=config.system.nonbonded_cutoff,
                 constraints=constraints)
@@ -138,7 +314,7 @@ class GamdSimulationFactory:
                 *config.input_files.charmm.parameters)
 
             topology = psf
-            gamdSimulation.system = psf.createSystem(
+            system = psf.createSystem(
                 params=params,
                 nonbondedMethod=nonbondedMethod,
                 nonbondedCutoff=config.system.nonbonded_cutoff,
@@ -152,11 +328,12 @@ class GamdSimulationFactory:
             top = openmm_app.GromacsTopFile(
                 config.input_files.gromacs.topology,
                 periodicBoxVectors=gro.getPeriodicBoxVectors(),
-                includeDir=config.input_files.gromacs.include_dir)
+                includeDir=get_gromacs_include_dir(
+                    config.input_files.gromacs.include_dir))
             box_vectors = gro.getPeriodicBoxVectors()
             topology = top
             positions = gro
-            gamdSimulation.system = top.createSystem(
+            system = top.createSystem(
                 nonbondedMethod=nonbondedMethod,
                 nonbondedCutoff=config.system.nonbonded_cutoff,
                 constraints=constraints)
@@ -170,7 +347,7 @@ class GamdSimulationFactory:
                 + config.input_files.forcefield.forcefield_list_external
             forcefield = openmm_app.ForceField(*forcefield_filenames)
             topology = positions
-            gamdSimulation.system = forcefield.createSystem(
+            system = forcefield.createSystem(
                 topology.topology,
                 nonbondedMethod=nonbondedMethod,
                 nonbondedCutoff=config.system.nonbonded_cutoff,
@@ -180,97 +357,76 @@ class GamdSimulationFactory:
             raise Exception("No valid input files found. OpenMM simulation "\
                             "not made.")
 
+        return topology.topology, system, positions.positions, box_vectors
+
+    def createGamdIntegrator(self, config, system, production_only=False,
+                             debug=False):
+        """
+            Create the GaMD integrator for the system described by the
+            configuration.  A production only integrator leaves out all of
+            the stages before the GaMD production stage, so it has to be
+            handed the boost statistics of an integrator that ran them, or
+            the ones saved in a gamd-restart.dat file.  In debug mode, with
+            a debug interval, the integrator records the debugged globals
+            in its "debug" history.
+        """
+        number_of_steps = config.integrator.number_of_steps
+        if production_only:
+            ntcmdprep, ntcmd, ntebprep, nteb = 0, 0, 0, 0
+        else:
+            ntcmdprep = number_of_steps.conventional_md_prep
+            ntcmd = number_of_steps.conventional_md
+            ntebprep = number_of_steps.gamd_equilibration_prep
+            nteb = number_of_steps.gamd_equilibration
+
         if config.integrator.algorithm == "langevin":
             boost_type_str = config.integrator.boost_type
             gamdIntegratorFactory = GamdIntegratorFactory()
             result = gamdIntegratorFactory.get_integrator(
-                boost_type_str, gamdSimulation.system, config.temperature,
-                config.integrator.dt,
-                config.integrator.number_of_steps.conventional_md_prep,
-                config.integrator.number_of_steps.conventional_md,
-                config.integrator.number_of_steps.gamd_equilibration_prep,
-                config.integrator.number_of_steps.gamd_equilibration,
-                config.integrator.number_of_steps.total_simulation_length,
-                config.integrator.number_of_steps.averaging_window_interval,
+                boost_type_str, system, config.temperature,
+                config.integrator.dt, ntcmdprep, ntcmd, ntebprep, nteb,
+                number_of_steps.total_simulation_length,
+                number_of_steps.averaging_window_interval,
                 sigma0p=config.integrator.sigma0.primary,
                 sigma0d=config.integrator.sigma0.secondary)
-            [gamdSimulation.first_boost_group,
-             gamdSimulation.second_boost_group,
-             integrator, gamdSimulation.first_boost_type,
-             gamdSimulation.second_boost_type] = result
-            integrator.setRandomNumberSeed(config.integrator.random_seed)
+            integrator = result[2]
+            random_seed = config.integrator.random_seed
+            if production_only and random_seed != 0:
+                #
+                # Reusing the seed would replay the random forces from the
+                # start of the run.
+                #
+                random_seed += 1
+            integrator.setRandomNumberSeed(random_seed)
             integrator.setFriction(config.integrator.friction_coefficient)
-            gamdSimulation.integrator = integrator
+            if config.outputs.reporting.boost_history:
+                integrator.add_boost_history(
+                    config.outputs.reporting.coordinates_interval,
+                    system.getNumParticles())
+            if debug and config.outputs.reporting.debug_interval:
+                self.add_debug_history(config, system, integrator)
 
         else:
             raise Exception("Algorithm not implemented:",
                             config.integrator.algorithm)
 
-        if config.barostat is not None:
-            barostat = openmm.MonteCarloBarostat(
-                config.barostat.pressure,
-                config.temperature,
-                config.barostat.frequency)
-            gamdSimulation.system.addForce(barostat)
-
-        properties = {}
-        user_platform_name = platform_name.lower()
-        #
-        # NOTE:  The Platform names are case sensitive.  From the OpenMM
-        # docs "The platform name should be one of OpenCL, CUDA, CPU,
-        # or Reference."
-        #
-        if user_platform_name == "cuda":
-            platform = openmm.Platform.getPlatformByName('CUDA')
-            properties['CudaPrecision'] = 'mixed'
-            properties['DeviceIndex'] = device_index
-            gamdSimulation.simulation = openmm_app.Simulation(
-                topology.topology, gamdSimulation.system,
-                gamdSimulation.integrator, platform, properties)
-            gamdSimulation.device_index = device_index
-            gamdSimulation.platform = 'CUDA'
-        elif user_platform_name == "opencl":
-            platform = openmm.Platform.getPlatformByName('OpenCL')
-            properties['DeviceIndex'] = device_index
-            gamdSimulation.simulation = openmm_app.Simulation(
-                topology.topology, gamdSimulation.system,
-                gamdSimulation.integrator, platform, properties)
-            gamdSimulation.device_index = device_index
-            gamdSimulation.platform = 'OpenCL'
-        else:
-            platform = openmm.Platform.getPlatformByName(platform_name)
-            gamdSimulation.simulation = openmm_app.Simulation(
-                topology.topology, gamdSimulation.system,
-                gamdSimulation.integrator, platform)
-            gamdSimulation.platform = platform_name
-
-        gamdSimulation.simulation.context.setPositions(positions.positions)
-        #
-        # If this isn't a charmm configuration, but box vectors were defined,
-        # then we can setup the box vectors after the simulation
-        # object has been created.  (charmm psf requires it prior to the
-        # simulation creation.)
-        #
-        if box_vectors is not None and config.input_files.charmm is None:
-            gamdSimulation.simulation.context.setPeriodicBoxVectors(
-                *box_vectors)
-        if config.run_minimization:
-            gamdSimulation.simulation.minimizeEnergy()
-
-        gamdSimulation.simulation.context.setVelocitiesToTemperature(
-            config.temperature)
-
-        if config.outputs.reporting.coordinates_file_type == "dcd":
-            gamdSimulation.traj_reporter = openmm_app.DCDReporter
-
-        elif config.outputs.reporting.coordinates_file_type == "pdb":
-            gamdSimulation.traj_reporter = openmm_app.PDBReporter
-
-        else:
-            raise Exception("Reporter type not found:",
-                            config.outputs.reporting.coordinates_file_type)
-    
-        return gamdSimulation
+        return result
+
+    @staticmethod
+    def add_debug_history(config, system, integrator):
+        """
+            The history holds up to a coordinates interval of records, as
+            far as the degrees of freedom of the system allow.
+        """
+        reporting = config.outputs.reporting
+        names = get_debug_global_names(integrator, reporting.debug_globals)
+        number_of_values = len(set(names) | {"stepCount"})
+        length = min(max(reporting.coordinates_interval
+                         // reporting.debug_interval, 1),
+                     3 * system.getNumParticles() // number_of_values)
+        integrator.add_globals_history("debug", names, max(length, 1),
+                                       system.getNumParticles(),
+                                       reporting.debug_interval)
 
 
 if __name__ == "__main__":
@@ -52,7 +52,8 @@ def set_single_group(group, name_list, system):
 
 
 
-def create_gamd_cmd_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave):
+def create_gamd_cmd_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
+                               fused_force_groups=False, optimized_program=True):
     """
         This integrator is meant for use in generating a conventional MD baseline to compare against
         for the other integrators.
@@ -65,94 +66,120 @@ def create_gamd_cmd_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebpr
     integrator = DihedralBoostLowerBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd,
                                                    ntebprep=ntebprep, nteb=nteb, nstlim=nstlim,
                                                    ntave=ntave, temperature=temperature,
-                                                   sigma0=0.0 * unit.kilocalories_per_mole)
+                                                   sigma0=0.0 * unit.kilocalories_per_mole,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_lower_total_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                        sigma0=6.0 * unit.kilocalories_per_mole):
+                                        sigma0=6.0 * unit.kilocalories_per_mole,
+                                        fused_force_groups=False, optimized_program=True):
     # The group is set, so that we can output the dihedral energy.  It doesn't impact calculations for total boost,
     # since we are utilizing the OpenMM provided variables with them not split out for total boost calculations.
     group = set_dihedral_group(system)
     integrator = TotalBoostLowerBoundIntegrator(dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd,
                                                 ntebprep=ntebprep, nteb=nteb, nstlim=nstlim,
-                                                ntave=ntave, sigma0=sigma0, temperature=temperature)
+                                                ntave=ntave, sigma0=sigma0, temperature=temperature,
+                                                fused_force_groups=fused_force_groups,
+                                                optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_upper_total_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                        sigma0=6.0 * unit.kilocalories_per_mole):
+                                        sigma0=6.0 * unit.kilocalories_per_mole,
+                                        fused_force_groups=False, optimized_program=True):
     # The group is set, so that we can output the dihedral energy.  It doesn't impact calculations for total boost,
     # since we are utilizing the OpenMM provided variables with them not split out for total boost calculations.
     group = set_dihedral_group(system)
     integrator = TotalBoostUpperBoundIntegrator(dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd,
                                                 ntebprep=ntebprep, nteb=nteb, nstlim=nstlim,
                                                 ntave=ntave, sigma0=sigma0,
-                                                temperature=temperature)
+                                                temperature=temperature,
+                                                fused_force_groups=fused_force_groups,
+                                                optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_lower_dihedral_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                           sigma0=6.0 * unit.kilocalories_per_mole):
+                                           sigma0=6.0 * unit.kilocalories_per_mole,
+                                           fused_force_groups=False, optimized_program=True):
     group = set_dihedral_group(system)
     integrator = DihedralBoostLowerBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd, ntebprep=ntebprep,
                                                    nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0=sigma0,
-                                                   temperature=temperature)
+                                                   temperature=temperature,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_upper_dihedral_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                           sigma0=6.0 * unit.kilocalories_per_mole):
+                                           sigma0=6.0 * unit.kilocalories_per_mole,
+                                           fused_force_groups=False, optimized_program=True):
     group = set_dihedral_group(system)
     integrator = DihedralBoostUpperBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd, ntebprep=ntebprep,
                                                    nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0=sigma0,
-                                                   temperature=temperature)
+                                                   temperature=temperature,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_lower_dual_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
                                        sigma0p=6.0 * unit.kilocalories_per_mole,
-                                       sigma0d=6.0 * unit.kilocalories_per_mole):
+                                       sigma0d=6.0 * unit.kilocalories_per_mole,
+                                       fused_force_groups=False, optimized_program=True):
     group = set_dihedral_group(system)
     integrator = DualBoostLowerBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd, ntebprep=ntebprep,
                                                nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0p=sigma0p,
-                                               sigma0d=sigma0d, temperature=temperature)
+                                               sigma0d=sigma0d, temperature=temperature,
+                                               fused_force_groups=fused_force_groups,
+                                               optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_upper_dual_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                       sigma0p=6.0 * unit.kilocalories_per_mole, sigma0d=6.0 * unit.kilocalories_per_mole):
+                                       sigma0p=6.0 * unit.kilocalories_per_mole, sigma0d=6.0 * unit.kilocalories_per_mole,
+                                       fused_force_groups=False, optimized_program=True):
     group = set_dihedral_group(system)
     integrator = DualBoostUpperBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd, ntebprep=ntebprep,
                                                nteb=nteb, nstlim=nstlim, ntave=ntave,
                                                sigma0d=sigma0d,
-                                               sigma0p=sigma0p, temperature=temperature)
+                                               sigma0p=sigma0p, temperature=temperature,
+                                               fused_force_groups=fused_force_groups,
+                                               optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_lower_non_bonded_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                             sigma0=6.0 * unit.kilocalories_per_mole):
+                                             sigma0=6.0 * unit.kilocalories_per_mole,
+                                             fused_force_groups=False, optimized_program=True):
     group = set_non_bonded_group(system)
     integrator = NonBondedLowerBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd, ntebprep=ntebprep,
                                                nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0=sigma0,
-                                               temperature=temperature)
+                                               temperature=temperature,
+                                               fused_force_groups=fused_force_groups,
+                                               optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
 
 def create_upper_non_bonded_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                                             sigma0=6.0 * unit.kilocalories_per_mole):
+                                             sigma0=6.0 * unit.kilocalories_per_mole,
+                                             fused_force_groups=False, optimized_program=True):
     group = set_non_bonded_group(system)
     integrator = NonBondedUpperBoundIntegrator(group, dt=dt, ntcmdprep=ntcmdprep, ntcmd=ntcmd, ntebprep=ntebprep,
                                                nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0=sigma0,
-                                               temperature=temperature)
+                                               temperature=temperature,
+                                               fused_force_groups=fused_force_groups,
+                                               optimized_program=optimized_program)
     result = ["", group, integrator]
     return result
 
@@ -160,14 +187,17 @@ def create_upper_non_bonded_boost_integrator(system, temperature, dt, ntcmdprep,
 def create_lower_dual_non_bonded_dihederal_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
                                                             ntebprep, nteb, nstlim, ntave,
                                                             sigma0p=6.0 * unit.kilocalories_per_mole,
-                                                            sigma0d=6.0 * unit.kilocalories_per_mole):
+                                                            sigma0d=6.0 * unit.kilocalories_per_mole,
+                                                            fused_force_groups=False, optimized_program=True):
     nonbonded_group = set_non_bonded_group(system)
     dihedral_group = set_dihedral_group(system)
     integrator = DualNonBondedDihedralLowerIntegrator(nonbonded_group, dihedral_group, dt=dt, ntcmdprep=ntcmdprep,
                                                       ntcmd=ntcmd, ntebprep=ntebprep,
                                                       nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0p=sigma0p,
                                                       sigma0d=sigma0d,
-                                                      temperature=temperature)
+                                                      temperature=temperature,
+                                                      fused_force_groups=fused_force_groups,
+                                                      optimized_program=optimized_program)
     result = [nonbonded_group, dihedral_group, integrator]
     return result
 
@@ -175,14 +205,17 @@ def create_lower_dual_non_bonded_dihederal_boost_integrator(system, temperature,
 def create_upper_dual_non_bonded_dihederal_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
                                                             ntebprep, nteb, nstlim, ntave,
                                                             sigma0p=6.0 * unit.kilocalories_per_mole,
-                                                            sigma0d=6.0 * unit.kilocalories_per_mole):
+                                                            sigma0d=6.0 * unit.kilocalories_per_mole,
+                                                            fused_force_groups=False, optimized_program=True):
     nonbonded_group = set_non_bonded_group(system)
     dihedral_group = set_dihedral_group(system)
     integrator = DualNonBondedDihedralUpperIntegrator(nonbonded_group, dihedral_group, dt=dt, ntcmdprep=ntcmdprep,
                                                       ntcmd=ntcmd, ntebprep=ntebprep,
                                                       nteb=nteb, nstlim=nstlim, ntave=ntave, sigma0p=sigma0p,
                                                       sigma0d=sigma0d,
-                                                      temperature=temperature)
+                                                      temperature=temperature,
+                                                      fused_force_groups=fused_force_groups,
+                                                      optimized_program=optimized_program)
     result = [nonbonded_group, dihedral_group, integrator]
     return result
 
@@ -194,50 +227,83 @@ class GamdIntegratorFactory:
 
     @staticmethod
     def get_integrator(boost_type_str, system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                       sigma0p=6.0 * unit.kilocalories_per_mole, sigma0d=6.0 * unit.kilocalories_per_mole):
+                       sigma0p=6.0 * unit.kilocalories_per_mole, sigma0d=6.0 * unit.kilocalories_per_mole,
+                       fused_force_groups=True, optimized_program=True):
+        """
+            Put the dihedral forces, the nonbonded forces or both in the
+            force groups of the boost type, with every other force in group
+            0, and create the GaMD integrator of the boost type.
+            fused_force_groups and optimized_program are handed to the
+            integrator (see GamdStageIntegrator).
+
+            :return: The boosted force groups and the integrator, followed by
+                     the first and second boost types.
+        """
         set_all_forces_to_group(system, 0)
         result = []
         first_boost_type = BoostType.TOTAL
         second_boost_type = BoostType.DIHEDRAL
         if boost_type_str == "gamd-cmd-base":
             result = create_gamd_cmd_integrator(system, temperature, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim,
-                                                ntave)
+                                                ntave,
+                                                fused_force_groups=fused_force_groups,
+                                                optimized_program=optimized_program)
         elif boost_type_str == "lower-total":
             result = create_lower_total_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                         ntebprep, nteb, nstlim, ntave, sigma0p)
+                                                         ntebprep, nteb, nstlim, ntave, sigma0p,
+                                                         fused_force_groups=fused_force_groups,
+                                                         optimized_program=optimized_program)
         elif boost_type_str == "upper-total":
             result = create_upper_total_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                         ntebprep, nteb, nstlim, ntave, sigma0p)
+                                                         ntebprep, nteb, nstlim, ntave, sigma0p,
+                                                         fused_force_groups=fused_force_groups,
+                                                         optimized_program=optimized_program)
         elif boost_type_str == "lower-dihedral":
             result = create_lower_dihedral_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                            ntebprep, nteb, nstlim, ntave, sigma0p)
+                                                            ntebprep, nteb, nstlim, ntave, sigma0p,
+                                                            fused_force_groups=fused_force_groups,
+                                                            optimized_program=optimized_program)
         elif boost_type_str == "upper-dihedral":
             result = create_upper_dihedral_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                            ntebprep, nteb, nstlim, ntave, sigma0p)
+                                                            ntebprep, nteb, nstlim, ntave, sigma0p,
+                                                            fused_force_groups=fused_force_groups,
+                                                            optimized_program=optimized_program)
         elif boost_type_str == "lower-dual":
             result = create_lower_dual_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                        ntebprep, nteb, nstlim, ntave, sigma0p, sigma0d)
+                                                        ntebprep, nteb, nstlim, ntave, sigma0p, sigma0d,
+                                                        fused_force_groups=fused_force_groups,
+                                                        optimized_program=optimized_program)
         elif boost_type_str == "upper-dual":
             result = create_upper_dual_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                        ntebprep, nteb, nstlim, ntave, sigma0p, sigma0d)
+                                                        ntebprep, nteb, nstlim, ntave, sigma0p, sigma0d,
+                                                        fused_force_groups=fused_force_groups,
+                                                        optimized_program=optimized_program)
         elif boost_type_str == "lower-nonbonded":
             result = create_lower_non_bonded_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                              ntebprep, nteb, nstlim, ntave, sigma0p)
+                                                              ntebprep, nteb, nstlim, ntave, sigma0p,
+                                                              fused_force_groups=fused_force_groups,
+                                                              optimized_program=optimized_program)
             second_boost_type = BoostType.NON_BONDED
         elif boost_type_str == "upper-nonbonded":
             result = create_upper_non_bonded_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
-                                                              ntebprep, nteb, nstlim, ntave, sigma0p)
+                                                              ntebprep, nteb, nstlim, ntave, sigma0p,
+                                                              fused_force_groups=fused_force_groups,
+                                                              optimized_program=optimized_program)
             second_boost_type = BoostType.NON_BONDED
         elif boost_type_str == "lower-dual-nonbonded-dihedral":
             result = create_lower_dual_non_bonded_dihederal_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
                                                                              ntebprep, nteb, nstlim, ntave, sigma0p,
-                                                                             sigma0d)
+                                                                             sigma0d,
+                                                                             fused_force_groups=fused_force_groups,
+                                                                             optimized_program=optimized_program)
             first_boost_type = BoostType.NON_BONDED
             second_boost_type = BoostType.DIHEDRAL
         elif boost_type_str == "upper-dual-nonbonded-dihedral":
             result = create_upper_dual_non_bonded_dihederal_boost_integrator(system, temperature, dt, ntcmdprep, ntcmd,
                                                                              ntebprep, nteb, nstlim, ntave, sigma0p,
-                                                                             sigma0d)
+                                                                             sigma0d,
+                                                                             fused_force_groups=fused_force_groups,
+                                                                             optimized_program=optimized_program)
             first_boost_type = BoostType.NON_BONDED
             second_boost_type = BoostType.DIHEDRAL
         else:
@@ -12,6 +12,8 @@ from __future__ import absolute_import
 __author__ = "Matthew Copeland"
 __version__ = "1.0"
 
+import math
+
 import openmm.unit as unit
 from abc import ABC
 from abc import abstractmethod
@@ -28,7 +30,8 @@ class GamdLangevinIntegrator(GamdStageIntegrator, ABC):
                  ntebprep=200000, nteb=1000000, nstlim=3000000, ntave=50000,
                  collision_rate=1.0 / unit.picoseconds,
                  temperature=298.15 * unit.kelvin,
-                 restart_filename=None):
+                 restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
          Parameters
          ----------
@@ -55,6 +58,11 @@ class GamdLangevinIntegrator(GamdStageIntegrator, ABC):
              compatible with units.kelvin, default: 298.15*unit.kelvin
          :param restart_filename:    The file name of the restart file.
              (default=None indicates new simulation.)
+         :param fused_force_groups: Whether to evaluate each
+             force group once per step.  (default=False)
+         :param optimized_program:  Whether to build the program
+             without the work that does not have to happen on every
+             step.  (default=True)
          """
 
         self.collision_rate = collision_rate  # gamma
@@ -76,7 +84,13 @@ class GamdLangevinIntegrator(GamdStageIntegrator, ABC):
             "noisescale": 0.0
             }
 
-        self.per_dof_variables = {"sigma": 0}
+        #
+        # Every per-DOF variable costs a full copy of the coordinates on the
+        # device, so the debug copies of per-DOF variables are opt in, by
+        # listing the variables here before the program is built.
+        #
+        # self.debug_per_dof_variables = ["x", "v", "f", "m"]
+        self.debug_per_dof_variables = []
 
         #
         # We need to run our super classes constructor last, since it's going 
@@ -85,28 +99,57 @@ class GamdLangevinIntegrator(GamdStageIntegrator, ABC):
         #
         super(GamdLangevinIntegrator, self).__init__(
             group_dict, boost_type, boost_method, dt,
-            ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave)
-
-        #
-        # These values are constants, so we set them up once here.
-        #
-        #
-        self.addComputeGlobal("vscale", "exp(-dt*collision_rate)")
-        self.addComputeGlobal("fscale", "(1-vscale)/collision_rate")
-        self.addComputeGlobal("noisescale",
-                              "sqrt(thermal_energy*(1-vscale*vscale))")
+            ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
+            fused_force_groups=fused_force_groups,
+            optimized_program=optimized_program)
 
     def setFriction(self, coeff):
         self.collision_rate = coeff
+        self._update_langevin_constants()
         
     def getFriction(self):
         return self.collision_rate
+
+    def setStepSize(self, size):
+        super(GamdLangevinIntegrator, self).setStepSize(size)
+        self._update_langevin_constants()
+
+    def _update_langevin_constants(self):
+        """
+            Set the collision rate, and the vscale, fscale and noisescale
+            values that only depend on it, the step size and the
+            temperature, so that the program does not have to work them out
+            on every step.
+        """
+        dt = self.getStepSize().value_in_unit(unit.picoseconds)
+        collision_rate = self.collision_rate
+        if unit.is_quantity(collision_rate):
+            collision_rate = collision_rate.value_in_unit(
+                unit.picoseconds ** -1)
+        thermal_energy = self.thermal_energy.value_in_unit(
+            unit.kilojoules_per_mole)
+        vscale = math.exp(-dt * collision_rate)
+        fscale = (1 - vscale) / collision_rate if collision_rate else dt
+        self.setGlobalVariableByName("collision_rate", collision_rate)
+        self.setGlobalVariableByName("vscale", vscale)
+        self.setGlobalVariableByName("fscale", fscale)
+        self.setGlobalVariableByName(
+            "noisescale", math.sqrt(thermal_energy * (1 - vscale * vscale)))
     
     def _add_common_variables(self):
         garbage = {self.addGlobalVariable(key, value)
                    for key, value in self.global_variables.items()}
-        garbage = {self.addPerDofVariable(key, value)
-                   for key, value in self.per_dof_variables.items()}
+
+        self._update_langevin_constants()
+        if not self.optimized_program:
+            #
+            # These values are constants, but they used to be computed ahead
+            # of the stages that use them on every step.
+            #
+            self.addComputeGlobal("vscale", "exp(-dt*collision_rate)")
+            self.addComputeGlobal("fscale", "(1-vscale)/collision_rate")
+            self.addComputeGlobal("noisescale",
+                                  "sqrt(thermal_energy*(1-vscale*vscale))")
 
     @abstractmethod
     def _add_conventional_md_update_step(self):
@@ -155,8 +198,8 @@ class GamdLangevinIntegrator(GamdStageIntegrator, ABC):
     def _add_debug(self):
         garbage = {self._save_global_debug(key) \
                    for key, value in self.global_variables.items()}
-        garbage = {self._save_per_dof_debug(key) \
-                   for key, value in self.per_dof_variables.items()}
+        garbage = {self._save_per_dof_debug(name) \
+                   for name in self.debug_per_dof_variables}
 
         super(GamdLangevinIntegrator, self)._add_debug()
 
@@ -165,7 +208,8 @@ class GamdLangevinIntegrator(GamdStageIntegrator, ABC):
         results.update(self._get_debug_values_as_dictionary(
             self.global_variables, counter, self._get_global_debug_value))
         results.update(self._get_debug_values_as_dictionary(
-            self.per_dof_variables, counter, self._get_per_dof_debug_value))
+            dict.fromkeys(self.debug_per_dof_variables), counter,
+            self._get_per_dof_debug_value))
         return results
 
 #
@@ -182,7 +226,8 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
 
     def __init__(self, group_dict, boost_type, boost_method,
                  dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
-                 collision_rate, temperature, restart_filename):
+                 collision_rate, temperature, restart_filename,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -207,6 +252,11 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
             with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.
             (default=None indicates new simulation.)
+        :param fused_force_groups: Whether to evaluate each
+            force group once per step.  (default=False)
+        :param optimized_program:  Whether to build the program
+            without the work that does not have to happen on every
+            step.  (default=True)
         """
         #
         # These variables are generated per type of boost being performed
@@ -224,10 +274,7 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         #
 
         self.boost_global_variables = {}
-        self.boost_per_dof_variables = {"newx": 0, "coordinates": 0}
-        self.debug_per_dof_variables = []
-
-        # self.debug_per_dof_variables = ["x", "v", "f", "m"]
+        self.boost_per_dof_variables = {"newx": 0}
         self.debug_global_variables = [
             "dt", "energy", "energy0", "energy1", "energy2", "energy3", 
             "energy4"]
@@ -236,7 +283,9 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         super(GroupBoostIntegrator, self).__init__(
             group_dict, boost_type, boost_method, dt, ntcmdprep,
             ntcmd, ntebprep, nteb, nstlim, ntave, collision_rate, temperature,
-            restart_filename)
+            restart_filename,
+            fused_force_groups=fused_force_groups,
+            optimized_program=optimized_program)
 
         #
         # We have to set this value separate from the others, so that when we 
@@ -255,8 +304,6 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         # beginningPotentialEnergy at the end of each simulation step.
         # self.addGlobalVariable("beginningPotentialEnergy", 0)
 
-        self.addComputePerDof("coordinates", "x")
-
         return
 
     def _add_common_variables(self):
@@ -325,9 +372,18 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         return
 
     def _add_conventional_md_update_step(self):
-        v_expr = "vscale*v + fscale*f/m + noisescale*gaussian/sqrt(m)"
+        #
+        # OpenMM only allows a single force group per computation, so when
+        # the total force is made up of several force groups, each of them
+        # gets its own kick.
+        #
+        force_names = self._get_total_force_names()
+        v_expr = ("vscale*v + fscale*{0}/m + noisescale*gaussian/sqrt(m)"
+                  .format(force_names[0]))
         self.addComputePerDof("newx", "x")
         self.addComputePerDof("v", v_expr)
+        for force_name in force_names[1:]:
+            self.addComputePerDof("v", "v + fscale*{0}/m".format(force_name))
         self.addComputePerDof("x", "x+dt*v")
         self.addConstrainPositions()
         self.addComputePerDof("v", "(x-newx)/dt")
@@ -340,17 +396,32 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         # energy is read only.
         #
         
-        self.add_compute_global_by_name(
-            "BoostPotential", "0.5 * {0} * ({1} - {2})^2 / ({3} - {4})", 
-            ["k0", "threshold_energy", "StartingPotentialEnergy", "Vmax", 
-             "Vmin"], compute_type)
-
-        #
-        # "BoostPotential*step(threshold_energy-boosted_energy)")
-        self.add_compute_global_by_name(
-            "BoostPotential", "{0}*step({1} - ({2} + {3}))", 
-            ["BoostPotential", "threshold_energy", "BoostPotential", 
-             "StartingPotentialEnergy"], compute_type)
+        boost_potential = "0.5 * {0} * ({1} - {2})^2 / ({3} - {4})"
+        if self.optimized_program:
+            #
+            # The boost potential is only applied below the threshold
+            # energy, which takes both of the steps below in a single
+            # computation.  OpenMM evaluates the repeated boost potential
+            # only once.
+            #
+            self.add_compute_global_by_name(
+                "BoostPotential",
+                "({0})*step({{1}} - (({0}) + {{2}}))".format(
+                    boost_potential),
+                ["k0", "threshold_energy", "StartingPotentialEnergy", "Vmax",
+                 "Vmin"], compute_type)
+        else:
+            self.add_compute_global_by_name(
+                "BoostPotential", boost_potential,
+                ["k0", "threshold_energy", "StartingPotentialEnergy", "Vmax",
+                 "Vmin"], compute_type)
+
+            #
+            # "BoostPotential*step(threshold_energy-boosted_energy)")
+            self.add_compute_global_by_name(
+                "BoostPotential", "{0}*step({1} - ({2} + {3}))",
+                ["BoostPotential", "threshold_energy", "BoostPotential",
+                 "StartingPotentialEnergy"], compute_type)
         
         #
         # If the boostPotential is zero, we want to set the Force Scaling 
@@ -369,8 +440,20 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         
     def _add_gamd_boost_calculations_step(self, compute_type):
         
+        force_scaling_factor = "1.0 - (({0} * ({1} - {2}))/({3} - {4}))"
+        if self.optimized_program:
+            #
+            # The same as the two steps below, folded into one computation.
+            #
+            self.add_compute_global_by_name(
+                "ForceScalingFactor",
+                "1.0 - {{5}} + {{5}} * ({0})".format(force_scaling_factor),
+                ["k0", "threshold_energy", "StartingPotentialEnergy", "Vmax",
+                 "Vmin", "check_boost"], compute_type)
+            return
+
         self.add_compute_global_by_name(
-            "ForceScalingFactor", "1.0 - (({0} * ({1} - {2}))/({3} - {4}))", 
+            "ForceScalingFactor", force_scaling_factor,
             ["k0", "threshold_energy", "StartingPotentialEnergy", "Vmax", 
              "Vmin"], compute_type)
         
@@ -487,10 +570,10 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
         as a dictionary associated with the requested name.  (Currently,
         not for use with DOF names.)
         """
-        names = self.get_names(name)
-        for name in names:
-            results[name] = self.getGlobalVariableByName(name)
-        return results
+        snapshot = self.get_globals_snapshot(
+            "values:" + name, lambda: self.get_names(name))
+        snapshot.update()
+        return snapshot.as_dict()
 
 
     def get_statistics(self):
@@ -499,87 +582,104 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
            statistics variables as a dictionary based on the boost
            type associated with this integrator.
         """
-        names = self.get_statistics_names()
-        results = {}
-        for name in names:
-            results[name] = self.getGlobalVariableByName(name)
-        return results
-
-
-
+        snapshot = self.get_globals_snapshot("statistics",
+                                             self.get_statistics_names)
+        snapshot.update()
+        return snapshot.as_dict()
 
+    def get_production_parameter_names(self):
+        """
+           This method retrieves the names of the global variables that
+           the GaMD production stage boosts with:  the statistics, along with
+           the threshold energies and effective harmonic constants that the
+           equilibration derived from them.
+        """
+        results = self.get_statistics_names()
+        for name in ["threshold_energy", "k0"]:
+            results.extend(self.get_global_names(name))
+        return results
 
+    def get_production_parameters(self):
+        snapshot = self.get_globals_snapshot(
+            "production-parameters", self.get_production_parameter_names)
+        snapshot.update()
+        return snapshot.as_dict()
 
-    def get_force_scaling_factors(self):
-        force_scaling_factors = {
-            self._append_group_name(
-                "ForceScalingFactor", BoostType.TOTAL.value): 1.0,
-            self._append_group_name(
-                "ForceScalingFactor", "Dihedral"): 1.0
-                                 }
-        
-        for group_id in self.get_group_dict():
-            group_name = self.get_group_dict()[group_id]
-            var_name = self._append_group_name("ForceScalingFactor", 
-                                               group_name)
-            var_value = self.getGlobalVariableByName(var_name)
-            force_scaling_factors[var_name] = var_value
-        
-        if (self._boost_method == BoostMethod.TOTAL or
-                self._boost_method == BoostMethod.DUAL_DEPENDENT_GROUP_TOTAL):
-            var_name = self._append_group_name("ForceScalingFactor", 
-                                               BoostType.TOTAL.value)
-            var_value = self.getGlobalVariableByName(var_name)
-            force_scaling_factors[var_name] = var_value
-        
-        return force_scaling_factors
+    def set_production_parameters(self, values):
+        """
+           Set the boost parameters of the production stage from the values
+           of an earlier GaMD equilibration, such as the ones saved in the
+           gamd-restart.dat file.  The gamd-restart.dat files of older runs
+           only hold the statistics, so any threshold energy and effective
+           harmonic constant that is missing from the values is derived from
+           the statistics and sigma0, the way the end of the GaMD
+           equilibration derives it.  The integrator has to be bound to a
+           context.
+        """
+        values = dict(values)
+        for statistics_name in self.get_global_names("Vmax"):
+            group_name = statistics_name[len("Vmax_"):]
+            threshold_energy_name = self._append_group_name(
+                "threshold_energy", group_name)
+            k0_name = self._append_group_name("k0", group_name)
+            if threshold_energy_name in values or k0_name in values:
+                continue
+            statistics = {}
+            for name in ["Vmax", "Vmin", "Vavg", "sigmaV"]:
+                statistics[name] = values.get(
+                    self._append_group_name(name, group_name))
+            if None in statistics.values():
+                continue
+            sigma0 = self.getGlobalVariableByName(
+                self._append_group_name("sigma0", group_name))
+            try:
+                values[threshold_energy_name], values[k0_name] = \
+                    self._get_threshold_energy_and_effective_harmonic_constant(
+                        statistics, sigma0)
+            except ZeroDivisionError:
+                raise ValueError("The GaMD statistics of the %s boost do not "
+                                 "give a threshold energy." % group_name)
+
+        names = self.get_production_parameter_names()
+        missing_names = [name for name in names if name not in values]
+        if missing_names:
+            raise ValueError("The GaMD production parameters are missing "
+                             "values for: " + ", ".join(missing_names))
+        for name in names:
+            self.setGlobalVariableByName(name, values[name])
 
-    def get_boost_potentials(self):
-        boost_potentials = {
-            self._append_group_name(
-                "BoostPotential", BoostType.TOTAL.value): 0.0,
-            self._append_group_name(
-                "BoostPotential", "Dihedral"): 0.0
-                                 }
-        for group_id in self.get_group_dict():
-            group_name = self.get_group_dict()[group_id]
-            var_name = self._append_group_name("BoostPotential", 
-                                               group_name)
-            var_value = self.getGlobalVariableByName(var_name)
-            boost_potentials[var_name] = var_value
-            
+    def __get_reported_names(self, name):
+        names = [self._append_group_name(name, group_name)
+                 for group_name in self.get_group_dict().values()]
         if (self._boost_method == BoostMethod.TOTAL or
                 self._boost_method == BoostMethod.DUAL_DEPENDENT_GROUP_TOTAL):
-            var_name = self._append_group_name("BoostPotential", 
-                                               BoostType.TOTAL.value)
-            var_value = self.getGlobalVariableByName(var_name)
-            boost_potentials[var_name] = var_value
-
-        return boost_potentials
+            names.append(self._append_group_name(name, BoostType.TOTAL.value))
+        return names
 
-    def get_effective_harmonic_constants(self):
-        effective_harmonic_constants = {
-            self._append_group_name(
-                "k0", BoostType.TOTAL.value): 0.0,
-            self._append_group_name(
-                "k0", "Dihedral"): 0.0
+    def __get_reported_values(self, name, default):
+        """
+            The values of the name for each boosted group and the total,
+            with the default for the Total and Dihedral values that this
+            integrator does not have.
+        """
+        snapshot = self.get_globals_snapshot(
+            "reported:" + name, lambda: self.__get_reported_names(name))
+        snapshot.update()
+        values = {
+            self._append_group_name(name, BoostType.TOTAL.value): default,
+            self._append_group_name(name, "Dihedral"): default
         }
+        values.update(snapshot.as_dict())
+        return values
 
-        for group_id in self.get_group_dict():
-            group_name = self.get_group_dict()[group_id]
-            var_name = self._append_group_name("k0",
-                                               group_name)
-            var_value = self.getGlobalVariableByName(var_name)
-            effective_harmonic_constants[var_name] = var_value
+    def get_force_scaling_factors(self):
+        return self.__get_reported_values("ForceScalingFactor", 1.0)
 
-        if (self._boost_method == BoostMethod.TOTAL or
-                self._boost_method == BoostMethod.DUAL_DEPENDENT_GROUP_TOTAL):
-            var_name = self._append_group_name("k0",
-                                               BoostType.TOTAL.value)
-            var_value = self.getGlobalVariableByName(var_name)
-            effective_harmonic_constants[var_name] = var_value
+    def get_boost_potentials(self):
+        return self.__get_reported_values("BoostPotential", 0.0)
 
-        return effective_harmonic_constants
+    def get_effective_harmonic_constants(self):
+        return self.__get_reported_values("k0", 0.0)
 
     def calculate_common_threshold_energy_and_effective_harmonic_constant(
             self, compute_type, group_id=None):
@@ -646,3 +746,39 @@ class GroupBoostIntegrator(GamdLangevinIntegrator, ABC):
                                         compute_type)
 
         return
+
+    @abstractmethod
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        raise NotImplementedError(
+            "must implement " +
+            "_get_threshold_energy_and_effective_harmonic_constant")
+
+    #
+    # These work out the threshold energy and the effective harmonic
+    # constant on the host, from a dictionary with the Vmax, Vmin, Vavg and
+    # sigmaV of a boost type, with the same formulas as the computations
+    # above.
+    #
+    @staticmethod
+    def _lower_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0):
+        k0prime = ((sigma0 / statistics["sigmaV"])
+                   * (statistics["Vmax"] - statistics["Vmin"])
+                   / (statistics["Vmax"] - statistics["Vavg"]))
+        return statistics["Vmax"], min(1.0, k0prime)
+
+    @staticmethod
+    def _upper_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0):
+        k0doubleprime = ((1 - sigma0 / statistics["sigmaV"])
+                         * (statistics["Vmax"] - statistics["Vmin"])
+                         / (statistics["Vavg"] - statistics["Vmin"]))
+        if (-k0doubleprime) * (1 - k0doubleprime) >= 0.0:
+            return GroupBoostIntegrator.\
+                _lower_bound_get_threshold_energy_and_effective_harmonic_constant(
+                    statistics, sigma0)
+        threshold_energy = (statistics["Vmin"]
+                            + (statistics["Vmax"] - statistics["Vmin"])
+                            / k0doubleprime)
+        return threshold_energy, k0doubleprime
@@ -10,7 +10,8 @@ from ..stage_integrator import ComputeType
 class DihedralBoostIntegrator(GroupBoostIntegrator, ABC):
     def __init__(self, group, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim,
                  ntave, sigma0, collision_rate,
-                 temperature, restart_filename):
+                 temperature, restart_filename,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -28,6 +29,9 @@ class DihedralBoostIntegrator(GroupBoostIntegrator, ABC):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         # self.__group = group
         # group_name = BoostType.DIHEDRAL
@@ -40,7 +44,9 @@ class DihedralBoostIntegrator(GroupBoostIntegrator, ABC):
                                                       ntebprep, nteb, nstlim,
                                                       ntave, collision_rate,
                                                       temperature,
-                                                      restart_filename)
+                                                      restart_filename,
+                                                      fused_force_groups=fused_force_groups,
+                                                      optimized_program=optimized_program)
 
         self.addGlobalVariable("sigma0_" + BoostType.DIHEDRAL.value, sigma0)
 
@@ -50,7 +56,8 @@ class LowerBoundIntegrator(DihedralBoostIntegrator):
                  ntcmd=1000000, ntebprep=200000, nteb=1000000,
                  nstlim=3000000, ntave=50000, sigma0=6.0 * unit.kilocalories_per_mole,
                  collision_rate=1.0 / unit.picoseconds,
-                 temperature=298.15 * unit.kelvin, restart_filename=None):
+                 temperature=298.15 * unit.kelvin, restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -68,23 +75,34 @@ class LowerBoundIntegrator(DihedralBoostIntegrator):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         self.__group = 1
         super(LowerBoundIntegrator, self).__init__(group, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave, sigma0,
-                                                   collision_rate, temperature, restart_filename)
+                                                   collision_rate, temperature, restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
     def _calculate_threshold_energy_and_effective_harmonic_constant(
             self, compute_type):
         super()._lower_bound_calculate_threshold_energy_and_effective_harmonic_constant(
             compute_type)
 
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        return super()._lower_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0)
+
 
 class UpperBoundIntegrator(DihedralBoostIntegrator):
     def __init__(self, group, dt=2.0 * unit.femtoseconds, ntcmdprep=200000,
                  ntcmd=1000000, ntebprep=200000, nteb=1000000,
                  nstlim=3000000, ntave=50000, sigma0=6.0 * unit.kilocalories_per_mole,
                  collision_rate=1.0 / unit.picoseconds,
-                 temperature=298.15 * unit.kelvin, restart_filename=None):
+                 temperature=298.15 * unit.kelvin, restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -102,13 +120,23 @@ class UpperBoundIntegrator(DihedralBoostIntegrator):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         self.__group = 1
         super(UpperBoundIntegrator, self).__init__(group, dt, ntcmdprep, ntcmd,
                                                    ntebprep, nteb, nstlim, ntave, sigma0,
-                                                   collision_rate, temperature, restart_filename)
+                                                   collision_rate, temperature, restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
     def _calculate_threshold_energy_and_effective_harmonic_constant(
             self, compute_type):
         super()._upper_bound_calculate_threshold_energy_and_effective_harmonic_constant(
             compute_type)
+
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        return super()._upper_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0)
@@ -10,7 +10,8 @@ from ..stage_integrator import ComputeType
 class DualBoostIntegrator(GroupBoostIntegrator, ABC):
     def __init__(self, group, dt, ntcmdprep, ntcmd, ntebprep,
                  nteb, nstlim, ntave, sigma0p, sigma0d, collision_rate,
-                 temperature, restart_filename):
+                 temperature, restart_filename,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -30,6 +31,9 @@ class DualBoostIntegrator(GroupBoostIntegrator, ABC):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         group_dict = {group: "Dihedral"}
 
@@ -39,7 +43,9 @@ class DualBoostIntegrator(GroupBoostIntegrator, ABC):
                                                   dt, ntcmdprep, ntcmd,
                                                   ntebprep, nteb, nstlim, ntave,
                                                   collision_rate, temperature,
-                                                  restart_filename)
+                                                  restart_filename,
+                                                  fused_force_groups=fused_force_groups,
+                                                  optimized_program=optimized_program)
 
         self.addGlobalVariable("sigma0_" + BoostType.TOTAL.value, sigma0p)
         self.addGlobalVariable("sigma0_" + BoostType.DIHEDRAL.value, sigma0d)
@@ -52,7 +58,8 @@ class LowerBoundIntegrator(DualBoostIntegrator):
                  sigma0p=6.0 * unit.kilocalories_per_mole,
                  sigma0d=6.0 * unit.kilocalories_per_mole,
                  collision_rate=1.0 / unit.picoseconds,
-                 temperature=298.15 * unit.kelvin, restart_filename=None):
+                 temperature=298.15 * unit.kelvin, restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -72,17 +79,27 @@ class LowerBoundIntegrator(DualBoostIntegrator):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         self.__group = group
         super(LowerBoundIntegrator, self).__init__(group, dt, ntcmdprep, ntcmd, ntebprep,
                                                    nteb, nstlim, ntave, sigma0p, sigma0d,
-                                                   collision_rate, temperature, restart_filename)
+                                                   collision_rate, temperature, restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
     def _calculate_threshold_energy_and_effective_harmonic_constant(
             self, compute_type):
         super()._lower_bound_calculate_threshold_energy_and_effective_harmonic_constant(
             compute_type)
 
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        return super()._lower_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0)
+
 
 class UpperBoundIntegrator(DualBoostIntegrator):
     def __init__(self, group, dt=2.0 * unit.femtoseconds, ntcmdprep=200000,
@@ -91,7 +108,8 @@ class UpperBoundIntegrator(DualBoostIntegrator):
                  sigma0p=6.0 * unit.kilocalories_per_mole,
                  sigma0d=6.0 * unit.kilocalories_per_mole,
                  collision_rate=1.0 / unit.picoseconds,
-                 temperature=298.15 * unit.kelvin, restart_filename=None):
+                 temperature=298.15 * unit.kelvin, restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -111,13 +129,23 @@ class UpperBoundIntegrator(DualBoostIntegrator):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         self.__group = group
         super(UpperBoundIntegrator, self).__init__(group, dt, ntcmdprep, ntcmd, ntebprep, nteb,
                                                    nstlim, ntave, sigma0p, sigma0d,
-                                                   collision_rate, temperature, restart_filename)
+                                                   collision_rate, temperature, restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
     def _calculate_threshold_energy_and_effective_harmonic_constant(
             self, compute_type):
         super()._upper_bound_calculate_threshold_energy_and_effective_harmonic_constant(
             compute_type)
+
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        return super()._upper_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0)
@@ -23,7 +23,8 @@ from ..stage_integrator import ComputeType
 class TotalBoostIntegrator(GroupBoostIntegrator, ABC):
     def __init__(self, dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave,
                  sigma0, collision_rate,
-                 temperature, restart_filename):
+                 temperature, restart_filename,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -40,6 +41,9 @@ class TotalBoostIntegrator(GroupBoostIntegrator, ABC):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
         group_dict = {}
 
@@ -49,7 +53,9 @@ class TotalBoostIntegrator(GroupBoostIntegrator, ABC):
                                                    dt, ntcmdprep, ntcmd,
                                                    ntebprep, nteb, nstlim,
                                                    ntave, collision_rate, temperature,
-                                                   restart_filename)
+                                                   restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
         self.addGlobalVariable("sigma0_" + BoostType.TOTAL.value, sigma0)
 
@@ -57,7 +63,8 @@ class TotalBoostIntegrator(GroupBoostIntegrator, ABC):
 class LowerBoundIntegrator(TotalBoostIntegrator):
     def __init__(self, dt=2.0 * unit.femtoseconds, ntcmdprep=200000, ntcmd=1000000, ntebprep=200000, nteb=1000000,
                  nstlim=3000000, ntave=50000, sigma0=6.0 * unit.kilocalories_per_mole,
-                 collision_rate=1.0 / unit.picoseconds, temperature=298.15 * unit.kelvin, restart_filename=None):
+                 collision_rate=1.0 / unit.picoseconds, temperature=298.15 * unit.kelvin, restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -74,23 +81,34 @@ class LowerBoundIntegrator(TotalBoostIntegrator):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
 
         super(LowerBoundIntegrator, self).__init__(dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave, sigma0,
-                                                   collision_rate, temperature, restart_filename)
+                                                   collision_rate, temperature, restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
     def _calculate_threshold_energy_and_effective_harmonic_constant(
             self, compute_type):
         super()._lower_bound_calculate_threshold_energy_and_effective_harmonic_constant(
             compute_type)
 
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        return super()._lower_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0)
+
 
 class UpperBoundIntegrator(TotalBoostIntegrator):
     def __init__(self, dt=2.0 * unit.femtoseconds, ntcmdprep=200000,
                  ntcmd=1000000, ntebprep=200000, nteb=1000000,
                  nstlim=3000000, ntave=50000, sigma0=6.0 * unit.kilocalories_per_mole,
                  collision_rate=1.0 / unit.picoseconds,
-                 temperature=298.15 * unit.kelvin, restart_filename=None):
+                 temperature=298.15 * unit.kelvin, restart_filename=None,
+                 fused_force_groups=False, optimized_program=True):
         """
         Parameters
         ----------
@@ -107,12 +125,22 @@ class UpperBoundIntegrator(TotalBoostIntegrator):
         :param collision_rate:      Collision rate (gamma) compatible with 1/picoseconds, default: 1.0/unit.picoseconds
         :param temperature:         "Bath" temperature value compatible with units.kelvin, default: 298.15*unit.kelvin
         :param restart_filename:    The file name of the restart file.  (default=None indicates new simulation.)
+        :param fused_force_groups:  Whether to evaluate each force group once per step.  (default=False)
+        :param optimized_program:   Whether to build the program without the work that does not have to happen
+                                    on every step.  (default=True)
         """
 
         super(UpperBoundIntegrator, self).__init__(dt, ntcmdprep, ntcmd, ntebprep, nteb, nstlim, ntave, sigma0,
-                                                   collision_rate, temperature, restart_filename)
+                                                   collision_rate, temperature, restart_filename,
+                                                   fused_force_groups=fused_force_groups,
+                                                   optimized_program=optimized_program)
 
     def _calculate_threshold_energy_and_effective_harmonic_constant(
             self, compute_type):
         super()._upper_bound_calculate_threshold_energy_and_effective_harmonic_constant(
             compute_type)
+
+    def _get_threshold_energy_and_effective_harmonic_constant(
+            self, statistics, sigma0):
+        return super()._upper_bound_get_threshold_energy_and_effective_harmonic_constant(
+            statistics, sigma0)
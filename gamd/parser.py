@@ -168,6 +168,9 @@ def parse_integrator_tag(tag):
                     print("Warning: parameter in XML not found in "
                           "number-of-steps tag. Spelling error?", 
                           number_steps_tag.tag)
+        elif integrator_tag.tag == "lean-production":
+            integrator_config.lean_production = assign_tag(integrator_tag,
+                                                           strBool)
         else:
             print("Warning: parameter in XML not found in "
                   "integrator tag. Spelling error?", 
@@ -192,6 +195,19 @@ def parse_amber_tag(input_files_tag):
     return amber_config
 
 
+def parse_gamd_restart_tag(input_files_tag):
+    gamd_restart_config = config.GamdRestartConfig()
+    for gamd_restart_tag in input_files_tag:
+        if gamd_restart_tag.tag == "parameters":
+            gamd_restart_config.parameters = assign_tag(gamd_restart_tag, str)
+        elif gamd_restart_tag.tag == "state":
+            gamd_restart_config.state = assign_tag(gamd_restart_tag, str)
+        else:
+            print("Warning: parameter in XML not found in gamd-restart tag. "
+                  "Spelling error?", gamd_restart_tag.tag)
+    return gamd_restart_config
+
+
 def parse_charmm_box_vectors(charmm_config, charmm_tag):
     box = {}
     for box_info in charmm_tag:
@@ -295,8 +311,114 @@ def parse_forcefield_tag(input_files_tag):
     return forcefield_config
 
 
+def parse_restart_checkpoint_tag(reporting_tag, outputs_config):
+    restart_checkpoint_interval = None
+    for checkpoint_tag in reporting_tag:
+        if checkpoint_tag.tag == "interval":
+            restart_checkpoint_interval = assign_tag(checkpoint_tag, int)
+        elif checkpoint_tag.tag == "wall-clock-minutes":
+            outputs_config.reporting.restart_checkpoint_wall_clock_minutes \
+                = assign_tag(checkpoint_tag, float)
+        elif checkpoint_tag.tag == "keep":
+            outputs_config.reporting.restart_checkpoint_keep \
+                = assign_tag(checkpoint_tag, int)
+        else:
+            print("Warning: parameter in XML not found in "
+                  "restart-checkpoint tag. Spelling error?",
+                  checkpoint_tag.tag)
+    return restart_checkpoint_interval
+
+
+def parse_metrics_tag(reporting_tag, outputs_config):
+    # A metrics tag turns the metrics file on, every minute unless it says
+    # otherwise.
+    outputs_config.reporting.metrics_wall_clock_seconds = 60.0
+    for metrics_tag in reporting_tag:
+        if metrics_tag.tag == "wall-clock-seconds":
+            outputs_config.reporting.metrics_wall_clock_seconds \
+                = assign_tag(metrics_tag, float)
+        elif metrics_tag.tag == "format":
+            outputs_config.reporting.metrics_format \
+                = assign_tag(metrics_tag, str).lower()
+        else:
+            print("Warning: parameter in XML not found in "
+                  "metrics tag. Spelling error?", metrics_tag.tag)
+
+
+def parse_reaction_coordinate_tag(tag):
+    reaction_coordinate_config = config.ReactionCoordinateConfig()
+    for reaction_coordinate_tag in tag:
+        if reaction_coordinate_tag.tag == "type":
+            reaction_coordinate_config.type \
+                = assign_tag(reaction_coordinate_tag, str).lower()
+        elif reaction_coordinate_tag.tag == "atoms":
+            reaction_coordinate_config.atoms = [
+                int(atom) for atom in assign_tag(
+                    reaction_coordinate_tag, str).replace(",", " ").split()]
+        elif reaction_coordinate_tag.tag == "minimum":
+            reaction_coordinate_config.minimum \
+                = assign_tag(reaction_coordinate_tag, float)
+        elif reaction_coordinate_tag.tag == "maximum":
+            reaction_coordinate_config.maximum \
+                = assign_tag(reaction_coordinate_tag, float)
+        elif reaction_coordinate_tag.tag == "bins":
+            reaction_coordinate_config.bins \
+                = assign_tag(reaction_coordinate_tag, int)
+        else:
+            print("Warning: parameter in XML not found in "
+                  "reaction-coordinate tag. Spelling error?",
+                  reaction_coordinate_tag.tag)
+    return reaction_coordinate_config
+
+
+def parse_reweighting_tag(tag):
+    reweighting_config = config.OnlineReweightingConfig()
+    for reweighting_tag in tag:
+        if reweighting_tag.tag == "method":
+            reweighting_config.method \
+                = assign_tag(reweighting_tag, str).lower()
+        elif reweighting_tag.tag == "order":
+            reweighting_config.order = assign_tag(reweighting_tag, int)
+        elif reweighting_tag.tag == "cutoff":
+            reweighting_config.cutoff = assign_tag(reweighting_tag, int)
+        elif reweighting_tag.tag == "reaction-coordinate":
+            reweighting_config.reaction_coordinates.append(
+                parse_reaction_coordinate_tag(reweighting_tag))
+        else:
+            print("Warning: parameter in XML not found in "
+                  "reweighting tag. Spelling error?", reweighting_tag.tag)
+    return reweighting_config
+
+
+def parse_debug_tag(reporting_tag, outputs_config):
+    for debug_tag in reporting_tag:
+        if debug_tag.tag == "interval":
+            outputs_config.reporting.debug_interval \
+                = assign_tag(debug_tag, int)
+        elif debug_tag.tag == "globals":
+            outputs_config.reporting.debug_globals = \
+                assign_tag(debug_tag, str).replace(",", " ").split()
+        else:
+            print("Warning: parameter in XML not found in "
+                  "debug tag. Spelling error?", debug_tag.tag)
+
+
+def parse_system_cache_tag(tag):
+    system_cache_config = config.SystemCacheConfig()
+    for system_cache_tag in tag:
+        if system_cache_tag.tag == "directory":
+            system_cache_config.directory = assign_tag(system_cache_tag, str)
+        elif system_cache_tag.tag == "max-size":
+            system_cache_config.max_size = assign_tag(system_cache_tag, float)
+        else:
+            print("Warning: parameter in XML not found in "
+                  "system-cache tag. Spelling error?", system_cache_tag.tag)
+    return system_cache_config
+
+
 def parse_outputs_tag(tag):
     outputs_config = config.OutputsConfig()
+    restart_checkpoint_interval = None
     for outputs_tag in tag:
         if outputs_tag.tag == "directory":
             outputs_config.directory = assign_tag(outputs_tag, str)
@@ -328,6 +450,8 @@ def parse_outputs_tag(tag):
                         if statistics_tag.tag == "interval":
                             outputs_config.reporting.statistics_interval \
                                 = assign_tag(statistics_tag, int)
+                            # Only a default:  an explicit restart-checkpoint
+                            # interval takes precedence below.
                             outputs_config.reporting.restart_checkpoint_interval \
                                 = assign_tag(statistics_tag, int)
                             outputs_config.reporting.coordinates_interval \
@@ -337,6 +461,23 @@ def parse_outputs_tag(tag):
                             print("Warning: parameter in XML not found in "
                                   "statistics tag. Spelling error?", 
                                   statistics_tag.tag)
+
+                elif reporting_tag.tag == "restart-checkpoint":
+                    restart_checkpoint_interval = parse_restart_checkpoint_tag(
+                        reporting_tag, outputs_config)
+                elif reporting_tag.tag == "metrics":
+                    parse_metrics_tag(reporting_tag, outputs_config)
+                elif reporting_tag.tag == "log-format":
+                    outputs_config.reporting.log_format \
+                        = assign_tag(reporting_tag, str).lower()
+                elif reporting_tag.tag == "boost-history":
+                    outputs_config.reporting.boost_history \
+                        = assign_tag(reporting_tag, strBool)
+                elif reporting_tag.tag == "debug":
+                    parse_debug_tag(reporting_tag, outputs_config)
+                elif reporting_tag.tag == "reweighting":
+                    outputs_config.reporting.reweighting \
+                        = parse_reweighting_tag(reporting_tag)
                 else:
                     print("Warning: parameter in XML not found in "
                           "reporting tag. Spelling error?", 
@@ -345,7 +486,11 @@ def parse_outputs_tag(tag):
             print("Warning: parameter in XML not found in "
                   "outputs tag. Spelling error?", 
                   outputs_tag.tag)
-            
+
+    if restart_checkpoint_interval is not None:
+        outputs_config.reporting.restart_checkpoint_interval \
+            = restart_checkpoint_interval
+
     return outputs_config
 
 
@@ -417,13 +562,23 @@ class XmlParser(Parser):
                         self.config.input_files.forcefield = parse_forcefield_tag(
                             input_files_tag)
                         input_file_provided = True
-                        
+
+                    elif input_files_tag.tag == "gamd-restart":
+                        self.config.input_files.gamd_restart = \
+                            parse_gamd_restart_tag(input_files_tag)
+
                     else:
                         raise Exception("input-files type not implemented:", 
                                         input_files_tag.tag)
             
             elif tag.tag == "outputs":
                 self.config.outputs = parse_outputs_tag(tag)
+
+            elif tag.tag == "system-cache":
+                self.config.system_cache = parse_system_cache_tag(tag)
+
+            elif tag.tag == "kernel-cache":
+                self.config.kernel_cache = assign_tag(tag, str)
             
             else:
                 print("Warning: parameter in XML not found in config. "
@@ -0,0 +1,371 @@
+"""
+planner.py:  Validates GaMD configurations and projects what their runs
+will cost, without running them.
+
+For each configuration, the planner builds the simulation just as
+gamdRunner would (without the minimization), which checks the input files
+and the integrator settings.  It then reports the stage boundaries of the
+integrator, the host round-trips of the output schedule, the number of
+checkpoints and trajectory frames, and the projected size of each output
+file, from sample rows and frames written for the actual system.  A short
+run on the chosen platform gives the step rate of the stage it runs in,
+which is scaled to the other stages by the force evaluations each of their
+steps takes, and the projected wall clock time weights each stage by its
+steps.  Settings that make the run stop for the host too often are flagged.
+
+    gamdRunner plan CONFIG [CONFIG ...] [-p CUDA] [-d 0] [--steps 200]
+
+The exit status is 1 when any of the configurations is invalid.
+
+"""
+
+import argparse
+import copy
+import os
+import sys
+import tempfile
+import time
+
+import openmm.unit as unit
+
+from gamd import parser
+from gamd.gamdSimulation import GamdSimulationFactory
+from gamd.runners import Runner
+from gamd.scheduler import count_multiples_in_range
+from gamd.system_cache import get_system_cache_directory
+from gamd.telemetry import get_stage_ranges
+
+STAGE_NAMES = {1: "conventional MD prep", 2: "conventional MD",
+               3: "GaMD equilibration prep", 4: "GaMD equilibration",
+               5: "GaMD production"}
+# Below this, the host round-trips take a noticeable share of a GPU run.
+MIN_STEPS_PER_ROUND_TRIP = 100
+
+
+def count_multiples(interval, start_step, end_step):
+    if not interval:
+        return 0
+    return count_multiples_in_range([interval], start_step, end_step)
+
+
+def get_text_log_sizes(filename):
+    """
+        :return: The bytes of the header of a text log, whose lines start
+                 with '#', and the average bytes of its rows.
+    """
+    with open(filename, "rb") as log_file:
+        lines = log_file.read().splitlines(keepends=True)
+    header_lines = [line for line in lines if line.startswith(b"#")]
+    rows = [line for line in lines if not line.startswith(b"#")]
+    header_bytes = sum(len(line) for line in header_lines)
+    if not rows:
+        return header_bytes, 0.0
+    return header_bytes, sum(len(row) for row in rows) / len(rows)
+
+
+def measure_trajectory_frame(runner, simulation):
+    """
+        Write two frames of the trajectory.
+
+        :return: The bytes of the header of the trajectory file, and of
+                 each frame.
+    """
+    runner.register_trajectory_reporter(False)
+    reporter = simulation.reporters.pop()
+    state = simulation.context.getState(getPositions=True)
+    filename = os.path.join(
+        runner.config.outputs.directory,
+        "output.%s" % runner.config.outputs.reporting.coordinates_file_type)
+    reporter.report(simulation, state)
+    first_size = os.path.getsize(filename)
+    reporter.report(simulation, state)
+    frame_bytes = os.path.getsize(filename) - first_size
+    return first_size - frame_bytes, frame_bytes
+
+
+def measure_step_rate(simulation, number_of_steps):
+    """
+        :return: The steps per second of the simulation, after a first
+                 step that leaves out the compilation of the kernels.
+    """
+    simulation.step(1)
+    simulation.context.getState()
+    start_time = time.perf_counter()
+    simulation.step(number_of_steps)
+    simulation.context.getState()
+    return number_of_steps / (time.perf_counter() - start_time)
+
+
+def get_stage_step_rates(integrator, measured_stage, steps_per_second):
+    """
+        Scale the step rate measured in one stage to the other stages, by the
+        number of force group evaluations a step of each stage takes.  The
+        boost statistics of the GaMD stages only hold once the earlier
+        stages have run, so their steps cannot be timed on their own.
+
+        :return: A dictionary of stage to its projected steps per second.
+    """
+    evaluations = {
+        stage: sum(counts.values()) for stage, counts in
+        integrator.get_force_group_evaluations_per_step().items()}
+    return {stage: steps_per_second * evaluations[measured_stage]
+            / evaluations[stage] for stage in evaluations}
+
+
+def project_wall_clock_seconds(stage_ranges, stage_step_rates, start_step,
+                               last_step):
+    """
+        :return: The seconds it takes to run the steps after start_step up
+                 to last_step, at the step rate of the stage of each step.
+    """
+    seconds = 0.0
+    for stage, first_step, stage_last_step in stage_ranges:
+        steps = (min(stage_last_step, last_step)
+                 - max(first_step, start_step + 1) + 1)
+        if steps > 0:
+            seconds += steps / stage_step_rates[stage]
+    return seconds
+
+
+def plan_run(config, platform_name, device_index="0", debug=False,
+             number_of_steps=200):
+    """
+        Build the simulation of a configuration, and project the cost of
+        its run.  The sample outputs go to a temporary directory, rather
+        than the output directory of the configuration.
+
+        :return: The plan, as a dictionary.
+    """
+    config = copy.deepcopy(config)
+    config.run_minimization = False
+    reporting = config.outputs.reporting
+    binary_logs = reporting.log_format == "binary"
+    reporting.log_format = "text"
+    if (config.system_cache is not None
+            and not config.system_cache.directory):
+        config.system_cache.directory = get_system_cache_directory(config)
+    number_of_steps_config = config.integrator.number_of_steps
+    last_step = number_of_steps_config.total_simulation_length
+    if config.input_files.gamd_restart is not None:
+        start_step = (number_of_steps_config.conventional_md
+                      + number_of_steps_config.gamd_equilibration)
+    else:
+        start_step = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        config.outputs.directory = directory
+        gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+            config, platform_name, device_index, debug=debug)
+        simulation = gamd_simulation.simulation
+        integrator = gamd_simulation.integrator
+        runner = Runner(config, gamd_simulation, debug)
+        if config.input_files.gamd_restart is not None:
+            runner.start_from_gamd_restart(start_step)
+        scheduler = runner.create_output_scheduler(start_step)
+        #
+        # The measured steps, and the first step before them, stay within
+        # the run, so that they fall in one of its stages.
+        #
+        measured_steps = min(number_of_steps, last_step - start_step - 1)
+        if measured_steps < 1:
+            raise ValueError("The run has too few steps to measure the step "
+                             "rate over.")
+        steps_per_second = measure_step_rate(simulation, measured_steps)
+        measured_stage = int(integrator.get_stage())
+        stage_step_rates = get_stage_step_rates(integrator, measured_stage,
+                                                steps_per_second)
+
+        #
+        # Sample rows of the logs, and frames of the trajectory, from the
+        # simulation as it stands after the measured steps.
+        #
+        outputs = []
+        frames = count_multiples(reporting.coordinates_interval, start_step,
+                                 last_step)
+        header_bytes, frame_bytes = measure_trajectory_frame(runner,
+                                                             simulation)
+        outputs.append(["output." + reporting.coordinates_file_type, frames,
+                        header_bytes, frame_bytes])
+
+        #
+        # The reweighting log only has the rows of the production.
+        #
+        gamd_loggers = []
+        if runner.gamd_logger_enabled:
+            gamd_loggers.append(["gamd.log", runner.register_gamd_logger(
+                False), frames])
+        if runner.gamd_reweighting_logger_enabled:
+            production_start_step = max(
+                start_step, number_of_steps_config.conventional_md
+                + number_of_steps_config.gamd_equilibration)
+            gamd_loggers.append([
+                "gamd-reweighting.log",
+                runner.register_gamd_reweighting_logger(False),
+                count_multiples(reporting.coordinates_interval,
+                                production_start_step - 1, last_step)])
+        for filename, gamd_logger, rows in gamd_loggers:
+            gamd_logger.mark_energies()
+            simulation.step(1)
+            gamd_logger.write_to_gamd_log(simulation.currentStep)
+            gamd_logger.close()
+            header_bytes, row_bytes = get_text_log_sizes(
+                os.path.join(directory, filename))
+            if binary_logs:
+                # The step, and a double for each value of the row.
+                columns = gamd_logger.get_header_lines()[-1].split(",")[1:]
+                filename += ".bin"
+                header_bytes, row_bytes = 0, 8 * len(columns)
+            outputs.append([filename, rows, header_bytes, row_bytes])
+
+        if integrator.boost_history_length:
+            boost_history_logger = runner.register_boost_history_logger(
+                False, simulation.currentStep - 1)
+            boost_history_logger.write_to_gamd_log(simulation.currentStep)
+            boost_history_logger.close()
+            filename = "gamd-boost-history.log"
+            header_bytes, row_bytes = get_text_log_sizes(
+                os.path.join(directory, filename))
+            if binary_logs:
+                filename += ".bin"
+                header_bytes = 0
+                row_bytes = 8 * len(integrator.boost_history_names)
+            outputs.append([filename, last_step - start_step, header_bytes,
+                            row_bytes])
+
+        checkpoint_bytes = len(simulation.context.createCheckpoint())
+
+    checkpoints = count_multiples(reporting.restart_checkpoint_interval,
+                                  start_step, last_step)
+    intervals = list(scheduler.get_intervals().values())
+    total_steps = last_step - start_step
+    round_trips = scheduler.count_round_trips()
+    dt = config.integrator.dt.value_in_unit(unit.nanoseconds)
+    stage_ranges = get_stage_ranges(integrator)
+    wall_clock_seconds = project_wall_clock_seconds(
+        stage_ranges, stage_step_rates, start_step, last_step)
+    plan = {
+        "number_of_atoms": gamd_simulation.system.getNumParticles(),
+        "platform": platform_name,
+        "start_step": start_step,
+        "last_step": last_step,
+        "stages": stage_ranges,
+        "chunk_size": int(reporting.compute_chunk_size()),
+        "intervals": scheduler.get_intervals(),
+        "round_trips": round_trips,
+        "runner_stops": scheduler.count_runner_stops(),
+        "checkpoints": checkpoints,
+        "checkpoint_bytes": checkpoint_bytes,
+        "checkpoint_keep": reporting.restart_checkpoint_keep,
+        "frames": frames,
+        "outputs": outputs,
+        "steps_per_second": steps_per_second,
+        "measured_stage": measured_stage,
+        "stage_steps_per_second": stage_step_rates,
+        "wall_clock_seconds": wall_clock_seconds,
+        "ns_per_day": total_steps / wall_clock_seconds * 3600 * 24 * dt,
+        "warnings": [],
+    }
+
+    warnings = plan["warnings"]
+    if intervals and plan["chunk_size"] < min(intervals):
+        warnings.append(
+            "The output intervals collapse to a chunk size of %d steps, "
+            "since they are not multiples of each other.  Their outputs fall "
+            "on different steps, and each one is a separate host round-trip."
+            % plan["chunk_size"])
+    if round_trips and total_steps / round_trips < MIN_STEPS_PER_ROUND_TRIP:
+        warnings.append(
+            "The run returns to the host every %.1f steps on average."
+            % (total_steps / round_trips))
+    if (not checkpoints
+            and reporting.restart_checkpoint_wall_clock_minutes is None):
+        warnings.append("The run writes no restart checkpoints.")
+    return plan
+
+
+def format_bytes(number_of_bytes):
+    for suffix in ["B", "kB", "MB", "GB"]:
+        if number_of_bytes < 1024 or suffix == "GB":
+            break
+        number_of_bytes /= 1024
+    return "%.1f %s" % (number_of_bytes, suffix)
+
+
+def print_plan(plan):
+    print("Atoms: \t\t\t", plan["number_of_atoms"])
+    print("Steps: \t\t\t", plan["start_step"] + 1, "to", plan["last_step"])
+    for stage, first_step, last_step in plan["stages"]:
+        print("  Stage %d (%s): \t steps %d to %d, %.1f steps per second" % (
+            stage, STAGE_NAMES[stage], first_step, last_step,
+            plan["stage_steps_per_second"][stage]))
+    print("Chunk size: \t\t", plan["chunk_size"], "steps (intervals:",
+          ", ".join("%s %d" % item for item in plan["intervals"].items())
+          + ")")
+    print("Host round-trips: \t", plan["round_trips"], "(runner stops: %d)"
+          % plan["runner_stops"])
+    print("Trajectory frames: \t", plan["frames"])
+    print("Checkpoints: \t\t", plan["checkpoints"], "of",
+          format_bytes(plan["checkpoint_bytes"]))
+
+    written_bytes = plan["checkpoints"] * plan["checkpoint_bytes"]
+    disk_bytes = (min(plan["checkpoints"], plan["checkpoint_keep"])
+                  * plan["checkpoint_bytes"])
+    print("Output files:")
+    for filename, rows, header_bytes, row_bytes in plan["outputs"]:
+        file_bytes = header_bytes + rows * row_bytes
+        written_bytes += file_bytes
+        disk_bytes += file_bytes
+        kind = "frames" if filename.startswith("output.") else "rows"
+        print("  %-28s %10d %-6s %10s" % (filename, rows, kind,
+                                          format_bytes(file_bytes)))
+    print("I/O volume: \t\t", format_bytes(written_bytes))
+    print("Disk footprint: \t", format_bytes(disk_bytes))
+    print("Step rate on %s: \t %.1f steps per second in stage %d, "
+          "%.3f ns per day over the run" % (
+              plan["platform"], plan["steps_per_second"],
+              plan["measured_stage"], plan["ns_per_day"]))
+    print("Projected wall time: \t %.0f s (%.2f hours)" % (
+        plan["wall_clock_seconds"], plan["wall_clock_seconds"] / 3600))
+    for warning in plan["warnings"]:
+        print("Warning: ", warning)
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(
+        prog="gamdRunner plan",
+        description="Validate GaMD configurations, and project the run "
+                    "time, I/O volume and disk footprint of their runs.")
+    argparser.add_argument("config_files", metavar="CONFIG", type=str,
+                           nargs="+", help="The XML configuration files.")
+    argparser.add_argument("-p", "--platform", dest="platform",
+                           default="CUDA", type=str,
+                           help="The platform to measure the step rate on.")
+    argparser.add_argument("-d", "--device_index", dest="device_index",
+                           default="0", type=str)
+    argparser.add_argument("-D", "--debug", dest="debug", default=False,
+                           action="store_true",
+                           help="Plan a run in debug mode.")
+    argparser.add_argument("--steps", dest="steps", default=200, type=int,
+                           help="The number of steps to measure the step "
+                                "rate over.")
+    args = argparser.parse_args(argv)
+
+    parser_factory = parser.ParserFactory()
+    invalid = False
+    for config_filename in args.config_files:
+        print("\n" + config_filename)
+        try:
+            config = parser_factory.parse_file(config_filename, "xml")
+            plan = plan_run(config, args.platform, args.device_index,
+                            args.debug, args.steps)
+        except Exception as e:
+            print("Invalid configuration: ", e)
+            invalid = True
+            continue
+        print_plan(plan)
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
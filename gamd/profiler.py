@@ -0,0 +1,168 @@
+"""
+profiler.py:  Opt-in profiling of the phases of the Runner loop.
+
+The PhaseProfiler keeps a latency histogram of each phase of the run loop,
+such as simulation.step(), the GaMD logging, the checkpoints and each of
+the OpenMM reporters, and runs cProfile over the whole loop.  At the end of
+the run, it writes the histograms and the top of the cProfile statistics to
+profile.txt, and the raw statistics to profile.pstats, which tools such as
+snakeviz can open.  The NoOpPhaseProfiler is used when profiling is off,
+and does nothing.
+
+"""
+
+import contextlib
+import cProfile
+import io
+import math
+import os
+import pstats
+import time
+
+# The smallest latency that gets a bucket of its own, in seconds.  Each
+# bucket after it covers twice the latencies of the one before.
+SMALLEST_BUCKET_SECONDS = 1.0e-6
+NUMBER_OF_BUCKETS = 32
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.min_seconds = None
+        self.max_seconds = None
+        self.buckets = [0] * NUMBER_OF_BUCKETS
+
+    def record(self, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        if self.min_seconds is None or seconds < self.min_seconds:
+            self.min_seconds = seconds
+        if self.max_seconds is None or seconds > self.max_seconds:
+            self.max_seconds = seconds
+        self.buckets[self.get_bucket_index(seconds)] += 1
+
+    @staticmethod
+    def get_bucket_index(seconds):
+        if seconds <= SMALLEST_BUCKET_SECONDS:
+            return 0
+        index = int(math.ceil(math.log2(seconds / SMALLEST_BUCKET_SECONDS)))
+        return min(index, NUMBER_OF_BUCKETS - 1)
+
+    @staticmethod
+    def get_bucket_upper_bound(index):
+        return SMALLEST_BUCKET_SECONDS * 2 ** index
+
+    def get_percentile(self, percentile):
+        """
+            An upper bound of the given percentile of the latencies, from
+            the bucket that it falls into.
+        """
+        if self.count == 0:
+            return 0.0
+        target = percentile / 100.0 * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= target:
+                return min(self.get_bucket_upper_bound(index),
+                           self.max_seconds)
+        return self.max_seconds
+
+
+class PhaseProfiler:
+    def __init__(self, use_cprofile=True):
+        self.histograms = {}
+        self.__cprofile = cProfile.Profile() if use_cprofile else None
+
+    def start(self):
+        if self.__cprofile is not None:
+            self.__cprofile.enable()
+
+    def stop(self):
+        if self.__cprofile is not None:
+            self.__cprofile.disable()
+
+    def record(self, phase, seconds):
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.histograms[phase] = histogram
+        histogram.record(seconds)
+
+    @contextlib.contextmanager
+    def time(self, phase):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start_time)
+
+    def format_histograms(self):
+        lines = ["%-32s %10s %12s %12s %12s %12s %12s" % (
+            "phase", "count", "total (s)", "mean (ms)", "p50 (ms)",
+            "p99 (ms)", "max (ms)")]
+        for phase, histogram in sorted(
+                self.histograms.items(),
+                key=lambda item: item[1].total_seconds, reverse=True):
+            lines.append("%-32s %10d %12.3f %12.3f %12.3f %12.3f %12.3f" % (
+                phase, histogram.count, histogram.total_seconds,
+                histogram.total_seconds / histogram.count * 1000,
+                histogram.get_percentile(50) * 1000,
+                histogram.get_percentile(99) * 1000,
+                histogram.max_seconds * 1000))
+        lines.append("")
+        lines.append("Latency histograms (upper bound of each bucket):")
+        for phase, histogram in sorted(self.histograms.items()):
+            buckets = ["<=%.3gms:%d" % (
+                           histogram.get_bucket_upper_bound(index) * 1000,
+                           count)
+                       for index, count in enumerate(histogram.buckets)
+                       if count > 0]
+            lines.append("  %s  %s" % (phase, " ".join(buckets)))
+        return "\n".join(lines) + "\n"
+
+    def format_cprofile(self, number_of_functions=40):
+        if self.__cprofile is None:
+            return ""
+        stream = io.StringIO()
+        statistics = pstats.Stats(self.__cprofile, stream=stream)
+        statistics.sort_stats("cumulative").print_stats(number_of_functions)
+        return stream.getvalue()
+
+    def write(self, output_directory):
+        """
+            Write profile.txt and, with cProfile, profile.pstats into the
+            output directory, and print the phase summary.
+        """
+        summary = self.format_histograms()
+        print(summary)
+        with open(os.path.join(output_directory, "profile.txt"),
+                  "w") as profile_file:
+            profile_file.write(summary)
+            profile_file.write("\n")
+            profile_file.write(self.format_cprofile())
+        if self.__cprofile is not None:
+            self.__cprofile.dump_stats(
+                os.path.join(output_directory, "profile.pstats"))
+
+
+class NoOpPhaseProfiler:
+    def __init__(self):
+        self.histograms = {}
+        self.__null_context = contextlib.nullcontext()
+
+    def start(self):
+        return
+
+    def stop(self):
+        return
+
+    def record(self, phase, seconds):
+        return
+
+    def time(self, phase):
+        return self.__null_context
+
+    def write(self, output_directory):
+        return
@@ -0,0 +1,629 @@
+"""
+reweighting.py:  Free energy profiles from GaMD simulations.
+
+The frames of a GaMD simulation are reweighted by the boost potential that
+was applied to them, to recover the free energy profile (the PMF) of the
+unboosted system along one or two reaction coordinates.  The boost
+potentials come from the GaMD log (gamd.log or gamd-reweighting.log, in
+text or binary form), and the reaction coordinates from a text file with
+one row per trajectory frame, in the same order as the rows of the log.
+
+The supported reweighting methods are:
+    noweight:     The plain histogram of the frames, without any boost.
+    exponential:  The exponential average of the boost potential.
+    maclaurin:    The Maclaurin series of the exponential, up to the order.
+    cumulant:     The cumulant expansion of the exponential average, up to
+                  the order (1 to 3).  The second order is what GaMD is
+                  built for.
+
+The logs are read in chunks, and each bin only keeps a few running sums, so
+the memory needed does not grow with the number of frames.  Several pairs of
+logs and reaction coordinate files, such as the replicas of an ensemble,
+are reduced in a process pool and their sums merged.
+
+The OnlineReweightingReporter keeps the same sums during the production
+stage of a run, for reaction coordinates computed from the positions
+(distances, angles and dihedrals of atoms), so that a current PMF is
+available at any checkpoint without reading the logs back in.  Its state is
+saved next to the checkpoints, and restarts carry on from it.
+
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import math
+import os
+
+import numpy as np
+import openmm.unit as unit
+
+from gamd import binlog
+from gamd.atomic_write import atomic_write
+
+METHODS = ["noweight", "exponential", "maclaurin", "cumulant"]
+
+# The Boltzmann constant in kcal/(mol K), the energy unit of the GaMD logs.
+BOLTZMANN_CONSTANT = 0.001987204259
+
+# The columns of the first and second boost potentials in the text GaMD log.
+BOOST_POTENTIAL_COLUMNS = [6, 7]
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+# Distances are in angstroms, and angles and dihedrals in degrees.
+REACTION_COORDINATE_TYPES = {"distance": 2, "angle": 3, "dihedral": 4}
+
+
+def read_text_rows(filename, columns, skip_rows=0,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Read the columns of a whitespace or comma separated text file, in
+        chunks of at most chunk_size rows, skipping comment lines.
+    """
+    with open(filename) as text_file:
+        lines = (line.replace(",", " ") for line in text_file
+                 if line.strip() and not line.lstrip().startswith(("#", "@")))
+        lines = itertools.islice(lines, skip_rows, None)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield np.loadtxt(chunk, usecols=columns, ndmin=2)
+
+
+def read_boost_potentials(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        The total boost potential of each row of a GaMD log in kcal/mol, in
+        chunks.  A binary log (gamd.log.bin) is memory mapped rather than
+        parsed.
+    """
+    if os.path.isdir(filename):
+        #
+        # The binary log has no ntwx column, so its columns are one to the
+        # left of the ones of the text log.
+        #
+        reader = binlog.BinaryLogReader(filename)
+        first, second = [column - 1 for column in BOOST_POTENTIAL_COLUMNS]
+        for segment in reader.segments:
+            rows = reader.read_segment(segment)
+            for start in range(0, segment["rows"], chunk_size):
+                end = start + chunk_size
+                yield rows[first, start:end] + rows[second, start:end]
+        return
+    for rows in read_text_rows(filename, BOOST_POTENTIAL_COLUMNS,
+                               chunk_size=chunk_size):
+        yield rows.sum(axis=1)
+
+
+def read_frames(log_filename, coordinates_filename, columns, skip_frames=0,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Join the boost potentials of the log with the reaction coordinates,
+        row by row, in chunks of (coordinates, boost potentials).
+    """
+    boosts = read_boost_potentials(log_filename, chunk_size)
+    coordinates = read_text_rows(coordinates_filename, columns, skip_frames,
+                                 chunk_size)
+    boost_buffer = np.zeros(0)
+    for coordinate_chunk in coordinates:
+        while len(boost_buffer) < len(coordinate_chunk):
+            boost_chunk = next(boosts, None)
+            if boost_chunk is None:
+                raise ValueError(
+                    "%s has more frames than the GaMD log %s has rows."
+                    % (coordinates_filename, log_filename))
+            boost_buffer = np.concatenate([boost_buffer, boost_chunk])
+        yield coordinate_chunk, boost_buffer[:len(coordinate_chunk)]
+        boost_buffer = boost_buffer[len(coordinate_chunk):]
+    if len(boost_buffer) > 0 or next(boosts, None) is not None:
+        raise ValueError("The GaMD log %s has more rows than %s has frames."
+                         % (log_filename, coordinates_filename))
+
+
+def find_ranges(coordinates_filename, columns, skip_frames=0,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    minimum = None
+    maximum = None
+    for chunk in read_text_rows(coordinates_filename, columns, skip_frames,
+                                chunk_size):
+        chunk_minimum = chunk.min(axis=0)
+        chunk_maximum = chunk.max(axis=0)
+        minimum = chunk_minimum if minimum is None \
+            else np.minimum(minimum, chunk_minimum)
+        maximum = chunk_maximum if maximum is None \
+            else np.maximum(maximum, chunk_maximum)
+    return minimum, maximum
+
+
+class ReweightingAccumulator:
+    """
+        The running sums of each bin that the reweighting methods need:  the
+        number of frames, the mean and the second and third central moments
+        of the boost potential (combined chunk by chunk, as in Chan et al.),
+        the power sums of the boost potential for the Maclaurin series, and
+        the log of the sum of the exponential weights.
+    """
+
+    def __init__(self, edges, beta, maclaurin_order=10):
+        """
+        Parameters
+        ----------
+        :param edges:           The bin edges of each reaction coordinate.
+        :param beta:            1/kT, in mol/kcal.
+        :param maclaurin_order: The highest power of the boost potential to
+                                keep a sum of.
+        """
+        self.edges = [np.asarray(dimension_edges, dtype=float)
+                      for dimension_edges in edges]
+        self.beta = beta
+        self.shape = tuple(len(dimension_edges) - 1
+                           for dimension_edges in self.edges)
+        number_of_bins = int(np.prod(self.shape))
+        self.counts = np.zeros(number_of_bins)
+        self.means = np.zeros(number_of_bins)
+        self.m2 = np.zeros(number_of_bins)
+        self.m3 = np.zeros(number_of_bins)
+        self.power_sums = np.zeros((maclaurin_order + 1, number_of_bins))
+        self.log_weights = np.full(number_of_bins, -np.inf)
+        self.frames = 0
+        self.frames_out_of_range = 0
+
+    def get_bin_indices(self, coordinates):
+        """
+            The flattened bin index of each frame, and which of the frames
+            fall within the bins at all.
+        """
+        indices = np.zeros(len(coordinates), dtype=np.int64)
+        in_range = np.ones(len(coordinates), dtype=bool)
+        for dimension, dimension_edges in enumerate(self.edges):
+            values = coordinates[:, dimension]
+            bins = np.searchsorted(dimension_edges, values, side="right") - 1
+            # The last edge belongs to the last bin.
+            bins[values == dimension_edges[-1]] = len(dimension_edges) - 2
+            in_range &= (bins >= 0) & (bins < len(dimension_edges) - 1)
+            indices = indices * (len(dimension_edges) - 1) + bins
+        return indices, in_range
+
+    def add(self, coordinates, boost_potentials):
+        coordinates = np.asarray(coordinates, dtype=float).reshape(
+            len(boost_potentials), -1)
+        boost_potentials = np.asarray(boost_potentials, dtype=float)
+        self.frames += len(boost_potentials)
+        indices, in_range = self.get_bin_indices(coordinates)
+        self.frames_out_of_range += int(np.count_nonzero(~in_range))
+        indices = indices[in_range]
+        boost_potentials = boost_potentials[in_range]
+        if len(indices) == 0:
+            return
+        number_of_bins = len(self.counts)
+
+        def bin_sums(weights):
+            return np.bincount(indices, weights, minlength=number_of_bins)
+
+        counts = bin_sums(None)
+        occupied = counts > 0
+        means = np.zeros(number_of_bins)
+        means[occupied] = bin_sums(boost_potentials)[occupied] \
+            / counts[occupied]
+        deviations = boost_potentials - means[indices]
+        m2 = bin_sums(deviations ** 2)
+        m3 = bin_sums(deviations ** 3)
+        self.__merge_moments(counts, means, m2, m3)
+
+        powers = np.ones_like(boost_potentials)
+        for order in range(len(self.power_sums)):
+            self.power_sums[order] += bin_sums(powers)
+            powers = powers * boost_potentials
+
+        exponents = self.beta * boost_potentials
+        shift = exponents.max()
+        with np.errstate(divide="ignore"):
+            log_sums = np.log(bin_sums(np.exp(exponents - shift))) + shift
+        self.log_weights = np.logaddexp(self.log_weights, log_sums)
+
+    def __merge_moments(self, counts, means, m2, m3):
+        total_counts = self.counts + counts
+        occupied = total_counts > 0
+        delta = means - self.means
+        ratio = np.zeros_like(total_counts)
+        ratio[occupied] = counts[occupied] / total_counts[occupied]
+        products = self.counts * counts
+        squared_totals = np.where(occupied, total_counts, 1.0) ** 2
+        self.m3 = (self.m3 + m3
+                   + delta ** 3 * products * (self.counts - counts)
+                   / squared_totals
+                   + 3.0 * delta * (self.counts * m2 - counts * self.m2)
+                   / np.where(occupied, total_counts, 1.0))
+        self.m2 = self.m2 + m2 + delta ** 2 * products \
+            / np.where(occupied, total_counts, 1.0)
+        self.means = self.means + delta * ratio
+        self.counts = total_counts
+
+    def merge(self, other):
+        """
+            Add the sums of another accumulator with the same bins, such as
+            the one of another replica.
+        """
+        self.__merge_moments(other.counts, other.means, other.m2, other.m3)
+        self.power_sums += other.power_sums
+        self.log_weights = np.logaddexp(self.log_weights, other.log_weights)
+        self.frames += other.frames
+        self.frames_out_of_range += other.frames_out_of_range
+
+    def save(self, filename, **extra_arrays):
+        """
+            Write the sums, and any extra arrays, to an .npz file, in one
+            step (see atomic_write).
+        """
+        arrays = {"edges_%d" % dimension: dimension_edges
+                  for dimension, dimension_edges in enumerate(self.edges)}
+        with atomic_write(filename, "wb") as sums_file:
+            np.savez(sums_file, beta=self.beta, counts=self.counts,
+                     means=self.means, m2=self.m2, m3=self.m3,
+                     power_sums=self.power_sums,
+                     log_weights=self.log_weights, frames=self.frames,
+                     frames_out_of_range=self.frames_out_of_range, **arrays,
+                     **extra_arrays)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as arrays:
+            edges = []
+            while "edges_%d" % len(edges) in arrays.files:
+                edges.append(arrays["edges_%d" % len(edges)])
+            accumulator = cls(edges, float(arrays["beta"]),
+                              len(arrays["power_sums"]) - 1)
+            for name in ["counts", "means", "m2", "m3", "power_sums",
+                         "log_weights"]:
+                setattr(accumulator, name, np.array(arrays[name]))
+            accumulator.frames = int(arrays["frames"])
+            accumulator.frames_out_of_range = int(
+                arrays["frames_out_of_range"])
+        return accumulator
+
+    def get_pmf(self, method, order=2, cutoff=10, emax=100.0):
+        """
+            The free energy of each bin in kcal/mol, shifted so that its
+            minimum is zero.  Bins with fewer frames than the cutoff get
+            emax instead.  The result has the shape of the bins.
+        """
+        if method not in METHODS:
+            raise ValueError("Unknown reweighting method: %s. Allowed "
+                             "methods are: %s." % (method,
+                                                   ", ".join(METHODS)))
+        kt = 1.0 / self.beta
+        populated = self.counts >= max(cutoff, 1)
+        counts = self.counts[populated]
+        if method == "noweight":
+            log_probabilities = np.log(counts)
+        elif method == "exponential":
+            log_probabilities = self.log_weights[populated]
+        elif method == "maclaurin":
+            if not 0 <= order < len(self.power_sums):
+                raise ValueError("The Maclaurin series is only kept up to "
+                                 "order %d." % (len(self.power_sums) - 1))
+            series = sum(self.beta ** power / math.factorial(power)
+                         * self.power_sums[power][populated]
+                         for power in range(order + 1))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                log_probabilities = np.log(series)
+        else:
+            if order not in [1, 2, 3]:
+                raise ValueError("The cumulant expansion is only supported "
+                                 "up to the third order.")
+            log_probabilities = np.log(counts) \
+                + self.beta * self.means[populated]
+            if order >= 2:
+                log_probabilities += self.beta ** 2 / 2.0 \
+                    * self.m2[populated] / counts
+            if order >= 3:
+                log_probabilities += self.beta ** 3 / 6.0 \
+                    * self.m3[populated] / counts
+
+        pmf = np.full(len(self.counts), emax)
+        free_energies = -kt * log_probabilities
+        finite = np.isfinite(free_energies)
+        if np.any(finite):
+            free_energies = free_energies - free_energies[finite].min()
+        free_energies[~finite] = emax
+        pmf[populated] = np.minimum(free_energies, emax)
+        return pmf.reshape(self.shape)
+
+
+def reweight_frames(log_filename, coordinates_filename, columns, edges, beta,
+                    skip_frames=0, maclaurin_order=10,
+                    chunk_size=DEFAULT_CHUNK_SIZE):
+    accumulator = ReweightingAccumulator(edges, beta, maclaurin_order)
+    for coordinates, boost_potentials in read_frames(
+            log_filename, coordinates_filename, columns, skip_frames,
+            chunk_size):
+        accumulator.add(coordinates, boost_potentials)
+    return accumulator
+
+
+def reweight(file_pairs, columns, edges, temperature=300.0, skip_frames=0,
+             maclaurin_order=10, number_of_workers=1,
+             chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Reduce each pair of GaMD log and reaction coordinate file to the sums
+        of its bins, in a pool of worker processes when there is more than
+        one pair, and merge them.
+
+        :return: The merged ReweightingAccumulator.
+    """
+    beta = 1.0 / (BOLTZMANN_CONSTANT * temperature)
+    arguments = [(log_filename, coordinates_filename, columns, edges, beta,
+                  skip_frames, maclaurin_order, chunk_size)
+                 for log_filename, coordinates_filename in file_pairs]
+    if number_of_workers > 1 and len(file_pairs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=number_of_workers) as executor:
+            accumulators = list(executor.map(reweight_frames,
+                                             *zip(*arguments)))
+    else:
+        accumulators = [reweight_frames(*pair_arguments)
+                        for pair_arguments in arguments]
+    accumulator = accumulators[0]
+    for other in accumulators[1:]:
+        accumulator.merge(other)
+    return accumulator
+
+
+def write_pmf(filename, accumulator, pmf):
+    centers = [(dimension_edges[:-1] + dimension_edges[1:]) / 2.0
+               for dimension_edges in accumulator.edges]
+    counts = accumulator.counts.reshape(accumulator.shape)
+    with open(filename, "w") as pmf_file:
+        pmf_file.write("# " + " ".join(
+            ["rc%d" % (dimension + 1) for dimension in range(len(centers))]
+            + ["pmf(kcal/mol)", "frames"]) + "\n")
+        for bin_index in np.ndindex(*accumulator.shape):
+            values = [centers[dimension][index]
+                      for dimension, index in enumerate(bin_index)]
+            pmf_file.write(" ".join(["%.6f" % value for value in values]
+                                    + ["%.6f" % pmf[bin_index],
+                                       "%d" % counts[bin_index]]) + "\n")
+
+
+def compute_reaction_coordinate(coordinate_type, positions):
+    """
+        The reaction coordinate of the positions of its atoms, in angstroms:
+        the distance between two atoms, the angle between three, or the
+        dihedral between four, in degrees.
+    """
+    if coordinate_type == "distance":
+        return float(np.linalg.norm(positions[1] - positions[0]))
+    if coordinate_type == "angle":
+        first = positions[0] - positions[1]
+        second = positions[2] - positions[1]
+        cosine = np.dot(first, second) / (np.linalg.norm(first)
+                                          * np.linalg.norm(second))
+        return math.degrees(math.acos(min(max(cosine, -1.0), 1.0)))
+    if coordinate_type == "dihedral":
+        first = positions[1] - positions[0]
+        second = positions[2] - positions[1]
+        third = positions[3] - positions[2]
+        first_normal = np.cross(first, second)
+        second_normal = np.cross(second, third)
+        y = np.dot(np.cross(first_normal, second_normal), second) \
+            / np.linalg.norm(second)
+        x = np.dot(first_normal, second_normal)
+        return math.degrees(math.atan2(y, x))
+    raise ValueError("Unknown reaction coordinate type: %s. Allowed types "
+                     "are: %s." % (coordinate_type,
+                                   ", ".join(REACTION_COORDINATE_TYPES)))
+
+
+class OnlineReweightingReporter:
+    """
+    OpenMM reporter that adds each production frame to a
+    ReweightingAccumulator as the simulation runs, with the reaction
+    coordinates computed from the positions and the total boost potential
+    read from the integrator.
+
+    It reports on the steps that the GaMD logs are written on, from the
+    first production step on, so that it sees the frames that would go into
+    gamd-reweighting.log.  save() writes its sums and the current PMF, and
+    is called whenever a checkpoint is saved.  A frame that was added before
+    the saved state is never added again after a restart.
+    """
+
+    def __init__(self, recording_rate, first_step, integrator,
+                 reaction_coordinates, temperature, state_filename,
+                 pmf_filename, method="cumulant", order=2, cutoff=10,
+                 restart=False):
+        """
+        Parameters
+        ----------
+        :param recording_rate:       The number of steps between frames.
+        :param first_step:           The first step of the production stage.
+        :param integrator:           The GaMD integrator to read the boost
+                                     potentials from.
+        :param reaction_coordinates: The ReactionCoordinateConfig of each
+                                     reaction coordinate, one or two.
+        :param temperature:          The temperature of the simulation.
+        :param state_filename:       The .npz file that the sums are saved
+                                     to.
+        :param pmf_filename:         The file that the current PMF is
+                                     written to.
+        :param method:               The reweighting method of the PMF.
+        :param order:                The order of the method.
+        :param cutoff:               Bins with fewer frames get the maximum
+                                     free energy.
+        :param restart:              Whether to carry on from the saved
+                                     state, if there is one.
+        """
+        if len(reaction_coordinates) not in [1, 2]:
+            raise ValueError("Online reweighting needs one or two reaction "
+                             "coordinates.")
+        for reaction_coordinate in reaction_coordinates:
+            number_of_atoms = REACTION_COORDINATE_TYPES.get(
+                reaction_coordinate.type)
+            if number_of_atoms is None:
+                raise ValueError(
+                    "Unknown reaction coordinate type: %s. Allowed types "
+                    "are: %s." % (reaction_coordinate.type,
+                                  ", ".join(REACTION_COORDINATE_TYPES)))
+            if len(reaction_coordinate.atoms) != number_of_atoms:
+                raise ValueError("A %s reaction coordinate needs %d atoms." %
+                                 (reaction_coordinate.type, number_of_atoms))
+        self.recording_rate = recording_rate
+        self.first_step = first_step
+        self.integrator = integrator
+        self.reaction_coordinates = reaction_coordinates
+        self.state_filename = state_filename
+        self.pmf_filename = pmf_filename
+        self.method = method
+        self.order = order
+        self.cutoff = cutoff
+        self.last_step = -1
+        if restart and os.path.exists(state_filename):
+            self.accumulator = ReweightingAccumulator.load(state_filename)
+            with np.load(state_filename) as arrays:
+                if "last_step" in arrays.files:
+                    self.last_step = int(arrays["last_step"])
+        else:
+            beta = 1.0 / (BOLTZMANN_CONSTANT
+                          * temperature.value_in_unit(unit.kelvin))
+            edges = [np.linspace(reaction_coordinate.minimum,
+                                 reaction_coordinate.maximum,
+                                 reaction_coordinate.bins + 1)
+                     for reaction_coordinate in reaction_coordinates]
+            self.accumulator = ReweightingAccumulator(edges, beta,
+                                                      max(10, order))
+
+    def set_integrator(self, integrator):
+        self.integrator = integrator
+
+    def describeNextReport(self, simulation):
+        step = max(simulation.currentStep + 1, self.first_step,
+                   self.last_step + 1)
+        step = -(-step // self.recording_rate) * self.recording_rate
+        return step - simulation.currentStep, True, False, False, False
+
+    def report(self, simulation, state):
+        step = simulation.currentStep
+        if step < self.first_step or step <= self.last_step \
+                or step % self.recording_rate != 0:
+            return
+        positions = state.getPositions(asNumpy=True).value_in_unit(
+            unit.angstroms)
+        coordinates = [compute_reaction_coordinate(
+                           reaction_coordinate.type,
+                           positions[reaction_coordinate.atoms])
+                       for reaction_coordinate in self.reaction_coordinates]
+        boost_potential = sum(self.integrator.get_boost_potentials()
+                              .values()) / 4.184
+        self.accumulator.add([coordinates], [boost_potential])
+        self.last_step = step
+
+    def get_pmf(self):
+        return self.accumulator.get_pmf(self.method, self.order, self.cutoff)
+
+    def save(self):
+        """
+            Save the sums, along with the last step they include, and write
+            out the current PMF.
+        """
+        self.accumulator.save(self.state_filename, last_step=self.last_step)
+        write_pmf(self.pmf_filename, self.accumulator, self.get_pmf())
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__,
+                                        formatter_class=argparse
+                                        .RawDescriptionHelpFormatter)
+    argparser.add_argument("-l", "--log", dest="logs", action="append",
+                           required=True, type=str,
+                           help="A GaMD log (gamd-reweighting.log, or a "
+                                "binary .bin log).  Give one per reaction "
+                                "coordinate file.")
+    argparser.add_argument("-c", "--coordinates", dest="coordinates",
+                           action="append", required=True, type=str,
+                           help="A text file with the reaction coordinates "
+                                "of each frame, in the order of the rows of "
+                                "the matching log.")
+    argparser.add_argument("--columns", dest="columns", nargs="+", type=int,
+                           default=[0],
+                           help="The columns of the reaction coordinates, "
+                                "one for a 1D and two for a 2D PMF.")
+    argparser.add_argument("-m", "--method", dest="method", default="cumulant",
+                           choices=METHODS, type=str,
+                           help="The reweighting method.")
+    argparser.add_argument("--order", dest="order", default=2, type=int,
+                           help="The order of the cumulant expansion or the "
+                                "Maclaurin series.")
+    argparser.add_argument("-b", "--bins", dest="bins", nargs="+", type=int,
+                           default=[50],
+                           help="The number of bins of each reaction "
+                                "coordinate.")
+    argparser.add_argument("-r", "--range", dest="ranges", nargs="+",
+                           type=float, default=None,
+                           help="The minimum and maximum of each reaction "
+                                "coordinate.  By default, the range of the "
+                                "data, at the cost of an extra pass.")
+    argparser.add_argument("-T", "--temperature", dest="temperature",
+                           default=300.0, type=float,
+                           help="The temperature of the simulation in K.")
+    argparser.add_argument("--skip-frames", dest="skip_frames", default=0,
+                           type=int,
+                           help="Frames at the start of each reaction "
+                                "coordinate file without a row in the log, "
+                                "such as the frames before the production.")
+    argparser.add_argument("--cutoff", dest="cutoff", default=10, type=int,
+                           help="Bins with fewer frames get the maximum "
+                                "free energy.")
+    argparser.add_argument("--emax", dest="emax", default=100.0, type=float,
+                           help="The maximum free energy in kcal/mol.")
+    argparser.add_argument("-w", "--workers", dest="workers", default=1,
+                           type=int,
+                           help="The number of processes to reduce the "
+                                "pairs of files with.")
+    argparser.add_argument("-o", "--output", dest="output", default="pmf.dat",
+                           type=str, help="The PMF file to write.")
+    args = argparser.parse_args()
+
+    if len(args.logs) != len(args.coordinates):
+        argparser.error("Give one --coordinates file per --log.")
+    dimensions = len(args.columns)
+    if dimensions not in [1, 2]:
+        argparser.error("Only 1D and 2D PMFs are supported.")
+    bins = args.bins * dimensions if len(args.bins) == 1 else args.bins
+    if len(bins) != dimensions:
+        argparser.error("Give one number of bins per reaction coordinate.")
+
+    if args.ranges is not None:
+        if len(args.ranges) != 2 * dimensions:
+            argparser.error("Give a minimum and maximum per reaction "
+                            "coordinate.")
+        minimum = np.array(args.ranges[0::2])
+        maximum = np.array(args.ranges[1::2])
+    else:
+        minimum = None
+        maximum = None
+        for coordinates_filename in args.coordinates:
+            file_minimum, file_maximum = find_ranges(
+                coordinates_filename, args.columns, args.skip_frames)
+            minimum = file_minimum if minimum is None \
+                else np.minimum(minimum, file_minimum)
+            maximum = file_maximum if maximum is None \
+                else np.maximum(maximum, file_maximum)
+    edges = [np.linspace(minimum[dimension], maximum[dimension],
+                         bins[dimension] + 1)
+             for dimension in range(dimensions)]
+
+    accumulator = reweight(list(zip(args.logs, args.coordinates)),
+                           args.columns, edges, args.temperature,
+                           args.skip_frames, max(10, args.order),
+                           args.workers)
+    pmf = accumulator.get_pmf(args.method, args.order, args.cutoff,
+                              args.emax)
+    write_pmf(args.output, accumulator, pmf)
+    print("Reweighted", accumulator.frames, "frames,",
+          accumulator.frames_out_of_range, "of them out of range, into",
+          args.output)
+
+
+if __name__ == "__main__":
+    main()
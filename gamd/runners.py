@@ -9,9 +9,20 @@ import sys
 import openmm.unit as unit
 import openmm.app as openmm_app
 
+from gamd import binlog
 from gamd import utils as utils
-from gamd.DebugLogger import DebugLogger, NoOpDebugLogger
-from gamd.GamdLogger import GamdLogger, NoOpGamdLogger
+from gamd.checkpointer import RESTART_CHECKPOINT_FILENAME, CheckpointWriter
+from gamd.DebugLogger import IGNORED_GLOBALS, DebugHistoryLogger, \
+    DebugLogger, NoOpDebugLogger
+from gamd.GamdLogger import BinaryGamdLogger, BoostHistoryLogger, \
+    GamdLogger, NoOpGamdLogger
+from gamd.profiler import NoOpPhaseProfiler, PhaseProfiler
+from gamd.gamdSimulation import GamdSimulationFactory
+from gamd.reweighting import OnlineReweightingReporter
+from gamd.scheduler import OutputScheduler
+from gamd.statreporter import StatisticsReporter
+from gamd.telemetry import RunMetrics, TimedReporter, get_reporter, \
+    get_stage_ranges
 
 
 def create_output_directories(directories, overwrite_output=False):
@@ -40,13 +51,25 @@ def print_global_variables(integrator):
 def write_gamd_production_restart_file(output_directory, integrator,
                                        first_boost_type, second_boost_type):
     gamd_prod_restart_filename = os.path.join(output_directory, "gamd-restart.dat")
-    values = integrator.get_statistics()
+    values = integrator.get_production_parameters()
 
     with open(gamd_prod_restart_filename, "w") as gamd_prod_restart_file:
         for key in values.keys():
             gamd_prod_restart_file.write(key + "=" + str(values[key]) + "\n")
 
 
+def read_gamd_production_restart_file(gamd_prod_restart_filename):
+    values = {}
+    with open(gamd_prod_restart_filename, "r") as gamd_prod_restart_file:
+        for line in gamd_prod_restart_file:
+            line = line.strip()
+            if not line:
+                continue
+            key, value = line.split("=", 1)
+            values[key.strip()] = float(value)
+    return values
+
+
 def get_config_and_simulation_values(gamd_simulation, config):
     output_directory = config.outputs.directory
     overwrite_output = config.outputs.overwrite_output
@@ -67,11 +90,13 @@ def get_config_and_simulation_values(gamd_simulation, config):
             nteb, last_step_of_equilibration, nstlim, ntave]
 
 
-def print_runtime_information(start_date_time, dt, nstlim, current_step):
+def print_runtime_information(start_date_time, dt, nstlim, current_step,
+                              run_metrics=None):
     end_date_time = datetime.datetime.now()
     time_difference = end_date_time - start_date_time
-    if time_difference.seconds > 0:
-        steps_per_second = (nstlim - current_step) / time_difference.seconds
+    if time_difference.total_seconds() > 0:
+        steps_per_second = ((nstlim - current_step)
+                            / time_difference.total_seconds())
     else:
         steps_per_second = 0
     daily_execution_rate = (steps_per_second * 3600 * 24 * dt)
@@ -83,116 +108,14 @@ def print_runtime_information(start_date_time, dt, nstlim, current_step):
     print("Daily execution rate:         ",
           str(daily_execution_rate.value_in_unit(unit.nanoseconds)),
           " ns per day.")
-
-
-class RunningRates:
-
-    def __init__(self, number_of_simulation_steps: int, save_rate: int,
-                 reporting_rate: int,
-                 debugging_enabled: bool=False,
-                 debugging_step_function=None) -> None:
-        """Constructor
-
-            The save_rate determines that rate at which to write out
-            DCD/PDB file, checkpoint, coordinates, and write to the GaMD log
-            files. The value of save_rate should evenly divide the number of
-            simulation steps.
-
-            The reporting_rate determines the rate at which to write out to
-            the state-data.log and the debugging files, if enabled.  The value
-            of the reporting rate should evenly divide the number of simulation
-             steps.
-
-            The save_rate or reporting_rate should be a multiple of the other
-            value, if debugging is enabled.
-
-            The save_rate, reporting_rate, and debugging flag determine the
-            batch_run_rate, which is just the number of steps to have
-            OpenMM execute at one time in the simulation.
-
-        Parameters
-
-        :param number_of_simulation_steps:  (int) Same as nstlim, the total
-                                            number of steps in the simulation.
-
-        :param save_rate: (int) the number of steps before performing a save.
-
-        :param reporting_rate:  (int) the number of steps before printing to
-                                reports.
-
-        :param debugging_enabled:   (boolean) indicates whether debugging is
-                                    enabled.  Defaults: False
-
-        """
-        if ((number_of_simulation_steps % save_rate) != 0 and
-                (number_of_simulation_steps % reporting_rate) != 0):
-            raise ValueError("RunningRates:  The save_rate and "
-                             "reporting_rate should evenly divide "
-                             "into the number of steps in the simulation.")
-
-        if debugging_enabled and not (((save_rate % reporting_rate) == 0) or
-                                      ((reporting_rate % save_rate) == 0)):
-            raise ValueError("RunningRates:  When debugging is enabled, "
-                             "save_rate/reporting_rate must be a multiple of "
-                             "the other value.")
-
-        self.debugging_step_function = debugging_step_function
-        if callable(debugging_step_function):
-            self.custom_debugging_function = True
-        else:
-            self.custom_debugging_function = False
-
-        self.save_rate = save_rate
-        self.reporting_rate = reporting_rate
-        self.number_of_simulation_steps = number_of_simulation_steps
-        self.debugging_enabled = debugging_enabled
-
-        if debugging_enabled:
-            if save_rate <= reporting_rate:
-                self.batch_run_rate = save_rate
-            else:
-                self.batch_run_rate = reporting_rate
-        else:
-            self.batch_run_rate = self.save_rate
-
-    def get_save_rate(self):
-        return self.save_rate
-
-    def get_reporting_rate(self):
-        return self.reporting_rate
-
-    def is_save_step(self, step):
-        return (step % self.save_rate) == 0
-
-    def is_reporting_step(self, step):
-        return (step % self.reporting_rate) == 0
-
-    def get_batch_run_rate(self):
-        return self.batch_run_rate
-
-    def is_debugging_step(self, step):
-        if self.custom_debugging_function:
-            result = self.debugging_step_function(step)
-        else:
-            result = (step % self.reporting_rate) == 0
-        return result
-
-    def get_batch_run_range(self):
-        return range(1, self.number_of_simulation_steps //
-                     self.get_batch_run_rate()+1)
-
-    def get_restart_step(self, integrator):
-        start_step = int(round(integrator.getGlobalVariableByName("stepCount") /
-                         self.get_batch_run_rate()))
-        return start_step
-
-    def get_restart_batch_run_range(self, integrator):
-        return range(self.get_restart_step(integrator)+1,
-                     self.number_of_simulation_steps //
-                     self.get_batch_run_rate()+1)
-
-    def get_step_from_frame(self, frame):
-        return frame * self.get_batch_run_rate()
+    if run_metrics is not None:
+        metrics = run_metrics.get_metrics()
+        print("Wall clock seconds spent in:  ",
+              ", ".join("%s %.2f" % (category, seconds) for category, seconds
+                        in metrics["seconds"].items()))
+        for stage, stage_metrics in metrics["stages"].items():
+            print("Stage " + stage + " execution rate:      ",
+                  "%.3f" % stage_metrics["ns_per_day"], " ns per day.")
 
 
 class Runner:
@@ -200,17 +123,12 @@ class Runner:
         self.config = config
         self.gamd_simulation = gamd_simulation
         self.debug = debug
-        nstlim = self.config.integrator.number_of_steps.total_simulation_length
-        self.chunk_size = self.config.outputs.reporting.compute_chunk_size()
-        if debug:
-            self.running_rates = RunningRates(nstlim, self.chunk_size, 1, True)
-        else:
-            self.running_rates = RunningRates(nstlim, self.chunk_size, 
-                                              self.chunk_size, False)
         self.gamd_logger_enabled = True
         self.gamd_reweighting_logger_enabled = False
         self.state_data_reporter_enabled = False
         self.gamd_dat_reporter_enabled = False
+        self.metrics = None
+        self.profiler = NoOpPhaseProfiler()
         return
 
     def run_post_simulation(self, temperature, output_directory,
@@ -274,6 +192,19 @@ class Runner:
                 potentialEnergy=True, totalEnergy=True,
                 volume=True))
 
+    def is_binary_log_format(self):
+        log_format = self.config.outputs.reporting.log_format
+        if log_format not in binlog.LOG_FORMATS:
+            raise ValueError("Unknown log format: %s. Allowed formats are: "
+                             "%s." % (log_format,
+                                      ", ".join(binlog.LOG_FORMATS)))
+        return log_format == "binary"
+
+    def get_gamd_logger_class(self):
+        if self.is_binary_log_format():
+            return BinaryGamdLogger
+        return GamdLogger
+
     def register_gamd_data_reporter(self, restart):
         if self.gamd_dat_reporter_enabled:
             simulation = self.gamd_simulation.simulation
@@ -282,16 +213,19 @@ class Runner:
             integrator = self.gamd_simulation.integrator
 
             #
-            #  The GamdDatReporter uses the write mode to determine whether to write out headers or not.
+            #  The StatisticsReporter uses the write mode to determine whether to write out headers or not.
             #
 
             if restart:
                 write_mode = "a"
             else:
                 write_mode = "w"
-            gamd_dat_reporter = utils.GamdDatReporter(gamd_running_dat_filename, write_mode,
-                                                      integrator)
-            simulation.reporters.append(gamd_dat_reporter)
+            log_format = "binary" if self.is_binary_log_format() else "text"
+            statistics_reporter = StatisticsReporter(
+                self.config.outputs.reporting.statistics_interval,
+                gamd_running_dat_filename, integrator, write_mode,
+                log_format=log_format)
+            simulation.reporters.append(statistics_reporter)
 
     def register_gamd_logger(self, restart):
         if self.gamd_logger_enabled:
@@ -304,11 +238,13 @@ class Runner:
             else:
                 write_mode = "w"
 
-            gamd_logger = GamdLogger(gamd_log_filename, write_mode, integrator,
-                                     simulation, self.gamd_simulation.first_boost_type,
-                                     self.gamd_simulation.first_boost_group,
-                                     self.gamd_simulation.second_boost_type,
-                                     self.gamd_simulation.second_boost_group)
+            gamd_logger_class = self.get_gamd_logger_class()
+            gamd_logger = gamd_logger_class(gamd_log_filename, write_mode,
+                                            integrator, simulation,
+                                            self.gamd_simulation.first_boost_type,
+                                            self.gamd_simulation.first_boost_group,
+                                            self.gamd_simulation.second_boost_type,
+                                            self.gamd_simulation.second_boost_group)
             if not restart:
                 gamd_logger.write_header()
         else:
@@ -327,20 +263,60 @@ class Runner:
             else:
                 write_mode = "w"
 
-            gamd_reweighting_logger = GamdLogger(gamd_reweighting_filename,
-                                                 write_mode, integrator,
-                                                 simulation,
-                                                 self.gamd_simulation.first_boost_type,
-                                                 self.gamd_simulation.first_boost_group,
-                                                 self.gamd_simulation.second_boost_type,
-                                                 self.gamd_simulation.second_boost_group)
+            gamd_logger_class = self.get_gamd_logger_class()
+            gamd_reweighting_logger = gamd_logger_class(
+                gamd_reweighting_filename, write_mode, integrator, simulation,
+                self.gamd_simulation.first_boost_type,
+                self.gamd_simulation.first_boost_group,
+                self.gamd_simulation.second_boost_type,
+                self.gamd_simulation.second_boost_group)
             if not restart:
                 gamd_reweighting_logger.write_header()
         else:
             gamd_reweighting_logger = NoOpGamdLogger()
         return gamd_reweighting_logger
 
-    def register_debug_logger(self, restart):
+    def register_boost_history_logger(self, restart, current_step):
+        """
+            Log the boost potentials of every step, when the integrator
+            keeps a boost history on the device.
+        """
+        integrator = self.gamd_simulation.integrator
+        if not integrator.boost_history_length:
+            return NoOpGamdLogger()
+        boost_history_filename = os.path.join(self.config.outputs.directory,
+                                              "gamd-boost-history.log")
+        log_format = "binary" if self.is_binary_log_format() else "text"
+        boost_history_logger = BoostHistoryLogger(
+            boost_history_filename, "a" if restart else "w", integrator,
+            current_step, log_format)
+        if not restart:
+            boost_history_logger.write_header()
+        return boost_history_logger
+
+    def register_online_reweighting_reporter(self, restart,
+                                             production_logging_start_step):
+        """
+            Keep the reweighting sums of the production frames during the
+            run, when the configuration asks for them.  The sums are saved
+            to reweighting-state.npz, and the current PMF to pmf-online.dat,
+            with every checkpoint.
+        """
+        reweighting = self.config.outputs.reporting.reweighting
+        if reweighting is None:
+            return
+        output_directory = self.config.outputs.directory
+        reporter = OnlineReweightingReporter(
+            self.config.outputs.reporting.coordinates_interval,
+            production_logging_start_step, self.gamd_simulation.integrator,
+            reweighting.reaction_coordinates, self.config.temperature,
+            os.path.join(output_directory, "reweighting-state.npz"),
+            os.path.join(output_directory, "pmf-online.dat"),
+            reweighting.method, reweighting.order, reweighting.cutoff,
+            restart)
+        self.gamd_simulation.simulation.reporters.append(reporter)
+
+    def register_debug_logger(self, restart, current_step=0):
         output_directory = self.config.outputs.directory
         integrator = self.gamd_simulation.integrator
         debug_filename = os.path.join(output_directory, "debug.csv")
@@ -350,16 +326,12 @@ class Runner:
             write_mode = "w"
 
         if self.debug:
-            ignore_fields = {"stageOneIfValueIsZeroOrNegative",
-                             "stageTwoIfValueIsZeroOrNegative",
-                             "stageThreeIfValueIsZeroOrNegative",
-                             "stageFourIfValueIsZeroOrNegative",
-                             "stageFiveIfValueIsZeroOrNegative",
-                             "thermal_energy", "collision_rate",
-                             "vscale", "fscale", "noisescale"}
-
-            debug_logger = DebugLogger(debug_filename, write_mode,
-                                       ignore_fields)
+            if integrator.has_globals_history("debug"):
+                debug_logger = DebugHistoryLogger(debug_filename, write_mode,
+                                                  current_step)
+            else:
+                debug_logger = DebugLogger(debug_filename, write_mode,
+                                           IGNORED_GLOBALS)
             print("Debugging enabled.")
             int_algorithm_filename = os.path.join(output_directory,
                                                   "integration-algorithm.txt")
@@ -372,15 +344,190 @@ class Runner:
 
         return debug_logger
 
-    def run(self, restart=False):
-        chunk_size = self.chunk_size
+    def has_unlatched_log_energies(self):
+        """
+            Whether the GaMD logs hold an energy that the integrator does
+            not latch, such as the dihedral energy under a total boost.
+            The loggers evaluate it themselves in mark_energies().
+        """
+        integrator = self.gamd_simulation.integrator
+        latched_names = integrator.get_unboosted_energy_names()
+        for boost_type in [self.gamd_simulation.first_boost_type,
+                           self.gamd_simulation.second_boost_type]:
+            name = integrator.get_variable_name_by_type(
+                boost_type, "UnboostedPotentialEnergy")
+            if name not in latched_names:
+                return True
+        return False
+
+    def create_output_scheduler(self, current_step):
+        """
+            Build the schedule of the steps at which the run loop has to stop.
+            The GaMD logs follow the coordinates interval, so that each row
+            lines up with a trajectory frame.  The reporters attached to the
+            simulation are registered as passive streams, since OpenMM stops
+            for them inside simulation.step().
+        """
+        reporting = self.config.outputs.reporting
+        number_of_steps = self.config.integrator.number_of_steps
+        scheduler = OutputScheduler(
+            number_of_steps.total_simulation_length, current_step)
+
+        if self.gamd_logger_enabled or self.gamd_reweighting_logger_enabled:
+            scheduler.add_stream("gamd-log", reporting.coordinates_interval)
+            if self.has_unlatched_log_energies():
+                scheduler.add_stream("mark-energies",
+                                     reporting.coordinates_interval, offset=1)
+        if reporting.restart_checkpoint_interval:
+            scheduler.add_stream("checkpoint",
+                                 reporting.restart_checkpoint_interval)
+        if self.debug:
+            integrator = self.gamd_simulation.integrator
+            if integrator.has_globals_history("debug"):
+                scheduler.add_stream(
+                    "debug", integrator.get_globals_history_steps("debug"))
+            else:
+                scheduler.add_stream("debug", 1)
+        boost_history_length = self.gamd_simulation.integrator \
+            .boost_history_length
+        if boost_history_length:
+            scheduler.add_stream("boost-history", boost_history_length)
+        scheduler.add_event("end-of-equilibration",
+                            number_of_steps.conventional_md +
+                            number_of_steps.gamd_equilibration)
+
+        scheduler.add_stream("trajectory", reporting.coordinates_interval,
+                             passive=True)
+        if self.state_data_reporter_enabled:
+            scheduler.add_stream("state-data", reporting.energy_interval,
+                                 passive=True)
+        if self.gamd_dat_reporter_enabled:
+            scheduler.add_stream("statistics", reporting.statistics_interval,
+                                 passive=True)
+        if reporting.reweighting is not None:
+            scheduler.add_stream("reweighting", reporting.coordinates_interval,
+                                 passive=True)
+        return scheduler
+
+    def switch_to_production_integrator(self, gamd_loggers):
+        """
+            Once the boost statistics are final, the rest of the run only
+            needs the production stage.  Switching to an integrator that
+            leaves out the other stages saves every step from evaluating
+            their guards and branches.
+        """
+        result = GamdSimulationFactory().createGamdIntegrator(
+            self.config, self.gamd_simulation.system, production_only=True,
+            debug=self.debug)
+        integrator = result[2]
+        self.gamd_simulation.switch_integrator(integrator)
+        for gamd_logger in gamd_loggers:
+            gamd_logger.set_integrator(integrator)
+        for reporter in self.gamd_simulation.simulation.reporters:
+            reporter = get_reporter(reporter)
+            if isinstance(reporter, (StatisticsReporter,
+                                     OnlineReweightingReporter)):
+                reporter.set_integrator(integrator)
+        print("Switched to the production only integrator at step:",
+              integrator.get_step_count())
+        return integrator
+
+    def start_from_gamd_restart(self, last_step_of_equilibration):
+        """
+            Go straight into the GaMD production with the boost parameters
+            that an earlier run saved at the end of its GaMD equilibration.
+            The simulation carries on from the last step of the
+            equilibration, so that the step numbers in the logs and the
+            checkpoints line up with those of a full run.
+        """
+        gamd_restart = self.config.input_files.gamd_restart
+        simulation = self.gamd_simulation.simulation
+        integrator = self.gamd_simulation.integrator
+        if not integrator.is_production_only():
+            raise ValueError("Starting from a gamd-restart file requires a "
+                             "production only integrator.")
+
+        values = read_gamd_production_restart_file(gamd_restart.parameters)
+        if gamd_restart.state is not None:
+            simulation.loadState(gamd_restart.state)
+        integrator.set_production_parameters(values)
+        simulation.context.setTime(last_step_of_equilibration *
+                                   self.config.integrator.dt)
+        simulation.currentStep = last_step_of_equilibration
+        integrator.setGlobalVariableByName("stepCount",
+                                           last_step_of_equilibration)
+        print("starting the GaMD production from:", gamd_restart.parameters,
+              "at step:", last_step_of_equilibration)
+        return last_step_of_equilibration
+
+    def flush_logs(self, gamd_loggers):
+        """
+            Flush the GaMD logs and the statistics, and save the online
+            reweighting sums, so that they hold every row up to the
+            checkpoint that was just saved.
+        """
+        for gamd_logger in gamd_loggers:
+            gamd_logger.flush()
+        for reporter in self.gamd_simulation.simulation.reporters:
+            reporter = get_reporter(reporter)
+            if isinstance(reporter, StatisticsReporter):
+                reporter.flush()
+            elif isinstance(reporter, OnlineReweightingReporter):
+                reporter.save()
+
+    def create_run_metrics(self, current_step):
+        """
+            Set up the throughput metrics of this run, and time the
+            reporters of the simulation as a part of them, and of the
+            profile of the run.  The metrics stay available as self.metrics
+            during and after the run.
+        """
+        reporting = self.config.outputs.reporting
+        extension = "json" if reporting.metrics_format == "json" else "prom"
+        metrics_filename = None
+        if reporting.metrics_wall_clock_seconds:
+            metrics_filename = os.path.join(self.config.outputs.directory,
+                                            "metrics." + extension)
+        self.metrics = RunMetrics(
+            self.config.integrator.dt, current_step,
+            get_stage_ranges(self.gamd_simulation.integrator),
+            filename=metrics_filename,
+            file_format=reporting.metrics_format,
+            interval_seconds=reporting.metrics_wall_clock_seconds)
+        simulation = self.gamd_simulation.simulation
+        simulation.reporters[:] = [
+            TimedReporter(get_reporter(reporter), self.metrics,
+                          self.profiler)
+            for reporter in simulation.reporters]
+        return self.metrics
+
+    def run(self, restart=False, profile=False):
+        """
+            Run the simulation.  With profile, the latency of each phase of
+            the run loop and of each reporter is kept in a histogram, and
+            the loop runs under cProfile.  Both are written to profile.txt
+            and profile.pstats in the output directory at the end of the
+            run.
+        """
         output_directory, overwrite_output, system, simulation, dt, \
             integrator, ntcmdprep, ntcmd, ntebprep, nteb, \
             last_step_of_equilibration, nstlim, ntave \
             = get_config_and_simulation_values(self.gamd_simulation, self.config)
 
         restart_checkpoint_filename = os.path.join(
-            output_directory, "gamd_restart.checkpoint")
+            output_directory, RESTART_CHECKPOINT_FILENAME)
+
+        #
+        # The gamd-restart files may well be in the output directory of the
+        # earlier run, so they are read before any output directory is
+        # replaced.
+        #
+        if (not restart and
+                self.config.input_files.gamd_restart is not None):
+            current_step = self.start_from_gamd_restart(
+                last_step_of_equilibration)
+        else:
+            current_step = 0
 
         if not restart:
             create_output_directories(
@@ -396,25 +543,41 @@ class Runner:
             simulation.currentStep = current_step
             print("restarting from saved checkpoint:",
                   restart_checkpoint_filename, "at step:", current_step)
-
-            running_range = self.running_rates.get_restart_batch_run_range(
-                integrator)
-        else:
-            current_step = 0
-            running_range = self.running_rates.get_batch_run_range()
+            if (self.config.integrator.lean_production
+                    and current_step >= last_step_of_equilibration
+                    and not integrator.is_production_only()):
+                integrator = self.switch_to_production_integrator([])
+
+        reporting = self.config.outputs.reporting
+        checkpoint_writer = CheckpointWriter(
+            restart_checkpoint_filename,
+            reporting.restart_checkpoint_interval,
+            reporting.restart_checkpoint_wall_clock_minutes,
+            reporting.restart_checkpoint_keep)
 
         self.register_trajectory_reporter(restart)
         self.register_state_data_reporter(restart)
         self.register_gamd_data_reporter(restart)
-        debug_logger = self.register_debug_logger(restart)
+        debug_logger = self.register_debug_logger(restart, current_step)
         gamd_logger = self.register_gamd_logger(restart)
         gamd_reweighting_logger = self.register_gamd_reweighting_logger(restart)
-
+        boost_history_logger = self.register_boost_history_logger(
+            restart, current_step)
+        gamd_log_interval = self.config.outputs.reporting.coordinates_interval
         reweighting_offset = 0
         production_logging_start_step = (ntcmd + nteb +
-                                         (self.running_rates.
-                                          get_batch_run_rate()
+                                         (gamd_log_interval
                                           * reweighting_offset))
+        self.register_online_reweighting_reporter(
+            restart, production_logging_start_step)
+
+        scheduler = self.create_output_scheduler(current_step)
+        if profile:
+            self.profiler = PhaseProfiler()
+        else:
+            self.profiler = NoOpPhaseProfiler()
+        profiler = self.profiler
+        run_metrics = self.create_run_metrics(current_step)
 
         self.save_initial_configuration(production_logging_start_step,
                                         self.config.temperature)
@@ -422,69 +585,129 @@ class Runner:
         print("Running: \t ",
               str(integrator.get_total_simulation_steps() - current_step),
               " steps")
+        print("Host round-trips: \t ", str(scheduler.count_round_trips()))
+
+        # The stop before the first row of the logs may be the current step.
+        gamd_logger.mark_energies()
+        gamd_reweighting_logger.mark_energies()
 
         start_date_time = datetime.datetime.now()
         start_time = time.time()
-        batch_run_rate = self.running_rates.get_batch_run_rate()
-        for batch_frame in running_range:
-            step = self.running_rates.get_step_from_frame(batch_frame)
-
-            if self.running_rates.is_save_step(step):
-                simulation.saveCheckpoint(restart_checkpoint_filename)
-
-            gamd_logger.mark_energies()
-            if self.running_rates.is_save_step(step):
-                gamd_reweighting_logger.mark_energies()
+        profiler.start()
+        while not scheduler.is_finished():
+            step, due = scheduler.advance()
 
             try:
 
                 #
-                #  NOTE:  We need to save off the starting total and dihedral
-                #  potential energies, since we end up modifying them by
-                #  updating the state of the particles.  This allows us to
-                #  write out the values as they were at the beginning of the
-                #  step for what all of the calculations for boosting were
-                #  based on.
+                #  NOTE:  The unboosted energies written to the GaMD logs are
+                #  the ones the integrator latched at the beginning of the
+                #  last step, which is what all of the calculations for
+                #  boosting were based on.  mark_energies() only evaluates
+                #  the energies that the integrator does not track itself,
+                #  and the run stops one step before each row of the logs
+                #  to do that, so that the row comes from a single step.
                 #
 
-                simulation.step(batch_run_rate)
-                if self.running_rates.is_debugging_step(batch_frame):
-                    debug_logger.write_global_variables_values(integrator)
-
-                if self.running_rates.is_save_step(step):
-                    gamd_logger.write_to_gamd_log(step)
-                    if step >= production_logging_start_step:
-                        gamd_reweighting_logger.write_to_gamd_log(step)
+                step_start_time = time.perf_counter()
+                simulation.step(step - simulation.currentStep)
+                step_seconds = time.perf_counter() - step_start_time
+                run_metrics.add_chunk(step, step_seconds)
+                # This includes the time spent in the reporters.
+                profiler.record("simulation.step", step_seconds)
+                if "debug" in due:
+                    with run_metrics.time("debug"), profiler.time("debug"):
+                        debug_logger.write_global_variables_values(integrator)
+
+                if "mark-energies" in due:
+                    with run_metrics.time("gamd-log"), \
+                            profiler.time("mark_energies"):
+                        gamd_logger.mark_energies()
+                        gamd_reweighting_logger.mark_energies()
+
+                if "gamd-log" in due:
+                    with run_metrics.time("gamd-log"), \
+                            profiler.time("write_to_gamd_log"):
+                        gamd_logger.write_to_gamd_log(step)
+                        if step >= production_logging_start_step:
+                            gamd_reweighting_logger.write_to_gamd_log(step)
+
+                if "boost-history" in due:
+                    with run_metrics.time("gamd-log"), \
+                            profiler.time("write_boost_history"):
+                        boost_history_logger.write_to_gamd_log(step)
+
+                if checkpoint_writer.is_checkpoint_step(step):
+                    with run_metrics.time("checkpoint"), \
+                            profiler.time("saveCheckpoint"):
+                        checkpoint_writer.save(simulation)
+                        self.flush_logs([gamd_logger,
+                                         gamd_reweighting_logger,
+                                         boost_history_logger])
 
             except Exception as e:
                 print("Failure on step " + str(step))
                 print(e)
                 gamd_logger.close()
                 gamd_reweighting_logger.close()
+                boost_history_logger.close()
                 debug_logger.print_global_variables_to_screen(integrator)
                 debug_logger.write_global_variables_values(integrator)
                 debug_logger.close()
+                # A checkpoint that failed to write in the background must
+                # not hide the original failure.
+                try:
+                    checkpoint_writer.close()
+                except Exception as checkpoint_error:
+                    print("Failed to write a restart checkpoint: "
+                          + str(checkpoint_error))
+                profiler.stop()
 
                 sys.exit(2)
 
-            if step == last_step_of_equilibration:
-                write_gamd_production_restart_file(output_directory, integrator,
-                                                   self.gamd_simulation.first_boost_type,
-                                                   self.gamd_simulation.second_boost_type)
+            if "end-of-equilibration" in due:
+                with run_metrics.time("restart-file"), \
+                        profiler.time("restart-file"):
+                    write_gamd_production_restart_file(output_directory, integrator,
+                                                       self.gamd_simulation.first_boost_type,
+                                                       self.gamd_simulation.second_boost_type)
+                    simulation.saveState(os.path.join(output_directory,
+                                                      "gamd-restart.xml"))
+                if self.config.integrator.lean_production:
+                    debug_logger.flush(integrator)
+                    integrator = self.switch_to_production_integrator(
+                        [gamd_logger, gamd_reweighting_logger,
+                         boost_history_logger])
+
+            run_metrics.write_if_due()
 
         #
         # These calls are here to guarantee that the file buffers have been
         # flushed, prior to any post-simulations steps attempting
         # to utilize these files.
         #
+        boost_history_logger.write_to_gamd_log(simulation.currentStep)
+        debug_logger.flush(integrator)
         gamd_logger.close()
         gamd_reweighting_logger.close()
+        boost_history_logger.close()
         debug_logger.close()
 
-        simulation.saveCheckpoint(restart_checkpoint_filename)
-        print_runtime_information(start_date_time, dt, nstlim, current_step)
-        production_starting_frame = (((ntcmd + nteb) / chunk_size) +
-                                     reweighting_offset)
+        with run_metrics.time("checkpoint"), profiler.time("saveCheckpoint"):
+            checkpoint_writer.save(simulation)
+            self.flush_logs([])
+            checkpoint_writer.close()
+        profiler.stop()
+        run_metrics.write()
+        profiler.write(output_directory)
+        print_runtime_information(start_date_time, dt, nstlim, current_step,
+                                  run_metrics)
+        if self.config.input_files.gamd_restart is not None:
+            # The trajectory only holds the production frames.
+            production_starting_frame = reweighting_offset
+        else:
+            production_starting_frame = (((ntcmd + nteb) / gamd_log_interval)
+                                         + reweighting_offset)
         self.run_post_simulation(self.config.temperature, output_directory,
                                  production_starting_frame)
 
@@ -0,0 +1,167 @@
+"""
+scheduler.py:  Decides where the runner has to stop the simulation.
+
+Rather than running the simulation in fixed chunks of the greatest common
+divisor of all of the output intervals, the OutputScheduler keeps a priority
+queue of the next step at which each output stream is due.  Each call to
+simulation.step() then advances straight to the next due event, no matter
+how the intervals relate to each other.
+
+"""
+
+import heapq
+import itertools
+import math
+
+
+def count_multiples_in_range(intervals, start_step, end_step):
+    """
+        Count the steps in (start_step, end_step] that are a multiple of at
+        least one of the intervals, using inclusion-exclusion over the least
+        common multiples of the intervals.
+    """
+    intervals = sorted(set(intervals))
+    count = 0
+    for size in range(1, len(intervals) + 1):
+        sign = 1 if size % 2 == 1 else -1
+        for combination in itertools.combinations(intervals, size):
+            lcm = 1
+            for interval in combination:
+                lcm = lcm * interval // math.gcd(lcm, interval)
+            count += sign * (end_step // lcm - start_step // lcm)
+    return count
+
+
+class OutputScheduler:
+
+    def __init__(self, number_of_steps, start_step=0):
+        """
+        Parameters
+        ----------
+        :param number_of_steps: The step at which the simulation ends.  The
+                                scheduler always stops here, whether or not
+                                any stream is due.
+        :param start_step:      The step the simulation is starting from.
+                                Only events after this step are scheduled.
+        """
+        self.number_of_steps = number_of_steps
+        self.start_step = start_step
+        self.current_step = start_step
+        self.__intervals = {}
+        self.__offsets = {}
+        self.__passive_intervals = {}
+        self.__events = {}
+        self.__queue = []
+
+    def add_stream(self, name, interval, passive=False, offset=0):
+        """
+            Register an output stream that is due every interval steps, or
+            offset steps before each multiple of the interval.
+
+            Passive streams are the ones that OpenMM's reporters already
+            handle inside simulation.step(), such as the trajectory.  They
+            never stop the runner, but they are still host round-trips, so
+            they are included when counting them.
+        """
+        if interval is None or interval <= 0:
+            raise ValueError("OutputScheduler:  The interval for %s must be a "
+                             "positive number of steps." % name)
+        if passive:
+            self.__passive_intervals[name] = interval
+            return
+        self.__intervals[name] = interval
+        if offset:
+            self.__offsets[name] = offset
+        first_step = (((self.current_step + offset) // interval + 1) * interval
+                      - offset)
+        if first_step <= self.number_of_steps:
+            heapq.heappush(self.__queue, (first_step, name))
+
+    def add_event(self, name, step):
+        """
+            Register a one time event, such as the end of a GaMD stage.
+            Events at or before the current step are ignored.
+        """
+        if self.current_step < step <= self.number_of_steps:
+            self.__events[name] = step
+            heapq.heappush(self.__queue, (step, name))
+
+    def get_intervals(self):
+        """
+            The intervals of the output streams, leaving out the streams
+            with an offset, which only serve another stream.
+        """
+        intervals = self.__get_aligned_intervals()
+        intervals.update(self.__passive_intervals)
+        return intervals
+
+    def __get_aligned_intervals(self):
+        return {name: interval for name, interval in self.__intervals.items()
+                if name not in self.__offsets}
+
+    def get_events(self):
+        return dict(self.__events)
+
+    def is_finished(self):
+        return self.current_step >= self.number_of_steps
+
+    def next_step(self):
+        if self.__queue:
+            return min(self.__queue[0][0], self.number_of_steps)
+        return self.number_of_steps
+
+    def advance(self):
+        """
+            Move to the next step at which something is due.
+
+            :return: The step to run the simulation up to, and the set of
+                     stream and event names that are due at that step.
+        """
+        step = self.next_step()
+        due = set()
+        while self.__queue and self.__queue[0][0] == step:
+            unused_step, name = heapq.heappop(self.__queue)
+            due.add(name)
+            if name in self.__intervals:
+                next_due_step = step + self.__intervals[name]
+                if next_due_step <= self.number_of_steps:
+                    heapq.heappush(self.__queue, (next_due_step, name))
+        self.current_step = step
+        return step, due
+
+    def count_round_trips(self):
+        """
+            The number of times control returns to the host between the
+            current step and the end of the simulation, counting the stops of
+            the runner as well as those of the passive streams.
+        """
+        return self.__count_stops(self.get_intervals().values())
+
+    def count_runner_stops(self):
+        """
+            The number of simulation.step() calls the runner will make.
+        """
+        return self.__count_stops(self.__get_aligned_intervals().values())
+
+    def __count_stops(self, intervals):
+        intervals = set(intervals)
+        count = count_multiples_in_range(intervals, self.current_step,
+                                         self.number_of_steps)
+        stops = set(self.__events.values())
+        stops.add(self.number_of_steps)
+        #
+        # The streams with an offset have few enough stops to go through
+        # them one by one.
+        #
+        for name, offset in self.__offsets.items():
+            interval = self.__intervals[name]
+            first_step = (((self.current_step + offset) // interval + 1)
+                          * interval - offset)
+            stops.update(range(first_step, self.number_of_steps + 1,
+                               interval))
+        for step in stops:
+            if step <= self.current_step:
+                continue
+            if not any(step % interval == 0 for interval in intervals):
+                count += 1
+        return count
@@ -9,15 +9,22 @@ Contributors: Lane Votapka
 
 from __future__ import absolute_import
 from enum import Enum
+import itertools
+import re
 
 __author__ = "Matthew Copeland"
 __version__ = "1.0"
 
+import numpy as np
 from openmm import CustomIntegrator
+from openmm import Vec3
 import openmm.unit as unit
 from abc import ABC
 from abc import abstractmethod
 
+# Whole numbers above this lose precision in a single precision variable.
+MAX_EXACT_SINGLE_PRECISION_INTEGER = 2 ** 24
+
 # ================
 # Boost Types
 # ================
@@ -45,6 +52,50 @@ class BoostMethod(Enum):
     DUAL_DEPENDENT_GROUP_TOTAL = "DualDependentGroupTotal"
 
 
+class GlobalVariableSnapshot:
+    """
+        The values of a fixed list of the global variables of an integrator.
+        The indices of the globals are resolved once, when the snapshot is
+        created, and update() reads all of them by index into one NumPy
+        array.  OpenMM copies all of the globals of a context to the host on
+        the first read after a step, so every read after that is cheap.
+        Names that the integrator does not have are left out.
+    """
+
+    def __init__(self, integrator, names):
+        indices_by_name = {integrator.getGlobalVariableName(index): index
+                           for index in
+                           range(integrator.getNumGlobalVariables())}
+        self.names = [name for name in names if name in indices_by_name]
+        self.values = np.zeros(len(self.names))
+        self.__integrator = integrator
+        self.__indices = [indices_by_name[name] for name in self.names]
+        self.__positions = {name: position
+                            for position, name in enumerate(self.names)}
+
+    def update(self):
+        get_global_variable = self.__integrator.getGlobalVariable
+        self.values[:] = [get_global_variable(index)
+                          for index in self.__indices]
+        return self.values
+
+    def __contains__(self, name):
+        return name in self.__positions
+
+    def __getitem__(self, name):
+        return float(self.values[self.__positions[name]])
+
+    def get(self, name, default=None):
+        position = self.__positions.get(name)
+        if position is None:
+            return default
+        return float(self.values[position])
+
+    def as_dict(self):
+        return {name: float(value)
+                for name, value in zip(self.names, self.values)}
+
+
 # ============================================================================================
 # base class
 # ============================================================================================
@@ -63,11 +114,24 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
 
     """
 
+    __stage_guard_names = {1: "stageOneIfValueIsZeroOrNegative",
+                           2: "stageTwoIfValueIsZeroOrNegative",
+                           3: "stageThreeIfValueIsZeroOrNegative",
+                           4: "stageFourIfValueIsZeroOrNegative",
+                           5: "stageFiveIfValueIsZeroOrNegative"}
+
+    #
+    # Matches the references to the energies and forces of OpenMM in the
+    # expressions of the program, such as energy, energy2, f, and f0.
+    #
+    __force_reference_pattern = re.compile(r"\b(energy|f)(\d*)\b")
+
     # def __init__(self,dt,alpha,E):
     def __init__(self, group_dict, boost_type, boost_method,
                  dt=2.0 * unit.femtoseconds,
                  ntcmdprep=200000, ntcmd=1000000,
-                 ntebprep=200000, nteb=1000000, nstlim=3000000, ntave=50000):
+                 ntebprep=200000, nteb=1000000, nstlim=3000000, ntave=50000,
+                 fused_force_groups=False, optimized_program=True):
 
         super(GamdStageIntegrator, self).__init__(dt)
 
@@ -75,6 +139,33 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         self.__boost_type = boost_type
         self._boost_method = boost_method
 
+        #
+        # When fused_force_groups is set, the integrators that boost force
+        # groups never reference the total energy or the total force.  The
+        # totals are built from energy0 and the group energies (and f0 and
+        # the group forces) instead, so that OpenMM evaluates each force group
+        # exactly once per step.  This relies on every force outside of the
+        # boosted groups being in force group 0, since any other group would
+        # drop out of the dynamics, so it is off by default.
+        # GamdIntegratorFactory.get_integrator() turns it on, since it resets
+        # the forces of the system to group 0 before it moves the dihedral
+        # forces, the nonbonded forces or both into their boosted groups.
+        #
+        self.fused_force_groups = fused_force_groups
+
+        #
+        # When optimized_program is set, the program is built without the
+        # work that does not have to happen on every step:  the constants of
+        # the Langevin integrator are worked out on the host, the stage of
+        # each step comes from a single computation over the step count,
+        # rather than a guard value per stage plus a computation of the stage
+        # inside each stage block, and computations of a global that are
+        # immediately followed by another computation of the same global are
+        # folded into one.  Turning it off builds the program the way it used
+        # to be built, which is what the benchmarks compare against.
+        #
+        self.optimized_program = optimized_program
+
         """
         Parameters
         ----------
@@ -95,6 +186,10 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         :param ntave:     The number of steps used to smooth the 
             average and sigma of potential energy (corresponds to 
             a running average window size).
+        :param fused_force_groups: Whether to evaluate each force group
+            once per step.
+        :param optimized_program:  Whether to build the program without
+            the work that does not have to happen on every step.
         """
 
         """
@@ -111,13 +206,24 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         """
         CustomIntegrator.__init__(self, dt)
 
-        if ntcmd < ntave or ntcmd % ntave != 0:
-            raise ValueError(
-                "ntcmd must be greater than and a multiple of ntave.")
+        if ntcmd == 0 and nteb == 0:
+            #
+            # A production only integrator, which runs with the boost
+            # statistics handed over from an integrator that ran the
+            # earlier stages.
+            #
+            if ntcmdprep != 0 or ntebprep != 0:
+                raise ValueError(
+                    "ntcmdprep and ntebprep must be 0, when ntcmd and nteb "
+                    "are 0.")
+        else:
+            if ntcmd < ntave or ntcmd % ntave != 0:
+                raise ValueError(
+                    "ntcmd must be greater than and a multiple of ntave.")
 
-        if nteb < ntave or nteb % ntave != 0:
-            raise ValueError(
-                "nteb must be greater than and a multiple of ntave.")
+            if nteb < ntave or nteb % ntave != 0:
+                raise ValueError(
+                    "nteb must be greater than and a multiple of ntave.")
 
         #
         #   Conventional MD Stages:
@@ -164,17 +270,25 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         # Normally, this value and the associated methods will go unused.
         #
         self.debug_counter = 0
+        self.__globals_snapshots = {}
+        self.__histories = {}
+        self.boost_history_length = 0
+        self.boost_history_names = []
 
         self.addGlobalVariable("stepCount", 0)
         self.addGlobalVariable("windowCount", 0)
         self.addGlobalVariable("stage", -1)
+        #
+        # The statisticsUpdateCount is bumped on every step on which the boost
+        # statistics may change (stages 2 and 4).  Reporters poll this single
+        # value and only fetch the full set of statistics when it has moved.
+        #
+        self.addGlobalVariable("statisticsUpdateCount", 0)
         self.addComputeGlobal("stepCount", "stepCount+1")
 
-        self.addGlobalVariable("stageOneIfValueIsZeroOrNegative", 0)
-        self.addGlobalVariable("stageTwoIfValueIsZeroOrNegative", 0)
-        self.addGlobalVariable("stageThreeIfValueIsZeroOrNegative", 0)
-        self.addGlobalVariable("stageFourIfValueIsZeroOrNegative", 0)
-        self.addGlobalVariable("stageFiveIfValueIsZeroOrNegative", 0)
+        if not self.optimized_program:
+            for stage in range(1, 6):
+                self.addGlobalVariable(self.__stage_guard_names[stage], 0)
 
         self._add_common_variables()
         self._setup_energy_values()
@@ -184,44 +298,116 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         # self._add_debug_at_step(2)
         self.addUpdateContextState()
 
-        self.addComputeGlobal(
-            "stageOneIfValueIsZeroOrNegative", 
-            "(%s-stepCount)*(%s-stepCount)" % (self.stage_1_start, 
-                                               self.stage_1_end))
-        self.addComputeGlobal(
-            "stageTwoIfValueIsZeroOrNegative", 
-            "(%s-stepCount)*(%s-stepCount)" % (self.stage_2_start, 
-                                               self.stage_2_end))
-        self.addComputeGlobal(
-            "stageThreeIfValueIsZeroOrNegative", 
-            "(%s-stepCount)*(%s-stepCount)" % (self.stage_3_start, 
-                                               self.stage_3_end))
-        self.addComputeGlobal(
-            "stageFourIfValueIsZeroOrNegative", 
-            "(%s-stepCount)*(%s-stepCount)" % (self.stage_4_start, 
-                                               self.stage_4_end))
-        self.addComputeGlobal(
-            "stageFiveIfValueIsZeroOrNegative", 
-            "(%s-stepCount)*(%s-stepCount)" % (self.stage_5_start, 
-                                               self.stage_5_end))
+        #
+        # Stages without any steps are left out of the program entirely,
+        # along with the globals that guard them.
+        #
+        if self.optimized_program:
+            self.addComputeGlobal("stage", self.__get_stage_expression())
+        else:
+            for stage in range(2, 6):
+                if self.__is_stage_guarded(stage):
+                    self.addComputeGlobal(
+                        self.__stage_guard_names[stage],
+                        "(%s-stepCount)*(%s-stepCount)" % (
+                            self.get_stage_start(stage),
+                            self.get_stage_end(stage)))
 
         # self._add_debug()
         # self._add_debug_at_step(1)
         # self._add_debug_at_step(2)
 
-        self._add_stage_one_instructions()
-        self._add_stage_two_instructions()
-        self._add_stage_three_instructions()
-        self._add_stage_four_instructions()
-        self._add_stage_five_instructions()
+        #
+        # We keep track of which computations belong to each stage, so that
+        # we can work out how many force evaluations each stage performs.
+        #
+        self.stage_computations = {}
+        self.common_computations = range(0, self.getNumComputations())
+        stage_instructions = [self._add_stage_one_instructions,
+                              self._add_stage_two_instructions,
+                              self._add_stage_three_instructions,
+                              self._add_stage_four_instructions,
+                              self._add_stage_five_instructions]
+        for stage, add_stage_instructions in enumerate(stage_instructions,
+                                                       start=1):
+            if self.is_stage_empty(stage):
+                continue
+            first_computation = self.getNumComputations()
+            add_stage_instructions()
+            self.stage_computations[stage] = range(first_computation,
+                                                   self.getNumComputations())
 
         # self._add_debug()
         # self._add_debug_at_step(1)
         # self._add_debug_at_step(2)
 
     def _setup_energy_values(self):
+        #
+        # The UnboostedPotentialEnergy values are latched at the start of
+        # every step, before any boost is added to the StartingPotentialEnergy
+        # values.  The loggers read them directly, so that logging does not
+        # need to perform any energy evaluations of its own.
+        #
         self.add_global_variables_by_name("StartingPotentialEnergy", 0.0)
-        self.__add_compute_globals_by_name("StartingPotentialEnergy", "{0}", ["energy"])
+        self.add_global_variables_by_name("UnboostedPotentialEnergy", 0.0)
+        total_name = self._append_group_name("UnboostedPotentialEnergy",
+                                             BoostType.TOTAL.value)
+        if self._boost_method == BoostMethod.GROUPS:
+            #
+            # Group boosts have no total of their own to boost, but we still
+            # track the total energy for the logs.
+            #
+            self.addGlobalVariable(total_name, 0.0)
+        if self._boost_method != BoostMethod.TOTAL:
+            self.__add_compute_global_group("UnboostedPotentialEnergy", "{0}",
+                                            ["energy"], value_by_number=True)
+        self.addComputeGlobal(total_name,
+                              self.__get_total_unboosted_energy_expression())
+        self.__add_compute_globals_by_name("StartingPotentialEnergy", "{0}",
+                                           ["UnboostedPotentialEnergy"],
+                                           value_by_number=False)
+
+    def __get_total_unboosted_energy_expression(self):
+        """
+            OpenMM only allows a single force group per computation, so the
+            fused total is built from the group energies we just latched,
+            plus energy0 for everything outside of the boosted groups.
+        """
+        if (not self.fused_force_groups
+                or self._boost_method == BoostMethod.TOTAL):
+            return "energy"
+        terms = []
+        if 0 not in self.__group_dict:
+            terms.append("energy0")
+        for group_id in self.__group_dict:
+            group_name = self.__group_dict[group_id]
+            terms.append(self._append_group_name("UnboostedPotentialEnergy",
+                                                 group_name))
+        return " + ".join(terms)
+
+    def _get_total_force_names(self):
+        """
+            The names of the forces that add up to the total force.  This is
+            just f, unless we are fusing the force group evaluations.
+        """
+        if (not self.fused_force_groups
+                or self._boost_method == BoostMethod.TOTAL):
+            return ["f"]
+        group_ids = sorted(set(self.__group_dict) | {0})
+        return [self._append_group("f", group_id) for group_id in group_ids]
+
+    def get_unboosted_energy_names(self):
+        """
+           This method retrieves the names of the globals holding the
+           unboosted potential energies latched at the start of the
+           last step, including the total energy for group boosts.
+        """
+        names = self.get_global_names("UnboostedPotentialEnergy")
+        total_name = self._append_group_name("UnboostedPotentialEnergy",
+                                             BoostType.TOTAL.value)
+        if total_name not in names:
+            names.insert(0, total_name)
+        return names
 
     def _add_debug_at_step(self, the_step):
         self.beginIfBlock("stepCount = " + str(the_step))
@@ -315,18 +501,18 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         return results
 
     def _add_stage_one_instructions(self):
-        self.beginIfBlock("stepCount <= " + str(self.stage_1_end))
+        self.__begin_stage_block(1)
         # -------------------------------
-        self.addComputeGlobal("stage", "1")
         self._add_conventional_md_instructions()
         # -------------------------------
         self.endBlock()
 
     def _add_stage_two_instructions(self):
-        self.beginIfBlock("stageTwoIfValueIsZeroOrNegative <= 0")
+        self.__begin_stage_block(2)
 
         # -------------------------------
-        self.addComputeGlobal("stage", "2")
+        self.addComputeGlobal("statisticsUpdateCount",
+                              "statisticsUpdateCount + 1")
 
         # Be aware:
         # In case of the need to reorder the code, we must finish with our 
@@ -412,10 +598,9 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
         self.endBlock()
 
     def _add_stage_three_instructions(self):
-        self.beginIfBlock("stageThreeIfValueIsZeroOrNegative <= 0")
+        self.__begin_stage_block(3)
         
         # -------------------------------
-        self.addComputeGlobal("stage", "3")
         self._do_boost_updates()
         # -------------------------------
         self.endBlock()
@@ -423,12 +608,12 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
     def _add_stage_five_instructions(self):
         # self.beginIfBlock("stepCount >= " + str(self.stage_5_start))
         # self.beginIfBlock("stepCount <= " + str(self.stage_5_end))
-        self.beginIfBlock("stageFiveIfValueIsZeroOrNegative <= 0")
+        is_guarded = self.__begin_stage_block(5)
         # -------------------------------
-        self.addComputeGlobal("stage", "5")
         self._do_boost_updates()
         # -------------------------------
-        self.endBlock()
+        if is_guarded:
+            self.endBlock()
         # self.endBlock()
 
     def _do_boost_updates(self):
@@ -452,9 +637,10 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
 
     def _add_stage_four_instructions(self):
 
-        self.beginIfBlock("stageFourIfValueIsZeroOrNegative <= 0")
+        self.__begin_stage_block(4)
         # -------------------------------
-        self.addComputeGlobal("stage", "4")
+        self.addComputeGlobal("statisticsUpdateCount",
+                              "statisticsUpdateCount + 1")
         self.addComputeGlobal("windowCount", "windowCount + 1")
 
         #
@@ -568,23 +754,348 @@ class GamdStageIntegrator(CustomIntegrator, ABC):
     def get_boost_potentials(self):
         raise NotImplementedError("must implement get_boost_potential")
 
+    def get_stage_start(self, stage):
+        return getattr(self, "stage_%d_start" % stage)
+
+    def get_stage_end(self, stage):
+        return getattr(self, "stage_%d_end" % stage)
+
+    def is_stage_empty(self, stage):
+        if stage == 1:
+            return self.ntcmdprep == 0
+        return self.get_stage_end(stage) < self.get_stage_start(stage)
+
+    def is_production_only(self):
+        return all(self.is_stage_empty(stage) for stage in range(1, 5))
+
+    def __is_stage_guarded(self, stage):
+        """
+            A production only integrator has nothing to guard stage 5
+            against.
+        """
+        if self.is_stage_empty(stage):
+            return False
+        return stage != 5 or not self.is_production_only()
+
+    def __get_stage_expression(self):
+        """
+            The stage of the current step as a single expression of the step
+            count:  the first stage with any steps, stepped up to each of
+            the following stages on its first step, and down to 0 after the
+            last step, so that nothing runs past nstlim.
+        """
+        if self.is_production_only():
+            return "5"
+        stages = [stage for stage in range(1, 6)
+                  if not self.is_stage_empty(stage)]
+        expression = str(stages[0])
+        for previous_stage, stage in zip(stages, stages[1:]):
+            expression += " + %d*step(stepCount-%d)" % (
+                stage - previous_stage, self.get_stage_start(stage))
+        expression += " - %d*step(stepCount-%d)" % (
+            stages[-1], self.get_stage_end(stages[-1]) + 1)
+        return expression
+
+    def __begin_stage_block(self, stage):
+        """
+            Open the block of the stage, unless it has nothing to be guarded
+            against.
+
+            :return: Whether a block was opened, which the caller needs to
+                     end.
+        """
+        is_guarded = self.__is_stage_guarded(stage)
+        if is_guarded:
+            if self.optimized_program:
+                self.beginIfBlock("stage = %d" % stage)
+            elif stage == 1:
+                self.beginIfBlock("stepCount <= " + str(self.stage_1_end))
+            else:
+                self.beginIfBlock(
+                    "%s <= 0" % self.__stage_guard_names[stage])
+        if not self.optimized_program:
+            self.addComputeGlobal("stage", str(stage))
+        return is_guarded
+
+    def take_over_globals(self, integrator):
+        """
+            Copy the values of the global and per-DOF variables that this
+            integrator shares with another GaMD integrator, such as the step
+            count, the boost statistics and the boost history, so that this
+            integrator can carry on where the other one left off.  Both
+            integrators need to be bound to a context.
+        """
+        names = {self.getGlobalVariableName(index)
+                 for index in range(self.getNumGlobalVariables())}
+        for index in range(integrator.getNumGlobalVariables()):
+            name = integrator.getGlobalVariableName(index)
+            if name in names:
+                self.setGlobalVariableByName(
+                    name, integrator.getGlobalVariable(index))
+        per_dof_names = {self.getPerDofVariableName(index)
+                         for index in range(self.getNumPerDofVariables())}
+        #
+        # A history only carries over when both integrators lay out their
+        # records the same way.
+        #
+        for key in self.__histories:
+            if (not integrator.has_globals_history(key)
+                    or integrator.get_globals_history_names(key)
+                    != self.get_globals_history_names(key)
+                    or integrator.get_globals_history_steps(key)
+                    != self.get_globals_history_steps(key)):
+                per_dof_names.discard(key + "History")
+        for index in range(integrator.getNumPerDofVariables()):
+            name = integrator.getPerDofVariableName(index)
+            if name in per_dof_names:
+                self.setPerDofVariableByName(
+                    name, integrator.getPerDofVariableByName(name))
+
+    def add_globals_history(self, key, names, length, number_of_particles,
+                            interval=1):
+        """
+            Record the values of the global variables on every interval-th
+            step in a ring buffer on the device, which holds the last length
+            records.  There is no per-step array in a CustomIntegrator, so
+            the buffer is the per-DOF variable <key>History, with a slot per
+            degree of freedom:  each record writes its values to the slots
+            that historySlot numbers after <key>HistoryOffset.  This has to
+            be called before the integrator is bound to a context.
+
+            Per-DOF variables are single precision on the "single"
+            precision platforms, which only hold whole numbers exactly up
+            to 2^24, so the step of a record is stored as one more than its
+            remainder modulo the steps the buffer covers (0 marks a slot
+            that was never written), and get_globals_history() rebuilds the
+            absolute step from the step count of the integrator.
+
+            :param key:                 The name of the history.
+            :param names:               The names of the globals.  The
+                                        step count is always recorded
+                                        first, and names that the
+                                        integrator does not have are left
+                                        out.
+            :param length:              The number of records to hold,
+                                        which should cover the steps
+                                        between get_globals_history()
+                                        calls.
+            :param number_of_particles: The number of particles of the
+                                        system, which bounds the number of
+                                        slots.
+            :param interval:            The number of steps between
+                                        records.
+        """
+        global_names = {self.getGlobalVariableName(index)
+                        for index in range(self.getNumGlobalVariables())}
+        names = ["stepCount"] + [name for name in names
+                                 if name in global_names
+                                 and name != "stepCount"]
+        if length * len(names) > 3 * number_of_particles:
+            raise ValueError(
+                "A %s history of %d records needs %d slots, but a system of "
+                "%d particles only has %d." % (
+                    key, length, length * len(names), number_of_particles,
+                    3 * number_of_particles))
+        span = length * interval
+        if span >= MAX_EXACT_SINGLE_PRECISION_INTEGER:
+            raise ValueError(
+                "A %s history of %d records every %d steps covers %d steps, "
+                "but single precision only holds steps up to %d exactly." % (
+                    key, length, interval, span,
+                    MAX_EXACT_SINGLE_PRECISION_INTEGER))
+        if not self.__histories:
+            self.addPerDofVariable("historySlot", 0)
+            self.setPerDofVariableByName(
+                "historySlot",
+                [Vec3(3 * particle, 3 * particle + 1, 3 * particle + 2)
+                 for particle in range(number_of_particles)])
+        self.__histories[key] = (names, length, interval)
+        history_name = key + "History"
+        offset_name = key + "HistoryOffset"
+        self.addGlobalVariable(offset_name, 0)
+        self.addPerDofVariable(history_name, 0)
+        if interval > 1:
+            self.beginIfBlock("stepCount = %d*floor(stepCount/%d)"
+                              % (interval, interval))
+        self.addComputeGlobal(
+            offset_name, "%d*(floor(stepCount/%d) - %d*floor(stepCount/%d))"
+            % (len(names), interval, length, length * interval))
+        values = ["stepCount - %d*floor(stepCount/%d) + 1" % (span, span)] \
+            + names[1:]
+        expression = history_name
+        for position in reversed(range(len(names))):
+            expression = "select(delta(historySlot - %s - %d), %s, %s)" % (
+                offset_name, position, values[position], expression)
+        self.addComputePerDof(history_name, expression)
+        if interval > 1:
+            self.endBlock()
+
+    def has_globals_history(self, key):
+        return key in self.__histories
+
+    def get_globals_history_names(self, key):
+        return self.__histories[key][0]
+
+    def get_globals_history_steps(self, key):
+        """
+            The number of steps that the history covers, which is as often
+            as get_globals_history() has to be called.
+        """
+        unused_names, length, interval = self.__histories[key]
+        return length * interval
+
+    def get_globals_history(self, key, after_step=0):
+        """
+            The records of the history after after_step that are still in
+            the ring buffer, in a single transfer from the device.
+
+            :return: An array with a row per record, in the order of the
+                     steps, and the columns of get_globals_history_names():
+                     the step, followed by the values of the globals.
+        """
+        names, length, interval = self.__histories[key]
+        values = np.array(self.getPerDofVariableByName(key + "History"))
+        rows = values.reshape(-1)[:length * len(names)].reshape(
+            length, len(names))
+        rows = rows[rows[:, 0] > 0]
+        #
+        # The records cover the span of steps up to the last recorded step,
+        # so each remainder belongs to a single step in it.
+        #
+        span = length * interval
+        last_step = interval * (int(round(self.get_step_count())) // interval)
+        remainders = np.rint(rows[:, 0]).astype(np.int64) - 1
+        rows[:, 0] = last_step - np.mod(last_step - remainders, span)
+        rows = rows[rows[:, 0] > after_step]
+        return rows[np.argsort(rows[:, 0])]
+
+    def add_boost_history(self, length, number_of_particles):
+        """
+            Record the boost potentials of every step in the "boost" history
+            of add_globals_history().
+        """
+        self.add_globals_history("boost",
+                                 self.get_global_names("BoostPotential"),
+                                 length, number_of_particles)
+        self.boost_history_length = length
+        self.boost_history_names = self.get_globals_history_names("boost")
+
+    def get_boost_history(self, after_step=0):
+        """
+            The steps and boost potentials in kJ/mol of the steps after
+            after_step, as from get_globals_history().
+        """
+        return self.get_globals_history("boost", after_step)
+
+    def get_globals_snapshot(self, key, get_names):
+        """
+            The GlobalVariableSnapshot kept under the key.  It is created
+            from the names that get_names() returns on first use, so the
+            names are only built and resolved once per integrator.
+        """
+        snapshot = self.__globals_snapshots.get(key)
+        if snapshot is None:
+            snapshot = GlobalVariableSnapshot(self, get_names())
+            self.__globals_snapshots[key] = snapshot
+        return snapshot
+
     def get_stage(self):
         return self.getGlobalVariableByName("stage")
 
     def get_step_count(self):
         return self.getGlobalVariableByName("stepCount")
 
+    def get_statistics_update_count(self):
+        return self.getGlobalVariableByName("statisticsUpdateCount")
+
+    def get_force_group_evaluations_per_step(self):
+        """
+            Work out how many times each force group gets evaluated on a
+            step in each stage, by following the integration program the way
+            OpenMM does.  Each distinct set of force groups referenced between
+            two position updates costs one evaluation of those groups, which
+            provides both the forces and the energy.  References to the total
+            energy or force evaluate every group.
+
+            :return: A dictionary of stage to a dictionary of force group to
+                     the number of evaluations of that group per step.
+        """
+        group_ids = sorted(set(self.__group_dict) | {0})
+        results = {}
+        for stage, computations in self.stage_computations.items():
+            counts = {group_id: 0 for group_id in group_ids}
+            referenced_groups = set()
+            for index in itertools.chain(self.common_computations,
+                                         computations):
+                step_type, variable, expression = \
+                    self.getComputationStep(index)
+                for unused_name, group in \
+                        self.__force_reference_pattern.findall(expression):
+                    referenced_groups.add(group)
+                if ((step_type == CustomIntegrator.ComputePerDof
+                        and variable == "x")
+                        or step_type == CustomIntegrator.ConstrainPositions):
+                    self.__count_group_evaluations(referenced_groups, counts)
+                    referenced_groups = set()
+            self.__count_group_evaluations(referenced_groups, counts)
+            results[stage] = counts
+        return results
+
+    def get_force_evaluations_per_step(self):
+        """
+            The number of force evaluations each stage performs per step,
+            as the largest number of times any force group gets evaluated.
+            A value of 1 means that a step costs a single evaluation of the
+            full system.
+        """
+        return {stage: max(counts.values()) for stage, counts in
+                self.get_force_group_evaluations_per_step().items()}
+
+    def get_computations_per_step(self):
+        """
+            The number of computations the program runs on a step in each
+            stage, counting those in the nested blocks of the stage, such
+            as the end of an ntave window, as if they ran on every step.
+            The ends of the blocks are left out, since they do no work.
+
+            :return: A dictionary of stage to the number of computations.
+        """
+        results = {}
+        for stage, computations in self.stage_computations.items():
+            results[stage] = sum(
+                1 for index in itertools.chain(self.common_computations,
+                                               computations)
+                if self.getComputationStep(index)[0]
+                != CustomIntegrator.BlockEnd)
+        return results
+
+    @staticmethod
+    def __count_group_evaluations(referenced_groups, counts):
+        for group in referenced_groups:
+            if group == "":
+                for group_id in counts:
+                    counts[group_id] += 1
+            elif int(group) in counts:
+                counts[int(group)] += 1
+
     def get_window_count(self):
         return self.getGlobalVariableByName("windowCount")
 
     def get_total_simulation_steps(self):
         return self.nstlim
 
-    def get_coordinates(self):
-        return self.getPerDofVariableByName("coordinates")
+    def get_coordinates(self, context):
+        """
+            The positions at the end of the last step, from the context the
+            integrator is bound to.  The integrator does not keep a copy of
+            its own, since that would cost another per-DOF variable, and a
+            copy of every coordinate on every step.
+        """
+        return context.getState(getPositions=True).getPositions(
+            asNumpy=True).value_in_unit(unit.nanometers)
 
-    def create_positions_file(self, filename):
-        positions = self.get_coordinates()
+    def create_positions_file(self, filename, context):
+        positions = self.get_coordinates(context)
         with open(filename, 'w') as file:
             file.write("particle, x, y, z\n")
             for i in range(len(positions)):
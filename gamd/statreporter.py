@@ -1,4 +1,3 @@
-
 """
 statreporter.py:  Provides capabilities to report GaMD statistics
 
@@ -7,13 +6,134 @@ Authors: Matthew Copeland
 
 """
 
+from gamd import binlog
+from gamd.stage_integrator import GlobalVariableSnapshot
+
 
 class StatisticsReporter:
+    """
+    OpenMM reporter that writes the GaMD boost statistics to a csv file
+    whenever they have changed.
+
+    The reporter only wakes up every recording_rate steps.  When it does, it
+    reads the integrator's statisticsUpdateCount, which the integrator bumps
+    on the device on every step where the statistics can change.  The full
+    set of tracked globals is only fetched when that counter has moved, so
+    during stages 1, 3, and 5 each report costs a single global lookup.
+    """
 
-    def __init__(self, recording_rate, filename):
+    default_tracked_names = ["Vmax", "Vmin", "Vavg", "sigmaV",
+                             "k0", "k", "sigma0", "threshold_energy"]
+
+    def __init__(self, recording_rate, filename, integrator, mode="w",
+                 tracked_names=None, log_format="text"):
+        """
+        Parameters
+        ----------
+        :param recording_rate: The number of steps between checks for changed
+                               statistics.
+        :param filename:       The gamd-running.csv path and file name.
+        :param integrator:     The GaMD integrator to pull the values from.
+        :param mode:           The write mode to output the file.  The header
+                               and the initial values are only written for
+                               "w".
+        :param tracked_names:  The base names of the globals to track.  Each
+                               name is expanded to all of the boost groups of
+                               the integrator.
+        :param log_format:     "text" for the csv file, or "binary" for a
+                               binary log next to where it would have gone.
+        """
         self.recording_rate = recording_rate
         self.filename = filename
-        self.lastValues = []
+        self.statisticsFile = None
+        self.binaryLog = None
+        self.integrator = integrator
+        if tracked_names is None:
+            tracked_names = self.default_tracked_names
+
+        self.headers = []
+        for name in tracked_names:
+            for actual_name in integrator.get_names(name):
+                self.headers.append(actual_name)
+        self.__snapshot = GlobalVariableSnapshot(integrator, self.headers)
+
+        self.lastUpdateCount = integrator.get_statistics_update_count()
+        self.lastValues = self.__get_values()
+
+        if log_format == "binary":
+            self.binaryLog = binlog.BinaryLogWriter(
+                binlog.get_binary_log_directory(filename),
+                [binlog.STEP_COLUMN] + self.headers, mode,
+                {"type": "csv", "header": [self.__get_header()]})
+        else:
+            self.statisticsFile = open(filename, mode)
+        if mode == "w":
+            self.__write_header()
+            self.__write_row(1, self.lastValues)
+
+    def __del__(self):
+        if self.statisticsFile is not None or self.binaryLog is not None:
+            self.close()
+
+    def close(self):
+        if self.binaryLog is not None:
+            self.binaryLog.close()
+            self.binaryLog = None
+        else:
+            self.statisticsFile.close()
+            self.statisticsFile = None
+
+    def flush(self):
+        if self.binaryLog is not None:
+            self.binaryLog.flush()
+        else:
+            self.statisticsFile.flush()
+
+    def __get_header(self):
+        return ", ".join(["step"] + self.headers)
+
+    def __write_header(self):
+        if self.binaryLog is None:
+            self.statisticsFile.write(self.__get_header() + "\n")
+
+    def __write_row(self, step, values):
+        if self.binaryLog is not None:
+            self.binaryLog.append([step] + values)
+            return
+        self.statisticsFile.write(
+            ", ".join([str(step)] + [str(value) for value in values]) + "\n")
+
+    def __get_values(self):
+        return self.__snapshot.update().tolist()
+
+    def set_integrator(self, integrator):
+        """
+            Follow the simulation over to a new integrator, which has taken
+            over the globals of the old one.
+        """
+        self.integrator = integrator
+        self.__snapshot = GlobalVariableSnapshot(integrator, self.headers)
+
+    def describeNextReport(self, simulation):
+        """
+            The returned tuple is the number of steps until we want to be
+            executed again, and then whether we want positions, velocities,
+            forces or energies reported to us.  We read everything we need
+            straight from the integrator, so we never ask for any of them.
+        """
+        steps = self.recording_rate - simulation.currentStep % self.recording_rate
+        return steps, False, False, False, False
+
+    def report(self, simulation, state):
+        self.record(simulation.currentStep)
+
+    def record(self, step):
+        update_count = self.integrator.get_statistics_update_count()
+        if update_count == self.lastUpdateCount:
+            return
+        self.lastUpdateCount = update_count
 
-    def report(self, step, integrator):
-        pass
+        values = self.__get_values()
+        if values != self.lastValues:
+            self.lastValues = values
+            self.__write_row(step, values)
@@ -0,0 +1,422 @@
+"""
+system_cache.py:  A content addressed cache of the OpenMM Systems of runs.
+
+Reading the input files of a large system and calling createSystem() can
+take minutes, and gamdRunner does it on every invocation, restarts
+included.  The SystemCache keeps the System that createSystem() returned
+(as OpenMM XML), along with the topology (as JSON) and the positions and
+the box vectors (as NumPy arrays) read from the input files, under a key
+made from the SHA-256 hashes of the contents of the input files and the
+options that go into createSystem().  None of these formats can run code
+when they are loaded, but a cache shared between users has to be trusted
+not to hand out a System other than the one the key stands for.
+Any change to the input files or the options gives a new key, so an entry is
+never stale, only unused.  Entries are kept in their own directories, which
+are stored in one step (see atomic_write), and the least recently used
+entries are evicted once the cache grows past its size limit.
+
+    python -m gamd.system_cache list DIRECTORY
+    python -m gamd.system_cache clear DIRECTORY [KEY ...]
+    python -m gamd.system_cache invalidate CONFIG [CONFIG ...]
+
+lists the entries of a cache, removes all (or some) of them, or removes the
+entries of the systems described by the given configuration files.
+
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import openmm
+import openmm.unit as unit
+
+from gamd import parser
+from gamd.atomic_write import atomic_directory
+
+# Bump this whenever the layout of an entry changes.
+CACHE_FORMAT_VERSION = 2
+SYSTEM_FILENAME = "system.xml"
+TOPOLOGY_FILENAME = "topology.json"
+COORDINATES_FILENAME = "coordinates.npz"
+DEFAULT_DIRECTORY_NAME = "system-cache"
+
+INCLUDE_PATTERN = re.compile(r"^\s*#include\s+(.+)$")
+
+
+def get_system_cache_directory(config):
+    """
+        The directory of the system cache of the configuration:  the
+        configured one, or system-cache next to the output directory, which
+        overwrite-output would otherwise wipe out on every run.
+    """
+    directory = config.system_cache.directory
+    if not directory:
+        directory = os.path.join(
+            os.path.dirname(os.path.abspath(config.outputs.directory)),
+            DEFAULT_DIRECTORY_NAME)
+    return directory
+
+
+def hash_file(filename):
+    sha256 = hashlib.sha256()
+    with open(filename, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def get_gromacs_include_dir(include_dir):
+    """
+        The include directory that GromacsTopFile searches:  the configured
+        one, or else the one of the GROMACS installation that OpenMM finds.
+    """
+    if include_dir:
+        return include_dir
+    from openmm.app import gromacstopfile
+    return gromacstopfile._defaultGromacsIncludeDir()
+
+
+def get_gromacs_include_files(topology_filename, include_dir):
+    """
+        The files that a GROMACS topology file includes, directly or through
+        other included files, found the way GromacsTopFile finds them:  in
+        the directory of the topology file, in the include directory and in
+        the directory of the including file, in that order.
+    """
+    included_files = []
+    pending_files = [topology_filename]
+    seen_files = set()
+    while pending_files:
+        filename = os.path.abspath(pending_files.pop())
+        if filename in seen_files:
+            continue
+        seen_files.add(filename)
+        if filename != os.path.abspath(topology_filename):
+            included_files.append(filename)
+        with open(filename) as topology_file:
+            for line in topology_file:
+                match = INCLUDE_PATTERN.match(line.split(";")[0])
+                if match is None:
+                    continue
+                name = match.group(1).strip(' \t"<>')
+                for directory in [os.path.dirname(topology_filename),
+                                  include_dir, os.path.dirname(filename)]:
+                    candidate = os.path.join(directory, name)
+                    if os.path.isfile(candidate):
+                        pending_files.append(candidate)
+                        break
+    return sorted(included_files)
+
+
+def get_system_description(config):
+    """
+        Everything that goes into the System, the topology and the
+        positions of the configuration, with the input files replaced by
+        the hashes of their contents.
+    """
+    system = config.system
+    input_files = config.input_files
+    description = {
+        "format": CACHE_FORMAT_VERSION,
+        "openmm": openmm.__version__,
+        "nonbonded_method": str(system.nonbonded_method).lower(),
+        "nonbonded_cutoff": system.nonbonded_cutoff.value_in_unit(
+            unit.nanometers),
+        "constraints": str(system.constraints).lower(),
+    }
+    files = {}
+    if input_files.amber is not None:
+        description["input"] = "amber"
+        description["coordinates_filetype"] = \
+            input_files.amber.coordinates_filetype
+        files["topology"] = input_files.amber.topology
+        files["coordinates"] = input_files.amber.coordinates
+    elif input_files.charmm is not None:
+        description["input"] = "charmm"
+        description["coordinates_filetype"] = \
+            input_files.charmm.coordinates_filetype
+        description["switch_distance"] = \
+            system.switch_distance.value_in_unit(unit.nanometers)
+        description["ewald_error_tolerance"] = system.ewald_error_tolerance
+        if input_files.charmm.is_config_box_vector_defined:
+            description["box_vectors"] = [
+                str(box_vector) for box_vector in
+                input_files.charmm.box_vectors]
+        files["topology"] = input_files.charmm.topology
+        files["coordinates"] = input_files.charmm.coordinates
+        for index, filename in enumerate(input_files.charmm.parameters):
+            files["parameters-%d" % index] = filename
+    elif input_files.gromacs is not None:
+        description["input"] = "gromacs"
+        files["topology"] = input_files.gromacs.topology
+        files["coordinates"] = input_files.gromacs.coordinates
+        include_dir = get_gromacs_include_dir(input_files.gromacs.include_dir)
+        for index, filename in enumerate(get_gromacs_include_files(
+                input_files.gromacs.topology, include_dir)):
+            files["include-%d" % index] = filename
+    elif input_files.forcefield is not None:
+        description["input"] = "forcefield"
+        description["native_forcefields"] = \
+            input_files.forcefield.forcefield_list_native
+        files["coordinates"] = input_files.forcefield.coordinates
+        for index, filename in enumerate(
+                input_files.forcefield.forcefield_list_external):
+            files["forcefield-%d" % index] = filename
+    else:
+        raise ValueError("No valid input files found to cache the system "
+                         "of.")
+    description["files"] = {role: hash_file(filename)
+                            for role, filename in files.items()}
+    return description
+
+
+def get_system_cache_key(config):
+    description = json.dumps(get_system_description(config), sort_keys=True)
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+def serialize_topology(topology):
+    """
+        The chains, residues, atoms, bonds and periodic box vectors of a
+        Topology, as a dictionary that can be written out as JSON.
+    """
+    chains = []
+    for chain in topology.chains():
+        residues = []
+        for residue in chain.residues():
+            atoms = [[atom.name, atom.element.symbol
+                      if atom.element is not None else None, atom.id]
+                     for atom in residue.atoms()]
+            residues.append([residue.name, residue.id,
+                             residue.insertionCode, atoms])
+        chains.append([chain.id, residues])
+    bonds = [[bond.atom1.index, bond.atom2.index,
+              str(bond.type) if bond.type is not None else None, bond.order]
+             for bond in topology.bonds()]
+    box_vectors = topology.getPeriodicBoxVectors()
+    if box_vectors is not None:
+        box_vectors = [list(box_vector) for box_vector in
+                       box_vectors.value_in_unit(unit.nanometers)]
+    return {"chains": chains, "bonds": bonds, "box_vectors": box_vectors}
+
+
+def deserialize_topology(description):
+    """
+        The Topology of a dictionary from serialize_topology().
+    """
+    import openmm.app as openmm_app
+    from openmm.app import element as openmm_element
+
+    bond_types = {str(bond_type): bond_type for bond_type in [
+        openmm_app.Single, openmm_app.Double, openmm_app.Triple,
+        openmm_app.Aromatic, openmm_app.Amide]}
+    topology = openmm_app.Topology()
+    atoms = []
+    for chain_id, residues in description["chains"]:
+        chain = topology.addChain(chain_id)
+        for name, residue_id, insertion_code, residue_atoms in residues:
+            residue = topology.addResidue(name, chain, residue_id,
+                                          insertion_code)
+            for atom_name, symbol, atom_id in residue_atoms:
+                element = None
+                if symbol is not None:
+                    element = openmm_element.Element.getBySymbol(symbol)
+                atoms.append(topology.addAtom(atom_name, element, residue,
+                                              atom_id))
+    for index1, index2, bond_type, order in description["bonds"]:
+        topology.addBond(atoms[index1], atoms[index2],
+                         bond_types.get(bond_type), order)
+    if description["box_vectors"] is not None:
+        topology.setPeriodicBoxVectors(
+            [openmm.Vec3(*box_vector) for box_vector in
+             description["box_vectors"]] * unit.nanometers)
+    return topology
+
+
+def get_directory_size(directory):
+    size = 0
+    for path, unused_directories, filenames in os.walk(directory):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(path, filename))
+    return size
+
+
+class SystemCache:
+    def __init__(self, directory, max_size_megabytes=2048):
+        """
+        Parameters
+        ----------
+        :param directory:          The directory of the cache.  It can be
+                                   shared between runs.
+        :param max_size_megabytes: The size the cache is trimmed down to,
+                                   by evicting the least recently used
+                                   entries, whenever an entry is stored.
+        """
+        self.directory = directory
+        self.max_size_bytes = max_size_megabytes * 1024 * 1024
+
+    def get_entry_directory(self, key):
+        return os.path.join(self.directory, key)
+
+    def get_keys(self):
+        """
+            The keys of the entries, including those written in an older
+            layout, which are never loaded, but still take up space until
+            they are evicted or cleared.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return [name for name in os.listdir(self.directory)
+                if not name.startswith(".")
+                and os.path.isdir(os.path.join(self.directory, name))]
+
+    def load(self, key):
+        """
+            :return: The topology, System, positions and box vectors stored
+                     under the key, or None when there is no such entry.
+        """
+        entry_directory = self.get_entry_directory(key)
+        topology_filename = os.path.join(entry_directory, TOPOLOGY_FILENAME)
+        if not os.path.exists(topology_filename):
+            return None
+        with open(os.path.join(entry_directory, SYSTEM_FILENAME)) \
+                as system_file:
+            system = openmm.XmlSerializer.deserialize(system_file.read())
+        with open(topology_filename) as topology_file:
+            topology = deserialize_topology(json.load(topology_file))
+        with np.load(os.path.join(entry_directory, COORDINATES_FILENAME),
+                     allow_pickle=False) as coordinates:
+            positions = unit.Quantity(coordinates["positions"],
+                                      unit.nanometers)
+            box_vectors = None
+            if "box_vectors" in coordinates:
+                box_vectors = [openmm.Vec3(*box_vector) for box_vector in
+                               coordinates["box_vectors"]] * unit.nanometers
+        # The modification time of the entry is when it was last used.
+        os.utime(entry_directory)
+        return topology, system, positions, box_vectors
+
+    def store(self, key, topology, system, positions, box_vectors):
+        """
+            Store the entry, unless another run got there first, and evict
+            the least recently used entries past the size limit.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entry_directory = self.get_entry_directory(key)
+        if os.path.exists(entry_directory):
+            return
+        try:
+            with atomic_directory(entry_directory) as temporary_directory:
+                with open(os.path.join(temporary_directory, SYSTEM_FILENAME),
+                          "w") as system_file:
+                    system_file.write(openmm.XmlSerializer.serialize(system))
+                with open(os.path.join(temporary_directory,
+                                       TOPOLOGY_FILENAME),
+                          "w") as topology_file:
+                    json.dump(serialize_topology(topology), topology_file)
+                coordinates = {"positions": np.array(
+                    positions.value_in_unit(unit.nanometers))}
+                if box_vectors is not None:
+                    coordinates["box_vectors"] = np.array(
+                        box_vectors.value_in_unit(unit.nanometers))
+                np.savez(os.path.join(temporary_directory,
+                                      COORDINATES_FILENAME), **coordinates)
+        except OSError:
+            # Another run stored the same entry first.
+            if not os.path.exists(entry_directory):
+                raise
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """
+            Remove the least recently used entries, apart from the one to
+            keep, until the cache fits within its size limit.
+
+            :return: The keys of the removed entries.
+        """
+        entries = []
+        for key in self.get_keys():
+            entry_directory = self.get_entry_directory(key)
+            entries.append([os.path.getmtime(entry_directory),
+                            get_directory_size(entry_directory), key])
+        total_size = sum(entry[1] for entry in entries)
+        evicted_keys = []
+        for unused_time, size, key in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total_size -= size
+            evicted_keys.append(key)
+        return evicted_keys
+
+    def remove(self, key):
+        shutil.rmtree(self.get_entry_directory(key), ignore_errors=True)
+
+    def clear(self):
+        for key in self.get_keys():
+            self.remove(key)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Manage the cache of the OpenMM Systems of GaMD runs.")
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser(
+        "list", help="List the entries of a cache.")
+    list_parser.add_argument("directory", metavar="DIRECTORY", type=str)
+    clear_parser = subparsers.add_parser(
+        "clear", help="Remove all of the entries of a cache, or the ones "
+                      "with the given keys.")
+    clear_parser.add_argument("directory", metavar="DIRECTORY", type=str)
+    clear_parser.add_argument("keys", metavar="KEY", type=str, nargs="*")
+    invalidate_parser = subparsers.add_parser(
+        "invalidate", help="Remove the entries of the systems of the given "
+                           "configuration files from their caches.")
+    invalidate_parser.add_argument("config_files", metavar="CONFIG",
+                                   type=str, nargs="+")
+    invalidate_parser.add_argument(
+        "-d", "--directory", dest="directory", default=None, type=str,
+        help="The cache to remove the entries from, instead of the one in "
+             "each configuration.")
+    args = argparser.parse_args()
+
+    if args.command == "list":
+        cache = SystemCache(args.directory)
+        for key in sorted(cache.get_keys(), key=lambda key: os.path.getmtime(
+                cache.get_entry_directory(key))):
+            entry_directory = cache.get_entry_directory(key)
+            print("%s  %8.1f MB  last used %s" % (
+                key, get_directory_size(entry_directory) / 1024 / 1024,
+                time.ctime(os.path.getmtime(entry_directory))))
+    elif args.command == "clear":
+        cache = SystemCache(args.directory)
+        if args.keys:
+            for key in args.keys:
+                cache.remove(key)
+        else:
+            cache.clear()
+    else:
+        parser_factory = parser.ParserFactory()
+        for config_filename in args.config_files:
+            config = parser_factory.parse_file(config_filename, "xml")
+            directory = args.directory
+            if directory is None:
+                if config.system_cache is None:
+                    print("No system cache in", config_filename)
+                    continue
+                directory = get_system_cache_directory(config)
+            key = get_system_cache_key(config)
+            SystemCache(directory).remove(key)
+            print("Removed:", os.path.join(directory, key))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+telemetry.py:  Live throughput metrics of a GaMD run.
+
+The RunMetrics object is fed by the run loop with the wall clock time of
+each simulation.step() call, and of the logging and checkpointing in
+between.  It keeps the overall and recent throughput, the time spent per
+GaMD stage and the time spent per activity, and can periodically rewrite a
+metrics file in the output directory, either as JSON or in the Prometheus
+text format, so that running jobs can be watched from the outside.
+
+"""
+
+import collections
+import contextlib
+import json
+import os
+import time
+
+import openmm.unit as unit
+
+from gamd.atomic_write import atomic_write
+
+METRICS_FORMATS = ["json", "prometheus"]
+
+#
+# The activities the run loop spends its time on.  The time spent in the
+# reporters is measured inside simulation.step(), and is taken out of the
+# time of the step itself.
+#
+TIME_CATEGORIES = ["simulation-step", "reporters", "gamd-log", "checkpoint",
+                   "debug", "restart-file"]
+
+
+def get_stage_ranges(integrator):
+    """
+        The first and last step of each GaMD stage of the integrator that
+        has any steps.
+    """
+    stage_ranges = []
+    for stage in range(1, 6):
+        if not integrator.is_stage_empty(stage):
+            stage_ranges.append([stage, integrator.get_stage_start(stage),
+                                 integrator.get_stage_end(stage)])
+    return stage_ranges
+
+
+class TimedReporter:
+    """
+        Wraps an OpenMM reporter, to add the time it spends writing its
+        reports to the metrics of the run, and to the latency histogram of
+        the reporter when the run is profiled.
+    """
+    def __init__(self, reporter, run_metrics, profiler=None):
+        self.reporter = reporter
+        self.run_metrics = run_metrics
+        self.profiler = profiler
+        self.phase = "report:" + type(reporter).__name__
+
+    def describeNextReport(self, simulation):
+        return self.reporter.describeNextReport(simulation)
+
+    def report(self, simulation, state):
+        start_time = time.perf_counter()
+        self.reporter.report(simulation, state)
+        seconds = time.perf_counter() - start_time
+        self.run_metrics.add_time("reporters", seconds)
+        if self.profiler is not None:
+            self.profiler.record(self.phase, seconds)
+
+    def __getattr__(self, name):
+        return getattr(self.reporter, name)
+
+
+def get_reporter(reporter):
+    """
+        The reporter itself, whether or not it is wrapped in a
+        TimedReporter.
+    """
+    if isinstance(reporter, TimedReporter):
+        return reporter.reporter
+    return reporter
+
+
+class RunMetrics:
+
+    def __init__(self, dt, start_step=0, stage_ranges=None, window=10,
+                 filename=None, file_format="json", interval_seconds=60.0):
+        """
+        Parameters
+        ----------
+        :param dt:               The time step of the simulation.
+        :param start_step:       The step the run starts from.
+        :param stage_ranges:     The stage number, first step and last step
+                                 of each GaMD stage, as from
+                                 get_stage_ranges().
+        :param window:           The number of recent chunks that the recent
+                                 throughput is averaged over.
+        :param filename:         The metrics file to rewrite, or None.
+        :param file_format:      Either "json" or "prometheus".
+        :param interval_seconds: The wall clock seconds between rewrites of
+                                 the metrics file.
+        """
+        if file_format not in METRICS_FORMATS:
+            raise ValueError("RunMetrics:  Unknown metrics format: %s. "
+                             "Allowed formats are: %s." % (
+                                 file_format, ", ".join(METRICS_FORMATS)))
+        self.dt = dt
+        self.start_step = start_step
+        self.current_step = start_step
+        self.stage_ranges = stage_ranges if stage_ranges is not None else []
+        self.filename = filename
+        self.file_format = file_format
+        self.interval_seconds = interval_seconds
+        self.__start_time = time.perf_counter()
+        self.__last_chunk_end_time = self.__start_time
+        self.__last_write_time = self.__start_time
+        self.__seconds = {category: 0.0 for category in TIME_CATEGORIES}
+        self.__reporter_seconds_at_last_chunk = 0.0
+        self.__stage_steps = collections.OrderedDict()
+        self.__stage_seconds = collections.OrderedDict()
+        self.__recent_chunks = collections.deque(maxlen=window)
+
+    def add_time(self, category, seconds):
+        self.__seconds[category] += seconds
+
+    @contextlib.contextmanager
+    def time(self, category):
+        """
+            Time the enclosed block, and add the time to the category.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(category, time.perf_counter() - start_time)
+
+    def add_chunk(self, end_step, seconds):
+        """
+            Record a simulation.step() call that ran up to end_step and took
+            the given number of seconds, including the time spent in the
+            reporters.
+        """
+        number_of_steps = end_step - self.current_step
+        reporter_seconds = (self.__seconds["reporters"]
+                            - self.__reporter_seconds_at_last_chunk)
+        self.__reporter_seconds_at_last_chunk = self.__seconds["reporters"]
+        step_seconds = max(seconds - reporter_seconds, 0.0)
+        self.add_time("simulation-step", step_seconds)
+        if number_of_steps > 0:
+            for stage, first_step, last_step in self.stage_ranges:
+                stage_steps = (min(end_step, last_step)
+                               - max(self.current_step + 1, first_step) + 1)
+                if stage_steps <= 0:
+                    continue
+                self.__stage_steps[stage] = \
+                    self.__stage_steps.get(stage, 0) + stage_steps
+                self.__stage_seconds[stage] = \
+                    self.__stage_seconds.get(stage, 0.0) \
+                    + step_seconds * stage_steps / number_of_steps
+
+        now = time.perf_counter()
+        self.__recent_chunks.append(
+            [number_of_steps, now - self.__last_chunk_end_time])
+        self.__last_chunk_end_time = now
+        self.current_step = end_step
+
+    def get_rates(self, number_of_steps, seconds):
+        """
+            :return: The steps per second and ns per day of running the
+                     number of steps in the number of seconds.
+        """
+        if seconds <= 0.0:
+            return 0.0, 0.0
+        steps_per_second = number_of_steps / seconds
+        ns_per_day = (steps_per_second * 3600 * 24
+                      * self.dt.value_in_unit(unit.nanoseconds))
+        return steps_per_second, ns_per_day
+
+    def get_elapsed_seconds(self):
+        return time.perf_counter() - self.__start_time
+
+    def get_metrics(self):
+        """
+            :return: A dictionary of the metrics of the run so far.
+        """
+        elapsed_seconds = self.get_elapsed_seconds()
+        number_of_steps = self.current_step - self.start_step
+        steps_per_second, ns_per_day = self.get_rates(number_of_steps,
+                                                      elapsed_seconds)
+        recent_steps = sum(chunk[0] for chunk in self.__recent_chunks)
+        recent_seconds = sum(chunk[1] for chunk in self.__recent_chunks)
+        recent_steps_per_second, recent_ns_per_day = self.get_rates(
+            recent_steps, recent_seconds)
+        seconds = dict(self.__seconds)
+        seconds["other"] = max(elapsed_seconds - sum(seconds.values()), 0.0)
+        stages = {}
+        for stage, stage_steps in self.__stage_steps.items():
+            stage_seconds = self.__stage_seconds[stage]
+            stage_steps_per_second, stage_ns_per_day = self.get_rates(
+                stage_steps, stage_seconds)
+            stages[str(stage)] = {
+                "steps": stage_steps, "seconds": stage_seconds,
+                "steps_per_second": stage_steps_per_second,
+                "ns_per_day": stage_ns_per_day}
+        return {"step": self.current_step, "steps": number_of_steps,
+                "elapsed_seconds": elapsed_seconds,
+                "steps_per_second": steps_per_second,
+                "ns_per_day": ns_per_day,
+                "recent_steps_per_second": recent_steps_per_second,
+                "recent_ns_per_day": recent_ns_per_day,
+                "seconds": seconds, "stages": stages}
+
+    def write_if_due(self):
+        if self.filename is None or not self.interval_seconds:
+            return
+        now = time.perf_counter()
+        if now - self.__last_write_time >= self.interval_seconds:
+            self.write()
+
+    def write(self):
+        """
+            Rewrite the metrics file, in one step (see atomic_write).
+        """
+        if self.filename is None:
+            return
+        metrics = self.get_metrics()
+        if self.file_format == "json":
+            contents = json.dumps(metrics, indent=2) + "\n"
+        else:
+            contents = self.format_prometheus(metrics)
+        with atomic_write(self.filename) as metrics_file:
+            metrics_file.write(contents)
+        self.__last_write_time = time.perf_counter()
+
+    def format_prometheus(self, metrics):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        run_label = 'directory="%s"' % directory.replace("\\", "\\\\") \
+            .replace('"', '\\"')
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append("# HELP gamd_%s %s" % (name, help_text))
+            lines.append("# TYPE gamd_%s %s" % (name, metric_type))
+            for labels, value in samples:
+                lines.append("gamd_%s{%s} %r" % (
+                    name, ",".join([run_label] + labels), float(value)))
+
+        add_metric("step", "gauge", "The current simulation step.",
+                   [([], metrics["step"])])
+        add_metric("steps_per_second", "gauge",
+                   "Steps per second since the start of the run.",
+                   [([], metrics["steps_per_second"])])
+        add_metric("ns_per_day", "gauge",
+                   "Nanoseconds per day since the start of the run.",
+                   [([], metrics["ns_per_day"])])
+        add_metric("recent_ns_per_day", "gauge",
+                   "Nanoseconds per day over the most recent chunks.",
+                   [([], metrics["recent_ns_per_day"])])
+        add_metric("seconds_total", "counter",
+                   "Wall clock seconds spent per activity.",
+                   [(['activity="%s"' % category], seconds)
+                    for category, seconds in metrics["seconds"].items()])
+        add_metric("stage_steps_total", "counter",
+                   "Steps run per GaMD stage.",
+                   [(['stage="%s"' % stage], values["steps"])
+                    for stage, values in metrics["stages"].items()])
+        add_metric("stage_ns_per_day", "gauge",
+                   "Nanoseconds per day of simulation.step() per GaMD "
+                   "stage.",
+                   [(['stage="%s"' % stage], values["ns_per_day"])
+                    for stage, values in metrics["stages"].items()])
+        return "\n".join(lines) + "\n"
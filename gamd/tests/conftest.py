@@ -26,4 +26,4 @@ def amber_alanine_dipeptide_config():
     Create a Config object for alanine dipeptide using the AMBER forcefield.
     """
     
-    return 
\ No newline at end of file
+    return
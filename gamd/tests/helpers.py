@@ -0,0 +1,97 @@
+"""
+helpers.py
+
+Shared functions that build small GaMD systems for the tests.
+"""
+
+import os
+
+from gamd import config
+
+
+def create_small_gamd_simulation(boost_type_str, ntcmdprep=10, ntcmd=40,
+                                 ntebprep=10, nteb=40, ntprod=20, ntave=10,
+                                 platform_name="CPU", fused_force_groups=True,
+                                 optimized_program=True):
+    """
+    Create an OpenMM Simulation of the villin headpiece in vacuum (the test
+    structure bundled with OpenMM) using a GaMD integrator from the
+    integrator factory.  This is small enough to step through all of the
+    GaMD stages within a test.
+    """
+    import openmm
+    import openmm.app as openmm_app
+    import openmm.unit as unit
+    from gamd.integrator_factory import GamdIntegratorFactory
+
+    data_directory = os.path.join(os.path.dirname(openmm_app.__file__), "data")
+    pdb = openmm_app.PDBFile(os.path.join(data_directory, "test.pdb"))
+    modeller = openmm_app.Modeller(pdb.topology, pdb.positions)
+    modeller.deleteWater()
+    forcefield = openmm_app.ForceField("amber14-all.xml",
+                                       "amber14/tip3pfb.xml")
+    system = forcefield.createSystem(modeller.topology,
+                                     nonbondedMethod=openmm_app.NoCutoff,
+                                     constraints=openmm_app.HBonds)
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, system, 300.0 * unit.kelvin,
+        0.002 * unit.picoseconds, ntcmdprep, ntcmd, ntebprep, nteb,
+        ntcmd + nteb + ntprod, ntave, fused_force_groups=fused_force_groups,
+        optimized_program=optimized_program)
+    integrator = result[2]
+    integrator.setRandomNumberSeed(2021)
+    platform = openmm.Platform.getPlatformByName(platform_name)
+    simulation = openmm_app.Simulation(modeller.topology, system, integrator,
+                                       platform)
+    simulation.context.setPositions(modeller.positions)
+    simulation.context.setVelocitiesToTemperature(300.0 * unit.kelvin, 2021)
+    return simulation, result
+
+
+def create_small_gamd_config(directory, boost_type_str="lower-dual",
+                             ntcmdprep=10, ntcmd=40, ntebprep=10, nteb=40,
+                             ntprod=20, ntave=10, interval=10):
+    """
+    Create a Config object for the villin headpiece in vacuum, the same
+    system as create_small_gamd_simulation(), with its structure and output
+    directory in the given directory.
+    """
+    import openmm.app as openmm_app
+    import openmm.unit as unit
+
+    data_directory = os.path.join(os.path.dirname(openmm_app.__file__), "data")
+    pdb = openmm_app.PDBFile(os.path.join(data_directory, "test.pdb"))
+    modeller = openmm_app.Modeller(pdb.topology, pdb.positions)
+    modeller.deleteWater()
+    pdb_filename = os.path.join(directory, "villin.pdb")
+    with open(pdb_filename, "w") as pdb_file:
+        openmm_app.PDBFile.writeFile(modeller.topology, modeller.positions,
+                                     pdb_file)
+
+    myconfig = config.Config()
+    myconfig.temperature = 300.0 * unit.kelvin
+    myconfig.system.nonbonded_method = "nocutoff"
+    myconfig.system.constraints = "hbonds"
+    myconfig.run_minimization = False
+    myconfig.integrator.boost_type = boost_type_str
+    myconfig.integrator.random_seed = 2021
+    number_of_steps = myconfig.integrator.number_of_steps
+    number_of_steps.conventional_md_prep = ntcmdprep
+    number_of_steps.conventional_md = ntcmd
+    number_of_steps.gamd_equilibration_prep = ntebprep
+    number_of_steps.gamd_equilibration = nteb
+    number_of_steps.gamd_production = ntprod
+    number_of_steps.averaging_window_interval = ntave
+    number_of_steps.compute_total_simulation_length()
+    myconfig.input_files.forcefield = config.ForceFieldConfig()
+    myconfig.input_files.forcefield.coordinates = pdb_filename
+    myconfig.input_files.forcefield.forcefield_list_native = [
+        "amber14-all.xml", "amber14/tip3pfb.xml"]
+    myconfig.outputs.directory = os.path.join(directory, "output")
+    reporting = myconfig.outputs.reporting
+    reporting.energy_interval = interval
+    reporting.coordinates_file_type = "dcd"
+    reporting.coordinates_interval = interval
+    reporting.restart_checkpoint_interval = interval
+    reporting.statistics_interval = interval
+    return myconfig
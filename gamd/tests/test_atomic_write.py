@@ -0,0 +1,54 @@
+"""
+test_atomic_write.py
+
+Test the atomic_write.py module.
+"""
+
+import os
+
+import pytest
+
+from gamd.atomic_write import atomic_directory, atomic_write
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    filename = os.path.join(tmp_path, "metrics.json")
+    with open(filename, "w") as old_file:
+        old_file.write("old")
+    with atomic_write(filename) as new_file:
+        new_file.write("new")
+        with open(filename) as current_file:
+            assert current_file.read() == "old"
+    with open(filename) as current_file:
+        assert current_file.read() == "new"
+    assert os.listdir(tmp_path) == ["metrics.json"]
+
+
+def test_failed_atomic_write_keeps_the_old_file(tmp_path):
+    filename = os.path.join(tmp_path, "index.json")
+    with open(filename, "w") as old_file:
+        old_file.write("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(filename, sync=True) as new_file:
+            new_file.write("half")
+            raise RuntimeError("Failing on purpose.")
+    with open(filename) as current_file:
+        assert current_file.read() == "old"
+    assert os.listdir(tmp_path) == ["index.json"]
+
+
+def test_atomic_directory_does_not_replace_a_directory(tmp_path):
+    directory = os.path.join(tmp_path, "entry")
+    with atomic_directory(directory) as temporary_directory:
+        with open(os.path.join(temporary_directory, "system.xml"),
+                  "w") as system_file:
+            system_file.write("first")
+    assert os.listdir(directory) == ["system.xml"]
+    with pytest.raises(OSError):
+        with atomic_directory(directory) as temporary_directory:
+            with open(os.path.join(temporary_directory, "system.xml"),
+                      "w") as system_file:
+                system_file.write("second")
+    with open(os.path.join(directory, "system.xml")) as system_file:
+        assert system_file.read() == "first"
+    assert os.listdir(tmp_path) == ["entry"]
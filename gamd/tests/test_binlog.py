@@ -0,0 +1,83 @@
+"""
+test_binlog.py
+
+Test the binlog.py module.
+"""
+
+import os
+
+import numpy as np
+
+from gamd import binlog
+from gamd import gamdSimulation
+from gamd.GamdLogger import BinaryGamdLogger, GamdLogger
+from gamd.tests.helpers import create_small_gamd_config
+
+
+def write_log(directory, steps, mode="w", buffer_rows=4):
+    writer = binlog.BinaryLogWriter(directory, ["step", "a", "b"], mode,
+                                    {"type": "csv", "header": ["step, a, b"]},
+                                    buffer_rows)
+    for step in steps:
+        writer.append([step, step * 0.5, -step])
+    writer.close()
+
+
+def test_binary_log_reads_columns_by_step_range(tmp_path):
+    directory = os.path.join(tmp_path, "gamd-running.csv.bin")
+    write_log(directory, range(10, 70, 10))
+    write_log(directory, range(70, 110, 10), mode="a")
+    reader = binlog.BinaryLogReader(directory)
+    assert reader.get_number_of_rows() == 10
+    assert len(reader.segments) == 3
+
+    values = reader.read(["a"], first_step=20, last_step=30)
+    assert isinstance(values["a"].base, np.memmap)
+    assert values["a"].tolist() == [10.0, 15.0]
+    values = reader.read(first_step=30, last_step=80)
+    assert values["step"].tolist() == [30.0, 40.0, 50.0, 60.0, 70.0, 80.0]
+    assert values["b"].tolist() == [-30.0, -40.0, -50.0, -60.0, -70.0,
+                                    -80.0]
+
+    text_filename = binlog.convert_to_text(directory)
+    assert text_filename == os.path.join(tmp_path, "gamd-running.csv")
+    with open(text_filename) as text_file:
+        lines = text_file.read().splitlines()
+    assert lines[0] == "step, a, b"
+    assert lines[1] == "10, 5.0, -10.0"
+    assert len(lines) == 11
+
+
+def test_binary_gamd_log_converts_to_the_text_log(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    gamd_simulation = gamdSimulation.GamdSimulationFactory() \
+        .createGamdSimulation(config, "CPU", "0")
+    loggers = []
+    for logger_class, filename in [(GamdLogger, "gamd.log"),
+                                   (BinaryGamdLogger, "binary-gamd.log")]:
+        logger = logger_class(
+            os.path.join(tmp_path, filename), "w",
+            gamd_simulation.integrator, gamd_simulation.simulation,
+            gamd_simulation.first_boost_type,
+            gamd_simulation.first_boost_group,
+            gamd_simulation.second_boost_type,
+            gamd_simulation.second_boost_group)
+        logger.write_header()
+        loggers.append(logger)
+
+    for step in range(10, 110, 10):
+        for logger in loggers:
+            logger.mark_energies()
+        gamd_simulation.simulation.step(10)
+        for logger in loggers:
+            logger.write_to_gamd_log(step)
+    for logger in loggers:
+        logger.close()
+
+    converted_filename = binlog.convert_to_text(
+        os.path.join(tmp_path, "binary-gamd.log.bin"))
+    with open(os.path.join(tmp_path, "gamd.log")) as text_file:
+        text_log = text_file.read()
+    with open(converted_filename) as converted_file:
+        assert converted_file.read() == text_log
+    assert len(text_log.splitlines()) == 13
@@ -0,0 +1,132 @@
+"""
+test_checkpointer.py
+
+Test the checkpointer.py module.
+"""
+
+import os
+
+import pytest
+
+from gamd import gamdSimulation
+from gamd.checkpointer import RESTART_CHECKPOINT_FILENAME, CheckpointWriter, \
+    check_restart_checkpoint, read_checkpoint_header
+from gamd.tests.helpers import create_small_gamd_config, \
+    create_small_gamd_simulation
+
+
+def test_checkpoint_writer_rotates_checkpoints(tmp_path):
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    filename = os.path.join(tmp_path, "gamd_restart.checkpoint")
+    writer = CheckpointWriter(filename, interval=5, keep=3)
+    for chunk in range(4):
+        simulation.step(5)
+        assert writer.is_checkpoint_step(simulation.currentStep)
+        writer.save(simulation)
+    writer.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["gamd_restart.checkpoint",
+                                            "gamd_restart.checkpoint.1",
+                                            "gamd_restart.checkpoint.2"]
+    simulation.loadCheckpoint(filename)
+    assert simulation.integrator.get_step_count() == 20
+    simulation.loadCheckpoint(filename + ".2")
+    assert simulation.integrator.get_step_count() == 10
+
+
+def test_checkpoint_writer_keeps_checkpoint_until_replaced(tmp_path,
+                                                           monkeypatch):
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    filename = os.path.join(tmp_path, "gamd_restart.checkpoint")
+    writer = CheckpointWriter(filename, keep=2, asynchronous=False)
+    simulation.step(5)
+    writer.save(simulation)
+
+    def fail_to_replace(source, destination):
+        raise OSError("Crashed before the new checkpoint was renamed.")
+
+    # A crash between the rotation and the rename of the new checkpoint
+    # still leaves the previous checkpoint to restart from.
+    simulation.step(5)
+    monkeypatch.setattr(os, "replace", fail_to_replace)
+    with pytest.raises(OSError):
+        writer.save(simulation)
+    monkeypatch.undo()
+    check_restart_checkpoint(filename, "CPU",
+                             simulation.system.getNumParticles())
+    simulation.loadCheckpoint(filename)
+    assert simulation.integrator.get_step_count() == 5
+    simulation.loadCheckpoint(filename + ".1")
+    assert simulation.integrator.get_step_count() == 5
+
+
+def test_checkpoint_writer_follows_its_own_interval(tmp_path):
+    filename = os.path.join(tmp_path, "gamd_restart.checkpoint")
+    writer = CheckpointWriter(filename, interval=2000, asynchronous=False)
+    assert not writer.is_checkpoint_step(500)
+    assert writer.is_checkpoint_step(2000)
+    writer = CheckpointWriter(filename, interval=0, wall_clock_minutes=0.0,
+                              asynchronous=False)
+    assert writer.is_checkpoint_step(1)
+    with pytest.raises(ValueError):
+        CheckpointWriter(filename, keep=0)
+
+
+def test_restart_checkpoint_is_checked_before_the_context(tmp_path):
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    number_of_particles = simulation.system.getNumParticles()
+    filename = os.path.join(tmp_path, RESTART_CHECKPOINT_FILENAME)
+    with pytest.raises(ValueError, match="No checkpoint"):
+        check_restart_checkpoint(filename, "CPU", number_of_particles)
+    writer = CheckpointWriter(filename, asynchronous=False)
+    writer.save(simulation)
+    assert read_checkpoint_header(filename) == ("CPU", number_of_particles)
+    check_restart_checkpoint(filename, "cpu", number_of_particles)
+    with pytest.raises(ValueError, match="platform"):
+        check_restart_checkpoint(filename, "Reference", number_of_particles)
+    with pytest.raises(ValueError, match="particles"):
+        check_restart_checkpoint(filename, "CPU", number_of_particles + 1)
+
+
+@pytest.mark.parametrize("header", [
+    b"OpenMM Binary Checkpoint\n\x00\x03",
+    b"OpenMM Binary Checkpoint\n\x00\xff\xff\xff\x7fCPU",
+    b"OpenMM Checkpoint, version 2\n"])
+def test_unrecognized_checkpoint_header_skips_the_check(header, tmp_path,
+                                                         capsys):
+    filename = os.path.join(tmp_path, RESTART_CHECKPOINT_FILENAME)
+    with open(filename, "wb") as checkpoint_file:
+        checkpoint_file.write(header)
+    assert read_checkpoint_header(filename) is None
+    check_restart_checkpoint(filename, "CPU", 100)
+    assert "not recognized" in capsys.readouterr().out
+
+
+def test_restart_skips_the_state_the_checkpoint_replaces(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.run_minimization = True
+    factory = gamdSimulation.GamdSimulationFactory()
+    first = factory.createGamdSimulation(config, "CPU", "0")
+    assert "minimization" in first.startup_seconds
+    first.simulation.step(10)
+    os.makedirs(config.outputs.directory)
+    filename = os.path.join(config.outputs.directory,
+                            RESTART_CHECKPOINT_FILENAME)
+    writer = CheckpointWriter(filename, asynchronous=False)
+    writer.save(first.simulation)
+
+    second = factory.createGamdSimulation(config, "CPU", "0", restart=True)
+    assert "minimization" not in second.startup_seconds
+    assert "velocities" not in second.startup_seconds
+    second.simulation.loadCheckpoint(filename)
+    first_state = first.simulation.context.getState(getPositions=True,
+                                                    getVelocities=True)
+    second_state = second.simulation.context.getState(getPositions=True,
+                                                      getVelocities=True)
+    assert (second_state.getPositions(asNumpy=True) ==
+            first_state.getPositions(asNumpy=True)).all()
+    assert (second_state.getVelocities(asNumpy=True) ==
+            first_state.getVelocities(asNumpy=True)).all()
+
+    with pytest.raises(ValueError, match="platform"):
+        factory.createGamdSimulation(config, "Reference", "0", restart=True)
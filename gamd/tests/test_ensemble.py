@@ -0,0 +1,166 @@
+"""
+test_ensemble.py
+
+Test the ensemble.py module.
+"""
+
+import os
+
+import pytest
+
+from gamd import config as config_module
+from gamd import ensemble
+from gamd.runners import Runner
+from gamd.tests.helpers import create_small_gamd_config
+
+
+class FailingOnceRunner(Runner):
+    """
+    Fail the first time a job is run, after it has written its first
+    checkpoint.
+    """
+    def run(self, restart=False, profile=False):
+        if restart:
+            return super().run(restart, profile)
+        checkpoint_interval = \
+            self.config.outputs.reporting.restart_checkpoint_interval
+        total_simulation_length = \
+            self.config.integrator.number_of_steps.total_simulation_length
+        self.config.integrator.number_of_steps.total_simulation_length = \
+            checkpoint_interval
+        super().run(restart, profile)
+        self.config.integrator.number_of_steps.total_simulation_length = \
+            total_simulation_length
+        raise RuntimeError("Failing on purpose.")
+
+
+class FailingBeforeCheckpointRunner(Runner):
+    """
+    Fail the first time a job is run, after it has created its output
+    directory and before its first checkpoint.
+    """
+    def register_trajectory_reporter(self, restart):
+        marker_filename = self.config.outputs.directory + ".failed"
+        if not os.path.exists(marker_filename):
+            open(marker_filename, "w").close()
+            raise RuntimeError("Failing on purpose.")
+        super().register_trajectory_reporter(restart)
+
+
+class DebugRecordingRunner(Runner):
+    """
+    Record whether the job was run in debug mode, in its output directory.
+    """
+    def run(self, restart=False, profile=False):
+        os.makedirs(self.config.outputs.directory)
+        with open(os.path.join(self.config.outputs.directory, "debug"),
+                  "w") as debug_file:
+            debug_file.write(str(self.debug))
+
+
+def test_cpu_worker_slots_split_the_cores():
+    cpus = ensemble.get_available_cpus()
+    slots = ensemble.create_worker_slots("CPU", ["0"], 1)
+    assert len(slots) == 1
+    assert slots[0].cpu_set == cpus
+    assert slots[0].properties == {"Threads": str(len(cpus))}
+    with pytest.raises(ValueError):
+        ensemble.create_worker_slots("CPU", ["0"], len(cpus) + 1)
+
+
+def test_gpu_worker_slots_follow_the_device_indices():
+    slots = ensemble.create_worker_slots("CUDA", ["0", "1"], 8)
+    assert [slot.device_index for slot in slots] == ["0", "1"]
+    assert all(slot.cpu_set is None for slot in slots)
+
+
+def create_production_config(random_seed):
+    production_config = config_module.Config()
+    production_config.integrator.random_seed = random_seed
+    production_config.outputs.directory = "output/"
+    production_config.input_files.gamd_restart = \
+        config_module.GamdRestartConfig()
+    production_config.input_files.gamd_restart.parameters = \
+        "output/gamd-restart.dat"
+    return production_config
+
+
+def test_replicas_have_their_own_seeds_and_directories():
+    production_config = create_production_config(2021)
+    replica_configs = ensemble.create_replica_configs(production_config, 3)
+    assert [replica_config.outputs.directory for replica_config in
+            replica_configs] == [os.path.join("output/", "replica-%d" % index)
+                                 for index in (1, 2, 3)]
+    assert [replica_config.integrator.random_seed for replica_config in
+            replica_configs] == [2021, 2022, 2023]
+    assert all(replica_config.input_files.gamd_restart.parameters ==
+               "output/gamd-restart.dat" for replica_config in replica_configs)
+    assert production_config.outputs.directory == "output/"
+    assert production_config.integrator.random_seed == 2021
+
+
+def test_replicas_keep_a_random_seed_of_zero():
+    replica_configs = ensemble.create_replica_configs(
+        create_production_config(0), 2)
+    assert [replica_config.integrator.random_seed for replica_config in
+            replica_configs] == [0, 0]
+    with pytest.raises(ValueError):
+        ensemble.create_replica_configs(create_production_config(0), 0)
+
+
+def test_ensemble_restarts_failed_jobs_from_their_checkpoint(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    replica_configs = ensemble.create_replica_configs(config, 2)
+    worker_slots = ensemble.create_worker_slots("CPU", ["0"], 1)
+    launcher = ensemble.EnsembleLauncher("CPU", worker_slots,
+                                         FailingOnceRunner, max_retries=1)
+    jobs = [ensemble.EnsembleJob(replica_config)
+            for replica_config in replica_configs]
+    results = launcher.run(jobs)
+    assert launcher.failed_jobs == []
+    assert [result[0] for result in results] == [
+        replica_config.outputs.directory for replica_config in
+        replica_configs]
+    for job in jobs:
+        assert job.attempts == 2
+        assert job.restart
+        with open(os.path.join(job.get_name(), "gamd.log")) as gamd_log:
+            last_step = gamd_log.readlines()[-1].split()[1]
+        assert int(last_step) == job.get_number_of_steps()
+
+
+def test_ensemble_starts_over_jobs_that_failed_before_a_checkpoint(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.outputs.overwrite_output = False
+    job = ensemble.EnsembleJob(ensemble.create_replica_configs(config, 1)[0])
+    worker_slots = ensemble.create_worker_slots("CPU", ["0"], 1)
+    launcher = ensemble.EnsembleLauncher(
+        "CPU", worker_slots, FailingBeforeCheckpointRunner, max_retries=1)
+    results = launcher.run([job])
+    assert launcher.failed_jobs == []
+    assert len(results) == 1
+    assert job.attempts == 2
+    assert not job.restart
+    with open(os.path.join(job.get_name(), "gamd.log")) as gamd_log:
+        last_step = gamd_log.readlines()[-1].split()[1]
+    assert int(last_step) == job.get_number_of_steps()
+
+
+def test_retry_keeps_an_output_directory_from_before_the_job(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    os.makedirs(config.outputs.directory)
+    job = ensemble.EnsembleJob(config)
+    job.output_existed = True
+    job.prepare_retry()
+    assert not job.restart
+    assert os.path.isdir(config.outputs.directory)
+
+
+def test_ensemble_runs_its_jobs_in_debug_mode(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    worker_slots = ensemble.create_worker_slots("CPU", ["0"], 1)
+    launcher = ensemble.EnsembleLauncher("CPU", worker_slots,
+                                         DebugRecordingRunner, debug=True)
+    launcher.run([ensemble.EnsembleJob(config)])
+    with open(os.path.join(config.outputs.directory, "debug")) as debug_file:
+        assert debug_file.read() == "True"
@@ -0,0 +1,39 @@
+"""
+test_imports.py
+
+Test that the slow imports stay off the paths that do not need them.
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                              "..", ".."))
+
+
+def get_imported_modules(code):
+    output = subprocess.run(
+        [sys.executable, "-c", code + "\nimport sys\n"
+         "print('\\n'.join(sys.modules))"],
+        cwd=ROOT_DIRECTORY, capture_output=True, text=True, check=True)
+    return set(output.stdout.split())
+
+
+def test_gamd_simulation_does_not_import_parmed():
+    modules = get_imported_modules("import gamd.gamdSimulation")
+    assert "gamd.integrator_factory" in modules
+    assert "parmed" not in modules
+
+
+def test_runner_help_does_not_import_openmm_app():
+    modules = get_imported_modules(
+        "import sys, runpy\n"
+        "sys.argv = ['gamdRunner', '--help']\n"
+        "try:\n"
+        "    runpy.run_path('gamdRunner', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass")
+    assert "gamd.parser" in modules
+    assert "openmm.app" not in modules
+    assert "gamd.gamdSimulation" not in modules
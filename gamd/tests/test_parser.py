@@ -61,6 +61,7 @@ def check_config_from_test_input_xml(config):
     assert config.integrator.number_of_steps.gamd_equilibration == 20000
     assert config.integrator.number_of_steps.gamd_production == 30000
     assert config.integrator.number_of_steps.averaging_window_interval == 50
+    assert config.integrator.lean_production == False
     assert config.outputs.directory == "output/"
     assert config.outputs.overwrite_output == True
     assert config.outputs.reporting.energy_interval == 500
@@ -81,4 +82,180 @@ def test_amber_alanine_dipeptide_read_check(tmp_path):
     check_config_from_test_input_xml(config)
     check_config_from_test_amber_input_xml(config)
     
-    
\ No newline at end of file
+    
+def test_restart_checkpoint_interval_is_independent(tmp_path):
+    """
+    An explicit restart-checkpoint interval must not be overridden by the
+    statistics interval, and must survive a rewrite of the configuration.
+    """
+    input_file = os.path.join(TEST_DIRECTORY, "data/dip_amber.xml")
+    with open(input_file) as xml_file:
+        xml_string = xml_file.read()
+    xml_string = xml_string.replace(
+        "<statistics>",
+        "<restart-checkpoint><interval>50000</interval>"
+        "<wall-clock-minutes>30.0</wall-clock-minutes><keep>3</keep>"
+        "</restart-checkpoint><statistics>")
+    checkpoint_file = os.path.join(tmp_path, "dip_amber_checkpoint.xml")
+    with open(checkpoint_file, "w") as xml_file:
+        xml_file.write(xml_string)
+    output_file = os.path.join(tmp_path, "dip_amber_checkpoint_rewrite.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(checkpoint_file)
+    myparser.config.serialize(output_file)
+    myparser2 = parser.XmlParser()
+    myparser2.parse_file(output_file)
+    for config in [myparser.config, myparser2.config]:
+        reporting = config.outputs.reporting
+        assert reporting.statistics_interval == 500
+        assert reporting.restart_checkpoint_interval == 50000
+        assert reporting.restart_checkpoint_wall_clock_minutes == 30.0
+        assert reporting.restart_checkpoint_keep == 3
+
+
+def test_gamd_restart_input_files(tmp_path):
+    """
+    The gamd-restart files to start the production from are part of the
+    input files, and the state file is optional.
+    """
+    input_file = os.path.join(TEST_DIRECTORY, "data/dip_amber.xml")
+    with open(input_file) as xml_file:
+        xml_string = xml_file.read()
+    xml_string = xml_string.replace(
+        "</amber>",
+        "</amber><gamd-restart><parameters>output/gamd-restart.dat"
+        "</parameters><state>output/gamd-restart.xml</state></gamd-restart>")
+    gamd_restart_file = os.path.join(tmp_path, "dip_amber_gamd_restart.xml")
+    with open(gamd_restart_file, "w") as xml_file:
+        xml_file.write(xml_string)
+    output_file = os.path.join(tmp_path, "dip_amber_gamd_restart_rewrite.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(gamd_restart_file)
+    myparser.config.serialize(output_file)
+    myparser2 = parser.XmlParser()
+    myparser2.parse_file(output_file)
+    for config in [myparser.config, myparser2.config]:
+        check_config_from_test_amber_input_xml(config)
+        gamd_restart = config.input_files.gamd_restart
+        assert gamd_restart.parameters == "output/gamd-restart.dat"
+        assert gamd_restart.state == "output/gamd-restart.xml"
+
+    myparser3 = parser.XmlParser()
+    myparser3.parse_file(input_file)
+    assert myparser3.config.input_files.gamd_restart is None
+
+
+def test_binary_log_format(tmp_path):
+    """
+    The log format is read from the reporting tag, and survives a rewrite
+    of the configuration.
+    """
+    input_file = os.path.join(TEST_DIRECTORY, "data/dip_amber.xml")
+    with open(input_file) as xml_file:
+        xml_string = xml_file.read()
+    xml_string = xml_string.replace(
+        "<statistics>", "<log-format>Binary</log-format><statistics>")
+    log_format_file = os.path.join(tmp_path, "dip_amber_log_format.xml")
+    with open(log_format_file, "w") as xml_file:
+        xml_file.write(xml_string)
+    output_file = os.path.join(tmp_path, "dip_amber_log_format_rewrite.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(log_format_file)
+    myparser.config.serialize(output_file)
+    myparser2 = parser.XmlParser()
+    myparser2.parse_file(output_file)
+    for config in [myparser.config, myparser2.config]:
+        assert config.outputs.reporting.log_format == "binary"
+
+
+def test_online_reweighting(tmp_path):
+    """
+    The online reweighting and its reaction coordinates are read from the
+    reporting tag, and survive a rewrite of the configuration.
+    """
+    input_file = os.path.join(TEST_DIRECTORY, "data/dip_amber.xml")
+    with open(input_file) as xml_file:
+        xml_string = xml_file.read()
+    xml_string = xml_string.replace(
+        "<statistics>",
+        "<reweighting><method>Cumulant</method><order>3</order>"
+        "<reaction-coordinate><type>dihedral</type><atoms>4, 6, 8, 14</atoms>"
+        "<minimum>-180</minimum><maximum>180</maximum><bins>36</bins>"
+        "</reaction-coordinate></reweighting><statistics>")
+    reweighting_file = os.path.join(tmp_path, "dip_amber_reweighting.xml")
+    with open(reweighting_file, "w") as xml_file:
+        xml_file.write(xml_string)
+    output_file = os.path.join(tmp_path, "dip_amber_reweighting_rewrite.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(reweighting_file)
+    myparser.config.serialize(output_file)
+    myparser2 = parser.XmlParser()
+    myparser2.parse_file(output_file)
+    for config in [myparser.config, myparser2.config]:
+        reweighting = config.outputs.reporting.reweighting
+        assert reweighting.method == "cumulant"
+        assert reweighting.order == 3
+        reaction_coordinate, = reweighting.reaction_coordinates
+        assert reaction_coordinate.type == "dihedral"
+        assert reaction_coordinate.atoms == [4, 6, 8, 14]
+        assert reaction_coordinate.minimum == -180.0
+        assert reaction_coordinate.maximum == 180.0
+        assert reaction_coordinate.bins == 36
+
+
+def test_system_and_kernel_caches(tmp_path):
+    """
+    The system and kernel caches are read from their own tags, and survive a
+    rewrite of the configuration.
+    """
+    input_file = os.path.join(TEST_DIRECTORY, "data/dip_amber.xml")
+    with open(input_file) as xml_file:
+        xml_string = xml_file.read()
+    xml_string = xml_string.replace(
+        "</gamd>",
+        "<system-cache><directory>cache/</directory><max-size>512</max-size>"
+        "</system-cache><kernel-cache>kernels/</kernel-cache></gamd>")
+    system_cache_file = os.path.join(tmp_path, "dip_amber_system_cache.xml")
+    with open(system_cache_file, "w") as xml_file:
+        xml_file.write(xml_string)
+    output_file = os.path.join(tmp_path, "dip_amber_system_cache_rewrite.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(system_cache_file)
+    assert parser.XmlParser().config.system_cache is None
+    assert parser.XmlParser().config.kernel_cache is None
+    myparser.config.serialize(output_file)
+    myparser2 = parser.XmlParser()
+    myparser2.parse_file(output_file)
+    for config in [myparser.config, myparser2.config]:
+        assert config.system_cache.directory == "cache/"
+        assert config.system_cache.max_size == 512.0
+        assert config.kernel_cache == "kernels/"
+
+
+def test_metrics_are_off_unless_configured(tmp_path):
+    """
+    The metrics file is only written when the reporting tag asks for it, and
+    the setting survives a rewrite of the configuration.
+    """
+    input_file = os.path.join(TEST_DIRECTORY, "data/dip_amber.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(input_file)
+    assert myparser.config.outputs.reporting.metrics_wall_clock_seconds \
+        is None
+    with open(input_file) as xml_file:
+        xml_string = xml_file.read()
+    xml_string = xml_string.replace(
+        "<statistics>",
+        "<metrics><format>Prometheus</format></metrics><statistics>")
+    metrics_file = os.path.join(tmp_path, "dip_amber_metrics.xml")
+    with open(metrics_file, "w") as xml_file:
+        xml_file.write(xml_string)
+    output_file = os.path.join(tmp_path, "dip_amber_metrics_rewrite.xml")
+    myparser = parser.XmlParser()
+    myparser.parse_file(metrics_file)
+    myparser.config.serialize(output_file)
+    myparser2 = parser.XmlParser()
+    myparser2.parse_file(output_file)
+    for config in [myparser.config, myparser2.config]:
+        assert config.outputs.reporting.metrics_wall_clock_seconds == 60.0
+        assert config.outputs.reporting.metrics_format == "prometheus"
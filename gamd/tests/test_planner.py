@@ -0,0 +1,93 @@
+"""
+test_planner.py
+
+Test the planner.py module.
+"""
+
+import os
+
+import pytest
+
+from gamd import planner
+from gamd.tests.helpers import create_small_gamd_config, \
+    create_small_gamd_simulation
+
+
+def test_plan_follows_the_integrator_and_the_schedule(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    plan = planner.plan_run(config, "CPU", number_of_steps=5)
+    assert not os.path.exists(config.outputs.directory)
+    assert plan["number_of_atoms"] == 584
+    assert plan["stages"] == [[1, 0, 10], [2, 11, 40], [3, 41, 50],
+                              [4, 51, 80], [5, 81, 100]]
+    assert plan["chunk_size"] == 10
+    assert plan["round_trips"] == 10
+    assert plan["frames"] == 10
+    assert plan["checkpoints"] == 10
+    assert plan["checkpoint_bytes"] > 0
+    filenames = [output[0] for output in plan["outputs"]]
+    assert filenames == ["output.dcd", "gamd.log"]
+    for filename, rows, header_bytes, row_bytes in plan["outputs"]:
+        assert rows == 10
+        assert row_bytes > 0
+    # A DCD frame holds the three coordinates of each atom as floats.
+    assert plan["outputs"][0][3] >= 584 * 3 * 4
+    assert plan["steps_per_second"] > 0
+    assert plan["measured_stage"] == 1
+    stage_rates = plan["stage_steps_per_second"]
+    assert stage_rates[1] == pytest.approx(plan["steps_per_second"])
+    # The fused program evaluates each group once a step in every stage.
+    assert stage_rates[5] == pytest.approx(stage_rates[1])
+    assert plan["wall_clock_seconds"] == pytest.approx(
+        10 / stage_rates[1] + 30 / stage_rates[2] + 10 / stage_rates[3]
+        + 30 / stage_rates[4] + 20 / stage_rates[5])
+
+
+def test_plan_measures_no_more_steps_than_the_run_has(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    plan = planner.plan_run(config, "CPU", number_of_steps=200)
+    assert plan["measured_stage"] == 5
+    assert plan["wall_clock_seconds"] > 0
+
+
+def test_stage_step_rates_follow_the_force_evaluations():
+    simulation, unused_reporters = create_small_gamd_simulation(
+        "lower-dual", fused_force_groups=False)
+    stage_rates = planner.get_stage_step_rates(simulation.integrator, 1,
+                                               90.0)
+    # Three evaluations a step in the conventional MD stages, four once
+    # the total energy is boosted too.
+    assert stage_rates[1] == pytest.approx(90.0)
+    assert stage_rates[2] == pytest.approx(90.0)
+    assert stage_rates[5] == pytest.approx(67.5)
+
+
+def test_wall_clock_only_counts_the_steps_of_the_run():
+    stage_ranges = [[1, 0, 10], [2, 11, 40], [5, 41, 100]]
+    stage_rates = {1: 10.0, 2: 10.0, 5: 5.0}
+    assert planner.project_wall_clock_seconds(
+        stage_ranges, stage_rates, 0, 100) == pytest.approx(16.0)
+    assert planner.project_wall_clock_seconds(
+        stage_ranges, stage_rates, 40, 100) == pytest.approx(12.0)
+
+
+def test_plan_flags_intervals_that_collapse_the_chunk_size(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.outputs.reporting.restart_checkpoint_interval = 7
+    config.outputs.reporting.boost_history = True
+    config.outputs.reporting.log_format = "binary"
+    plan = planner.plan_run(config, "CPU", number_of_steps=5)
+    assert plan["chunk_size"] == 1
+    assert plan["checkpoints"] == 14
+    assert plan["round_trips"] == 23
+    assert plan["outputs"][1][0] == "gamd.log.bin"
+    assert plan["outputs"][1][3] == 8 * 9
+    assert plan["outputs"][2][0] == "gamd-boost-history.log.bin"
+    assert plan["outputs"][2][1] == 100
+    assert any("chunk size of 1" in warning for warning in plan["warnings"])
+
+
+def test_plan_rejects_invalid_step_counts(tmp_path):
+    config = create_small_gamd_config(str(tmp_path), ntcmd=45)
+    with pytest.raises(ValueError):
+        planner.plan_run(config, "CPU", number_of_steps=5)
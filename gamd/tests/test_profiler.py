@@ -0,0 +1,53 @@
+"""
+test_profiler.py
+
+Test the profiler.py module.
+"""
+
+import os
+
+from gamd import gamdSimulation
+from gamd.profiler import LatencyHistogram, NoOpPhaseProfiler
+from gamd.runners import Runner
+from gamd.tests.helpers import create_small_gamd_config
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for unused_index in range(99):
+        histogram.record(1.0e-3)
+    histogram.record(1.0)
+    assert histogram.count == 100
+    assert histogram.max_seconds == 1.0
+    assert 1.0e-3 <= histogram.get_percentile(50) < 2.0e-3
+    assert histogram.get_percentile(100) == 1.0
+
+
+def test_runner_profiles_phases_and_reporters(tmp_path):
+    # A total boost logs the dihedral energy, which it has to mark itself.
+    config = create_small_gamd_config(str(tmp_path), "lower-total")
+    gamd_simulation = gamdSimulation.GamdSimulationFactory() \
+        .createGamdSimulation(config, "CPU", "0")
+    runner = Runner(config, gamd_simulation, False)
+    runner.run(profile=True)
+    histograms = runner.profiler.histograms
+    for phase in ["simulation.step", "mark_energies", "write_to_gamd_log",
+                  "saveCheckpoint", "report:DCDReporter"]:
+        assert histograms[phase].count > 0
+    assert histograms["write_to_gamd_log"].count == 10
+    assert histograms["mark_energies"].count == 10
+    output_directory = config.outputs.directory
+    assert os.path.exists(os.path.join(output_directory, "profile.pstats"))
+    with open(os.path.join(output_directory, "profile.txt")) as profile_file:
+        assert "report:DCDReporter" in profile_file.read()
+
+
+def test_runner_without_profile_writes_no_profile(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    gamd_simulation = gamdSimulation.GamdSimulationFactory() \
+        .createGamdSimulation(config, "CPU", "0")
+    runner = Runner(config, gamd_simulation, False)
+    runner.run()
+    assert isinstance(runner.profiler, NoOpPhaseProfiler)
+    assert not os.path.exists(os.path.join(config.outputs.directory,
+                                           "profile.txt"))
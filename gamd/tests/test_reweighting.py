@@ -0,0 +1,161 @@
+"""
+test_reweighting.py
+
+Test the reweighting.py module.
+"""
+
+import math
+import os
+
+import numpy as np
+import pytest
+
+from gamd import binlog
+from gamd import config
+from gamd import gamdSimulation
+from gamd import reweighting
+from gamd.runners import DeveloperRunner
+from gamd.tests.helpers import create_small_gamd_config
+
+
+def write_frames(directory, coordinates, boost_potentials, binary=False):
+    """
+    Write a GaMD log with the boost potentials split over its two boost
+    columns, and a file with the reaction coordinates of each frame.
+    """
+    log_filename = os.path.join(directory, "gamd.log")
+    rows = []
+    for step, boost_potential in enumerate(boost_potentials):
+        rows.append([step, -100.0, 50.0, 1.0, 1.0, 0.75 * boost_potential,
+                     0.25 * boost_potential, 0.1, 0.1])
+    if binary:
+        writer = binlog.BinaryLogWriter(
+            binlog.get_binary_log_directory(log_filename),
+            ["step"] + ["column%d" % index for index in range(8)],
+            buffer_rows=7)
+        for row in rows:
+            writer.append(row)
+        writer.close()
+        log_filename = binlog.get_binary_log_directory(log_filename)
+    else:
+        with open(log_filename, "w") as log_file:
+            log_file.write("# ntwx,total_nstep,...\n")
+            for row in rows:
+                log_file.write("\t1\t" + "\t".join(str(value) for value in row)
+                               + "\n")
+    coordinates_filename = os.path.join(directory, "rc.dat")
+    np.savetxt(coordinates_filename, coordinates)
+    return log_filename, coordinates_filename
+
+
+def get_expected_log_probabilities(method, order, beta, boost_potentials):
+    if method == "noweight":
+        return math.log(len(boost_potentials))
+    if method == "exponential":
+        return math.log(np.exp(beta * boost_potentials).sum())
+    if method == "maclaurin":
+        return math.log(sum(((beta * boost_potentials) ** power).sum()
+                            / math.factorial(power)
+                            for power in range(order + 1)))
+    deviations = boost_potentials - boost_potentials.mean()
+    cumulants = [boost_potentials.mean(), (deviations ** 2).mean(),
+                 (deviations ** 3).mean()]
+    return (math.log(len(boost_potentials))
+            + sum(beta ** power / math.factorial(power) * cumulants[power - 1]
+                  for power in range(1, order + 1)))
+
+
+@pytest.mark.parametrize("method,order", [
+    ("noweight", 0), ("exponential", 0), ("maclaurin", 4), ("cumulant", 1),
+    ("cumulant", 2), ("cumulant", 3)])
+def test_pmf_matches_the_direct_calculation(method, order, tmp_path):
+    generator = np.random.default_rng(2021)
+    coordinates = generator.uniform(0.0, 1.0, 500)
+    boost_potentials = generator.gamma(2.0, 1.5, 500)
+    edges = [np.linspace(0.0, 1.0, 6)]
+    beta = 1.0 / (reweighting.BOLTZMANN_CONSTANT * 300.0)
+    # Split the frames over two replicas, read in small chunks.
+    file_pairs = []
+    for replica, frames in enumerate([slice(0, 300), slice(300, 500)]):
+        replica_directory = os.path.join(tmp_path, str(replica))
+        os.makedirs(replica_directory)
+        file_pairs.append(write_frames(replica_directory, coordinates[frames],
+                                       boost_potentials[frames],
+                                       binary=replica == 1))
+    accumulator = reweighting.reweight(file_pairs, [0], edges,
+                                       chunk_size=64)
+    assert accumulator.frames == 500
+    pmf = accumulator.get_pmf(method, order, cutoff=1)
+
+    bins = np.minimum(np.searchsorted(edges[0], coordinates, "right") - 1, 4)
+    expected = np.array([-get_expected_log_probabilities(
+                             method, order, beta,
+                             boost_potentials[bins == index]) / beta
+                         for index in range(5)])
+    expected -= expected.min()
+    assert pmf == pytest.approx(np.minimum(expected, 100.0), abs=1e-6)
+
+
+def test_2d_pmf_and_frame_mismatch(tmp_path):
+    generator = np.random.default_rng(7)
+    coordinates = generator.uniform(-1.0, 1.0, (200, 2))
+    boost_potentials = generator.uniform(0.0, 2.0, 200)
+    log_filename, coordinates_filename = write_frames(
+        str(tmp_path), coordinates, boost_potentials)
+    edges = [np.linspace(-1.0, 1.0, 5), np.linspace(-0.5, 0.5, 3)]
+    accumulator = reweighting.reweight([(log_filename, coordinates_filename)],
+                                       [0, 1], edges)
+    pmf = accumulator.get_pmf("cumulant", cutoff=5)
+    assert pmf.shape == (4, 2)
+    in_range = np.abs(coordinates[:, 1]) <= 0.5
+    assert accumulator.frames_out_of_range == np.count_nonzero(~in_range)
+    assert accumulator.counts.sum() == np.count_nonzero(in_range)
+
+    np.savetxt(coordinates_filename, coordinates[:150])
+    with pytest.raises(ValueError):
+        reweighting.reweight([(log_filename, coordinates_filename)], [0, 1],
+                             edges)
+
+
+def test_online_reweighting_follows_the_reweighting_log(tmp_path):
+    myconfig = create_small_gamd_config(str(tmp_path), ntprod=40)
+    online_config = config.OnlineReweightingConfig()
+    for coordinate_type, atoms, minimum, maximum in [
+            ("distance", [0, 10], 0.0, 100.0),
+            ("dihedral", [4, 6, 8, 14], -180.0, 180.0)]:
+        reaction_coordinate = config.ReactionCoordinateConfig()
+        reaction_coordinate.type = coordinate_type
+        reaction_coordinate.atoms = atoms
+        reaction_coordinate.minimum = minimum
+        reaction_coordinate.maximum = maximum
+        reaction_coordinate.bins = 1
+        online_config.reaction_coordinates.append(reaction_coordinate)
+    myconfig.outputs.reporting.reweighting = online_config
+    gamd_simulation = gamdSimulation.GamdSimulationFactory() \
+        .createGamdSimulation(myconfig, "CPU", "0")
+    DeveloperRunner(myconfig, gamd_simulation, False).run()
+
+    output_directory = myconfig.outputs.directory
+    boost_potentials = np.concatenate(list(reweighting.read_boost_potentials(
+        os.path.join(output_directory, "gamd-reweighting.log"))))
+    state_filename = os.path.join(output_directory, "reweighting-state.npz")
+    accumulator = reweighting.ReweightingAccumulator.load(state_filename)
+    assert accumulator.frames == len(boost_potentials) == 5
+    assert accumulator.frames_out_of_range == 0
+    assert accumulator.means[0] == pytest.approx(boost_potentials.mean(),
+                                                 abs=1e-4)
+    assert accumulator.m2[0] == pytest.approx(
+        ((boost_potentials - boost_potentials.mean()) ** 2).sum(), abs=1e-4)
+    with np.load(state_filename) as arrays:
+        assert int(arrays["last_step"]) == 120
+    assert os.path.exists(os.path.join(output_directory, "pmf-online.dat"))
+
+    # A restart carries on from the saved sums, and skips the frames that
+    # they already hold.
+    reporter = reweighting.OnlineReweightingReporter(
+        10, 80, gamd_simulation.integrator,
+        online_config.reaction_coordinates, myconfig.temperature,
+        state_filename, os.path.join(str(tmp_path), "pmf.dat"), restart=True)
+    assert reporter.accumulator.frames == 5
+    gamd_simulation.simulation.currentStep = 110
+    assert reporter.describeNextReport(gamd_simulation.simulation)[0] == 20
@@ -0,0 +1,91 @@
+"""
+test_scheduler.py
+
+Test the scheduler.py module.
+"""
+
+import pytest
+
+from gamd.scheduler import OutputScheduler
+
+
+def run_schedule(scheduler):
+    stops = []
+    while not scheduler.is_finished():
+        stops.append(scheduler.advance())
+    return stops
+
+
+def test_scheduler_stops_only_where_streams_are_due():
+    scheduler = OutputScheduler(3000)
+    scheduler.add_stream("gamd-log", 700)
+    scheduler.add_stream("checkpoint", 1000)
+    scheduler.add_event("end-of-equilibration", 1250)
+    stops = run_schedule(scheduler)
+    assert stops == [(700, {"gamd-log"}), (1000, {"checkpoint"}),
+                     (1250, {"end-of-equilibration"}),
+                     (1400, {"gamd-log"}), (2000, {"checkpoint"}),
+                     (2100, {"gamd-log"}), (2800, {"gamd-log"}),
+                     (3000, {"checkpoint"})]
+    assert scheduler.get_intervals() == {"gamd-log": 700, "checkpoint": 1000}
+
+
+def test_scheduler_always_stops_at_the_end():
+    scheduler = OutputScheduler(1050)
+    scheduler.add_stream("gamd-log", 500)
+    stops = run_schedule(scheduler)
+    assert stops == [(500, {"gamd-log"}), (1000, {"gamd-log"}), (1050, set())]
+
+
+def test_scheduler_resumes_from_the_restart_step():
+    scheduler = OutputScheduler(2000, start_step=1200)
+    scheduler.add_stream("gamd-log", 500)
+    scheduler.add_event("end-of-equilibration", 1000)
+    stops = run_schedule(scheduler)
+    assert stops == [(1500, {"gamd-log"}), (2000, {"gamd-log"})]
+
+
+@pytest.mark.parametrize("start_step", [0, 333, 4000])
+def test_round_trip_count_matches_the_schedule(start_step):
+    scheduler = OutputScheduler(10007, start_step=start_step)
+    scheduler.add_stream("gamd-log", 6)
+    scheduler.add_stream("checkpoint", 35)
+    scheduler.add_stream("trajectory", 6, passive=True)
+    scheduler.add_stream("statistics", 10, passive=True)
+    scheduler.add_event("end-of-equilibration", 4321)
+    runner_stops = scheduler.count_runner_stops()
+    round_trips = scheduler.count_round_trips()
+
+    stops = run_schedule(scheduler)
+    assert runner_stops == len(stops)
+    expected_round_trips = {step for step, due in stops}
+    expected_round_trips.update(step for step in range(start_step + 1, 10008)
+                                if step % 10 == 0)
+    assert round_trips == len(expected_round_trips)
+
+
+@pytest.mark.parametrize("start_step", [0, 9, 333])
+def test_offset_streams_stop_before_their_multiples(start_step):
+    scheduler = OutputScheduler(1000, start_step=start_step)
+    scheduler.add_stream("gamd-log", 10)
+    scheduler.add_stream("mark-energies", 10, offset=1)
+    scheduler.add_stream("checkpoint", 9)
+    scheduler.add_stream("trajectory", 10, passive=True)
+    runner_stops = scheduler.count_runner_stops()
+    round_trips = scheduler.count_round_trips()
+    assert scheduler.get_intervals() == {"gamd-log": 10, "checkpoint": 9,
+                                         "trajectory": 10}
+
+    stops = run_schedule(scheduler)
+    assert runner_stops == round_trips == len(stops)
+    for step, due in stops:
+        if "mark-energies" in due:
+            assert step % 10 == 9
+    assert ({step for step, due in stops if "mark-energies" in due}
+            == set(range(start_step + 1, 1001)) & set(range(9, 1000, 10)))
+
+
+def test_scheduler_rejects_empty_intervals():
+    scheduler = OutputScheduler(100)
+    with pytest.raises(ValueError):
+        scheduler.add_stream("checkpoint", 0)
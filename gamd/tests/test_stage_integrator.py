@@ -0,0 +1,432 @@
+"""
+test_stage_integrator.py
+
+Test the stage_integrator.py module.
+"""
+
+import os
+
+import numpy as np
+import openmm.unit as unit
+import pytest
+
+from gamd.gamdSimulation import GamdSimulation, GamdSimulationFactory
+from gamd.integrator_factory import GamdIntegratorFactory
+from gamd.langevin.dual_boost_integrators import LowerBoundIntegrator
+from gamd.runners import Runner, read_gamd_production_restart_file, \
+    write_gamd_production_restart_file
+from gamd.stage_integrator import GlobalVariableSnapshot
+from gamd.tests.helpers import create_small_gamd_config, \
+    create_small_gamd_simulation
+
+
+@pytest.mark.parametrize("boost_type_str", [
+    "lower-total", "lower-dihedral", "lower-dual", "upper-nonbonded",
+    "upper-dual-nonbonded-dihedral"])
+def test_fused_integrators_evaluate_each_force_group_once(boost_type_str):
+    simulation, result = create_small_gamd_simulation(boost_type_str)
+    integrator = result[2]
+    evaluations = integrator.get_force_evaluations_per_step()
+    assert evaluations == {1: 1, 2: 1, 3: 1, 4: 1, 5: 1}
+
+
+def test_unfused_dual_boost_evaluates_force_groups_twice():
+    simulation, result = create_small_gamd_simulation(
+        "lower-dual", fused_force_groups=False)
+    integrator = result[2]
+    evaluations = integrator.get_force_group_evaluations_per_step()
+    assert evaluations[1] == {0: 1, 2: 2}
+    assert evaluations[5] == {0: 2, 2: 2}
+
+
+def test_integrators_built_directly_are_not_fused():
+    integrator = LowerBoundIntegrator(2)
+    assert not integrator.fused_force_groups
+    evaluations = integrator.get_force_group_evaluations_per_step()
+    assert evaluations[5] == {0: 2, 2: 2}
+
+
+def turn_off_noise(integrator):
+    integrator.setGlobalVariableByName("thermal_energy", 0.0)
+    integrator.setGlobalVariableByName("noisescale", 0.0)
+
+
+def run_without_noise(boost_type_str, number_of_steps,
+                      fused_force_groups=True):
+    simulation, result = create_small_gamd_simulation(
+        boost_type_str, fused_force_groups=fused_force_groups)
+    integrator = result[2]
+    turn_off_noise(integrator)
+    simulation.step(number_of_steps)
+    state = simulation.context.getState(getPositions=True)
+    return (state.getPositions(asNumpy=True)._value,
+            integrator.get_boost_potentials())
+
+
+def test_fused_and_unfused_integrators_agree():
+    number_of_steps = 70
+    fused_positions, fused_boosts = run_without_noise("lower-dual",
+                                                      number_of_steps)
+    positions, boosts = run_without_noise("lower-dual", number_of_steps,
+                                          fused_force_groups=False)
+    assert np.allclose(fused_positions, positions, atol=1e-8)
+    assert fused_boosts["BoostPotential_Total"] > 0.0
+    for name in boosts:
+        assert fused_boosts[name] == pytest.approx(boosts[name])
+
+
+def step_through_stages(boost_type_str, ntcmdprep, ntebprep,
+                        optimized_program=True):
+    simulation, result = create_small_gamd_simulation(
+        boost_type_str, ntcmdprep, 40, ntebprep, 40, 20,
+        optimized_program=optimized_program)
+    integrator = result[2]
+    turn_off_noise(integrator)
+    stages = []
+    boosts = []
+    for unused_step in range(integrator.nstlim):
+        simulation.step(1)
+        stages.append(integrator.get_stage())
+        boosts.append(integrator.get_boost_potentials())
+    state = simulation.context.getState(getPositions=True)
+    return (integrator, stages, boosts,
+            state.getPositions(asNumpy=True)._value)
+
+
+@pytest.mark.parametrize("boost_type_str,ntcmdprep,ntebprep", [
+    ("lower-dual", 10, 10), ("upper-total", 0, 0),
+    ("lower-dual-nonbonded-dihedral", 0, 10)])
+def test_optimized_program_matches_unoptimized_program(
+        boost_type_str, ntcmdprep, ntebprep):
+    integrator, stages, boosts, positions = step_through_stages(
+        boost_type_str, ntcmdprep, ntebprep)
+    unoptimized_integrator, unoptimized_stages, unoptimized_boosts, \
+        unoptimized_positions = step_through_stages(
+            boost_type_str, ntcmdprep, ntebprep, optimized_program=False)
+
+    expected_stages = [next(stage for stage in range(1, 6)
+                            if not integrator.is_stage_empty(stage)
+                            and integrator.get_stage_start(stage) <= step
+                            <= integrator.get_stage_end(stage))
+                       for step in range(1, integrator.nstlim + 1)]
+    assert stages == unoptimized_stages == expected_stages
+    assert boosts == unoptimized_boosts
+    assert any(value > 0.0 for value in boosts[-1].values())
+    assert np.array_equal(positions, unoptimized_positions)
+
+    computations = integrator.get_computations_per_step()
+    unoptimized_computations = \
+        unoptimized_integrator.get_computations_per_step()
+    assert computations.keys() == unoptimized_computations.keys()
+    for stage in computations:
+        assert computations[stage] < unoptimized_computations[stage]
+
+
+def test_langevin_constants_follow_friction_and_step_size():
+    simulation, result = create_small_gamd_simulation("lower-total")
+    integrator = result[2]
+    integrator.setFriction(5.0 / unit.picoseconds)
+    integrator.setStepSize(0.001 * unit.picoseconds)
+    vscale = np.exp(-0.001 * 5.0)
+    assert integrator.getGlobalVariableByName("collision_rate") == 5.0
+    assert integrator.getGlobalVariableByName("vscale") \
+        == pytest.approx(vscale)
+    assert integrator.getGlobalVariableByName("fscale") \
+        == pytest.approx((1 - vscale) / 5.0)
+    thermal_energy = integrator.thermal_energy.value_in_unit(
+        unit.kilojoules_per_mole)
+    assert integrator.getGlobalVariableByName("noisescale") \
+        == pytest.approx(np.sqrt(thermal_energy * (1 - vscale * vscale)))
+
+
+def test_integrator_keeps_no_per_dof_copies_of_its_own(tmp_path):
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    integrator = result[2]
+    per_dof_names = [integrator.getPerDofVariableName(index)
+                     for index in range(integrator.getNumPerDofVariables())]
+    assert per_dof_names == ["newx"]
+    simulation.step(5)
+    positions = simulation.context.getState(
+        getPositions=True).getPositions(asNumpy=True)._value
+    assert np.array_equal(integrator.get_coordinates(simulation.context),
+                          positions)
+    positions_filename = os.path.join(tmp_path, "positions.csv")
+    integrator.create_positions_file(positions_filename, simulation.context)
+    assert np.allclose(np.loadtxt(positions_filename, delimiter=",",
+                                  skiprows=1)[:, 1:], positions)
+
+
+def create_production_only_integrator(boost_type_str, integrator, system):
+    result = GamdIntegratorFactory.get_integrator(
+        boost_type_str, system, 300.0 * unit.kelvin, integrator.dt, 0, 0, 0,
+        0, integrator.nstlim, integrator.ntave)
+    return result[2]
+
+
+@pytest.mark.parametrize("boost_type_str", ["lower-total", "lower-dual"])
+def test_production_only_integrator_matches_full_integrator(boost_type_str):
+    """
+    Switching to a production only integrator at the end of the GaMD
+    equilibration has to carry on exactly where the full integrator would
+    have, while running a much shorter program.
+    """
+    results = []
+    for switch_integrator in (False, True):
+        simulation, result = create_small_gamd_simulation(boost_type_str)
+        integrator = result[2]
+        turn_off_noise(integrator)
+        simulation.step(integrator.stage_4_end)
+        if switch_integrator:
+            gamd_simulation = GamdSimulation()
+            gamd_simulation.system = simulation.system
+            gamd_simulation.simulation = simulation
+            gamd_simulation.integrator = integrator
+            production_integrator = create_production_only_integrator(
+                boost_type_str, integrator, simulation.system)
+            assert production_integrator.is_production_only()
+            assert list(production_integrator.stage_computations) == [5]
+            assert (production_integrator.getNumComputations()
+                    < integrator.getNumComputations() / 3)
+            gamd_simulation.switch_integrator(production_integrator)
+            assert simulation.integrator is production_integrator
+        simulation.step(20)
+        state = simulation.context.getState(getPositions=True)
+        results.append((state.getPositions(asNumpy=True)._value,
+                        simulation.integrator.get_boost_potentials(),
+                        simulation.integrator.get_step_count(),
+                        simulation.integrator.get_stage()))
+
+    full_positions, full_boosts, full_step_count, full_stage = results[0]
+    positions, boosts, step_count, stage = results[1]
+    assert np.allclose(full_positions, positions, atol=1e-8)
+    assert boosts == pytest.approx(full_boosts)
+    assert step_count == full_step_count == simulation.currentStep
+    assert stage == full_stage == 5
+
+
+def test_production_only_integrator_requires_no_preparation_steps():
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    with pytest.raises(ValueError):
+        GamdIntegratorFactory.get_integrator(
+            "lower-dual", simulation.system, 300.0 * unit.kelvin,
+            0.002 * unit.picoseconds, 10, 0, 0, 0, 100, 10)
+
+
+@pytest.mark.parametrize("boost_type_str", ["lower-total", "upper-dual"])
+def test_production_starts_from_gamd_restart_file(boost_type_str, tmp_path):
+    """
+    A production only integrator that gets its boost parameters from the
+    gamd-restart.dat file of a full run has to boost exactly like the full
+    integrator does in its production stage.
+    """
+    simulation, result = create_small_gamd_simulation(boost_type_str)
+    integrator = result[2]
+    turn_off_noise(integrator)
+    simulation.step(integrator.stage_4_end)
+    write_gamd_production_restart_file(tmp_path, integrator, None, None)
+    state = simulation.context.getState(getPositions=True,
+                                        getVelocities=True)
+
+    production_simulation, production_result = create_small_gamd_simulation(
+        boost_type_str, 0, 0, 0, 0, integrator.nstlim)
+    production_integrator = production_result[2]
+    assert production_integrator.is_production_only()
+    turn_off_noise(production_integrator)
+    production_simulation.context.setState(state)
+    values = read_gamd_production_restart_file(
+        os.path.join(tmp_path, "gamd-restart.dat"))
+    production_integrator.set_production_parameters(values)
+
+    simulation.step(20)
+    production_simulation.step(20)
+    positions = simulation.context.getState(
+        getPositions=True).getPositions(asNumpy=True)._value
+    production_positions = production_simulation.context.getState(
+        getPositions=True).getPositions(asNumpy=True)._value
+    assert np.allclose(positions, production_positions, atol=1e-6)
+    assert (production_integrator.get_boost_potentials()
+            == pytest.approx(integrator.get_boost_potentials()))
+
+
+@pytest.mark.parametrize("boost_type_str", [
+    "lower-total", "upper-total", "lower-dual", "upper-dual",
+    "upper-nonbonded", "lower-dual-nonbonded-dihedral"])
+def test_production_parameters_follow_from_the_statistics(boost_type_str):
+    simulation, result = create_small_gamd_simulation(boost_type_str)
+    integrator = result[2]
+    simulation.step(81)
+    values = integrator.get_production_parameters()
+    statistics = integrator.get_statistics()
+    assert set(values) > set(statistics)
+
+    production_simulation, production_result = create_small_gamd_simulation(
+        boost_type_str, 0, 0, 0, 0, 100)
+    production_integrator = production_result[2]
+    production_integrator.set_production_parameters(statistics)
+    assert (production_integrator.get_production_parameters()
+            == pytest.approx(values, rel=1e-6))
+
+
+def test_production_parameters_must_be_complete():
+    simulation, result = create_small_gamd_simulation("lower-dual", 0, 0, 0,
+                                                      0, 100)
+    integrator = result[2]
+    values = integrator.get_production_parameters()
+    del values["threshold_energy_Total"]
+    with pytest.raises(ValueError):
+        integrator.set_production_parameters(values)
+    values = integrator.get_statistics()
+    del values["Vmax_Dihedral"]
+    with pytest.raises(ValueError):
+        integrator.set_production_parameters(values)
+
+
+@pytest.mark.parametrize("boost_type_str", ["lower-total", "upper-dihedral",
+                                            "lower-dual-nonbonded-dihedral"])
+def test_reported_values_match_the_globals(boost_type_str):
+    simulation, result = create_small_gamd_simulation(boost_type_str)
+    integrator = result[2]
+    simulation.step(70)
+    for values, default in [(integrator.get_force_scaling_factors(), 1.0),
+                            (integrator.get_boost_potentials(), 0.0),
+                            (integrator.get_effective_harmonic_constants(),
+                             0.0),
+                            (integrator.get_statistics(), None),
+                            (integrator.get_production_parameters(), None)]:
+        names = [integrator.getGlobalVariableName(index) for index in
+                 range(integrator.getNumGlobalVariables())]
+        for name, value in values.items():
+            if name in names:
+                assert value == integrator.getGlobalVariableByName(name)
+            else:
+                assert value == default
+
+
+def test_globals_snapshot_follows_the_integrator():
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    integrator = result[2]
+    snapshot = GlobalVariableSnapshot(integrator, ["stepCount", "missing"])
+    assert snapshot.names == ["stepCount"]
+    assert "missing" not in snapshot
+    assert snapshot.get("missing", 1.0) == 1.0
+    simulation.step(3)
+    snapshot.update()
+    assert snapshot["stepCount"] == 3.0
+    assert integrator.get_globals_snapshot("steps", lambda: ["stepCount"]) \
+        is integrator.get_globals_snapshot("steps", lambda: [])
+
+
+@pytest.mark.parametrize("lean_production", [False, True])
+def test_boost_history_logs_every_step(lean_production, tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.integrator.lean_production = lean_production
+    config.outputs.reporting.boost_history = True
+    gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+        config, "CPU", "0")
+    assert gamd_simulation.integrator.boost_history_names == [
+        "stepCount", "BoostPotential_Total", "BoostPotential_Dihedral"]
+    Runner(config, gamd_simulation, False).run()
+
+    output_directory = config.outputs.directory
+    history = np.loadtxt(os.path.join(output_directory,
+                                      "gamd-boost-history.log"),
+                         delimiter=",", comments="#", ndmin=2)
+    assert history[:, 0].tolist() == list(range(1, 101))
+    gamd_log = np.loadtxt(os.path.join(output_directory, "gamd.log"),
+                          comments="#", ndmin=2)
+    logged_rows = history[gamd_log[:, 1].astype(int) - 1]
+    assert logged_rows[:, 1:] == pytest.approx(gamd_log[:, 6:8])
+    assert np.any(history[:, 1] > 0.0)
+
+
+class EnergyRecorder:
+    """
+    Record the total energy and the energy of a force group after every
+    step.
+    """
+    def __init__(self, group):
+        self.group = group
+        self.energies = {}
+
+    def describeNextReport(self, simulation):
+        return 1, False, False, False, True
+
+    def report(self, simulation, state):
+        group_state = simulation.context.getState(getEnergy=True,
+                                                  groups={self.group})
+        self.energies[simulation.currentStep] = [
+            energy.value_in_unit(unit.kilocalories_per_mole) for energy in
+            [state.getPotentialEnergy(), group_state.getPotentialEnergy()]]
+
+
+def test_gamd_log_rows_come_from_one_step(tmp_path):
+    config = create_small_gamd_config(str(tmp_path), "lower-total")
+    gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+        config, "CPU", "0")
+    recorder = EnergyRecorder(gamd_simulation.first_boost_group
+                              or gamd_simulation.second_boost_group)
+    gamd_simulation.simulation.reporters.append(recorder)
+    Runner(config, gamd_simulation, False).run()
+
+    gamd_log_filename = os.path.join(config.outputs.directory, "gamd.log")
+    with open(gamd_log_filename) as gamd_log:
+        header = gamd_log.readlines()[2][2:].strip().split(",")
+    columns = [header.index("Unboosted-Total-Energy"),
+               header.index("Unboosted-Dihedral-Energy")]
+    rows = np.loadtxt(gamd_log_filename, comments="#", ndmin=2)
+    assert len(rows) == 10
+    #
+    # The integrator latches the total energy at the start of the last step
+    # before each row, and the dihedral energy has to be from there too.
+    #
+    for row in rows:
+        assert row[columns] == pytest.approx(
+            recorder.energies[int(row[1]) - 1], rel=1e-5)
+
+
+def test_debug_history_records_every_interval(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.integrator.lean_production = True
+    config.outputs.reporting.debug_interval = 5
+    config.outputs.reporting.debug_globals = ["stage", "windowCount",
+                                              "Vmax_Total", "missing"]
+    gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+        config, "CPU", "0", debug=True)
+    integrator = gamd_simulation.integrator
+    assert integrator.get_globals_history_names("debug") == [
+        "stepCount", "stage", "windowCount", "Vmax_Total"]
+    runner = Runner(config, gamd_simulation, True)
+    runner.run()
+    with open(os.path.join(config.outputs.directory,
+                           "debug.csv")) as debug_file:
+        assert debug_file.readline().strip() \
+            == "stepCount,stage,windowCount,Vmax_Total"
+    rows = np.loadtxt(os.path.join(config.outputs.directory, "debug.csv"),
+                      delimiter=",", skiprows=1, ndmin=2)
+    assert rows[:, 0].tolist() == list(range(5, 101, 5))
+    expected_stages = [next(stage for stage in range(1, 6)
+                            if integrator.get_stage_start(stage) <= step
+                            <= integrator.get_stage_end(stage))
+                       for step in range(5, 101, 5)]
+    assert rows[:, 1].tolist() == expected_stages
+    assert runner.gamd_simulation.integrator.is_production_only()
+
+
+def test_boost_history_keeps_steps_beyond_single_precision(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.outputs.reporting.boost_history = True
+    gamd_simulation = GamdSimulationFactory().createGamdSimulation(
+        config, "CPU", "0")
+    simulation = gamd_simulation.simulation
+    integrator = gamd_simulation.integrator
+    start_step = 2 ** 24 + 10
+    integrator.setGlobalVariableByName("stepCount", start_step)
+    span = integrator.get_globals_history_steps("boost")
+    simulation.step(span + 5)
+    steps = integrator.get_boost_history(start_step)[:, 0]
+    assert steps.tolist() == list(range(start_step + 6,
+                                        start_step + span + 6))
+    with pytest.raises(ValueError, match="single precision"):
+        integrator.add_globals_history("long", [], 2,
+                                       simulation.system.getNumParticles(),
+                                       interval=2 ** 23)
@@ -0,0 +1,74 @@
+"""
+test_statreporter.py
+
+Test the statreporter.py module.
+"""
+
+import os
+
+import pytest
+
+from gamd.statreporter import StatisticsReporter
+from gamd.tests.helpers import create_small_gamd_simulation
+
+
+def read_statistics_rows(filename):
+    with open(filename) as statistics_file:
+        lines = statistics_file.read().splitlines()
+    return lines[0].split(", "), [line.split(", ") for line in lines[1:]]
+
+
+def test_statistics_reporter_only_writes_changed_statistics(tmp_path):
+    """
+    The statistics only change in stages 2 and 4, so rows must only be
+    written while the integrator is in those stages.
+    """
+    simulation, result = create_small_gamd_simulation("lower-dual")
+    integrator = result[2]
+    filename = os.path.join(tmp_path, "gamd-running.csv")
+    reporter = StatisticsReporter(10, filename, integrator, "w")
+    simulation.reporters.append(reporter)
+    simulation.step(integrator.get_total_simulation_steps())
+    reporter.close()
+
+    headers, rows = read_statistics_rows(filename)
+    assert headers[0] == "step"
+    assert "Vmax_Total" in headers and "Vmax_Dihedral" in headers
+    steps = [int(row[0]) for row in rows]
+    assert steps[0] == 1
+    for step in steps[1:]:
+        assert step % 10 == 0
+        assert 10 < step <= integrator.stage_4_end
+    stage_2_length = integrator.stage_2_end - integrator.stage_2_start + 1
+    stage_4_length = integrator.stage_4_end - integrator.stage_4_start + 1
+    assert integrator.get_statistics_update_count() \
+        == stage_2_length + stage_4_length
+    final_values = [float(value) for value in rows[-1][1:]]
+    expected = [integrator.getGlobalVariableByName(name)
+                for name in headers[1:]]
+    assert final_values == pytest.approx(expected)
+
+
+def test_statistics_reporter_skips_fetch_when_counter_is_unchanged(tmp_path):
+    """
+    In stage 1 the update counter never moves, so a report must not fetch
+    any of the tracked globals.
+    """
+    simulation, result = create_small_gamd_simulation("lower-total")
+    integrator = result[2]
+    filename = os.path.join(tmp_path, "gamd-running.csv")
+    reporter = StatisticsReporter(5, filename, integrator, "w")
+    simulation.step(integrator.stage_1_end)
+    fetched_names = []
+    get_global_variable_by_name = integrator.getGlobalVariableByName
+
+    def tracking_get_global_variable_by_name(name):
+        fetched_names.append(name)
+        return get_global_variable_by_name(name)
+
+    integrator.getGlobalVariableByName = tracking_get_global_variable_by_name
+    reporter.record(simulation.currentStep)
+    reporter.close()
+    assert fetched_names == ["statisticsUpdateCount"]
+    headers, rows = read_statistics_rows(filename)
+    assert len(rows) == 1
@@ -0,0 +1,156 @@
+"""
+test_system_cache.py
+
+Test the system_cache.py module.
+"""
+
+import os
+
+import openmm
+import openmm.app as openmm_app
+import openmm.unit as unit
+
+from gamd import config as config_module
+from gamd import gamdSimulation
+from gamd.system_cache import SystemCache, deserialize_topology, \
+    get_directory_size, get_gromacs_include_dir, get_gromacs_include_files, \
+    get_system_cache_directory, get_system_cache_key, serialize_topology
+from gamd.tests.helpers import create_small_gamd_config
+
+
+def create_cached_config(directory):
+    config = create_small_gamd_config(directory)
+    config.system_cache = config_module.SystemCacheConfig()
+    config.system_cache.directory = os.path.join(directory, "cache")
+    return config
+
+
+def create_particle_system(number_of_particles):
+    system = openmm.System()
+    topology = openmm_app.Topology()
+    residue = topology.addResidue("ARG", topology.addChain())
+    for index in range(number_of_particles):
+        system.addParticle(1.0)
+        topology.addAtom("AR", openmm_app.element.argon, residue)
+    return topology, system
+
+
+def test_key_follows_input_file_contents_and_options(tmp_path):
+    config = create_cached_config(str(tmp_path))
+    key = get_system_cache_key(config)
+    assert get_system_cache_key(config) == key
+
+    config.system.constraints = "allbonds"
+    assert get_system_cache_key(config) != key
+    config.system.constraints = "hbonds"
+    assert get_system_cache_key(config) == key
+
+    with open(config.input_files.forcefield.coordinates, "a") as pdb_file:
+        pdb_file.write("REMARK   1 CHANGED\n")
+    assert get_system_cache_key(config) != key
+
+
+def test_default_directory_survives_overwrite_output(tmp_path):
+    config = create_cached_config(str(tmp_path))
+    config.system_cache.directory = ""
+    directory = get_system_cache_directory(config)
+    assert not directory.startswith(
+        os.path.abspath(config.outputs.directory) + os.sep)
+
+
+def test_second_simulation_loads_system_from_cache(tmp_path, monkeypatch):
+    config = create_cached_config(str(tmp_path))
+    factory = gamdSimulation.GamdSimulationFactory()
+    first = factory.createGamdSimulation(config, "Reference", "0")
+    cache = SystemCache(config.system_cache.directory)
+    assert cache.get_keys() == [get_system_cache_key(config)]
+
+    def fail_to_load_system(*args):
+        raise AssertionError("The input files were read again.")
+
+    monkeypatch.setattr(factory, "load_system", fail_to_load_system)
+    second = factory.createGamdSimulation(config, "Reference", "0")
+
+    assert (openmm.XmlSerializer.serialize(second.system) ==
+            openmm.XmlSerializer.serialize(first.system))
+    first_state = first.simulation.context.getState(getEnergy=True,
+                                                    getPositions=True)
+    second_state = second.simulation.context.getState(getEnergy=True,
+                                                      getPositions=True)
+    assert (second_state.getPotentialEnergy() ==
+            first_state.getPotentialEnergy())
+    assert (second_state.getPositions(asNumpy=True) ==
+            first_state.getPositions(asNumpy=True)).all()
+    assert (second.simulation.topology.getNumAtoms() ==
+            first.simulation.topology.getNumAtoms())
+    assert (second.simulation.topology.getNumBonds() ==
+            first.simulation.topology.getNumBonds())
+    entry_directory = cache.get_entry_directory(get_system_cache_key(config))
+    assert sorted(os.listdir(entry_directory)) == [
+        "coordinates.npz", "system.xml", "topology.json"]
+
+
+def test_topology_survives_serialization():
+    data_directory = os.path.join(os.path.dirname(openmm_app.__file__),
+                                  "data")
+    pdb = openmm_app.PDBFile(os.path.join(data_directory, "test.pdb"))
+    topology = pdb.topology
+    topology.setPeriodicBoxVectors([openmm.Vec3(5.0, 0, 0),
+                                    openmm.Vec3(0, 6.0, 0),
+                                    openmm.Vec3(1.0, 0, 7.0)]
+                                   * unit.nanometers)
+    topology_copy = deserialize_topology(serialize_topology(topology))
+    assert ([(atom.name, atom.element, atom.id, atom.residue.name,
+              atom.residue.id, atom.residue.chain.id)
+             for atom in topology_copy.atoms()]
+            == [(atom.name, atom.element, atom.id, atom.residue.name,
+                 atom.residue.id, atom.residue.chain.id)
+                for atom in topology.atoms()])
+    assert ([(bond.atom1.index, bond.atom2.index)
+             for bond in topology_copy.bonds()]
+            == [(bond.atom1.index, bond.atom2.index)
+                for bond in topology.bonds()])
+    assert (topology_copy.getPeriodicBoxVectors()
+            == topology.getPeriodicBoxVectors())
+
+
+def test_gromacs_includes_default_to_the_gromacs_installation(tmp_path,
+                                                              monkeypatch):
+    gromacs_directory = os.path.join(tmp_path, "gromacs")
+    include_dir = os.path.join(gromacs_directory, "top")
+    os.makedirs(os.path.join(include_dir, "amber99.ff"))
+    with open(os.path.join(include_dir, "amber99.ff",
+                           "forcefield.itp"), "w") as itp_file:
+        itp_file.write('#include "ffnonbonded.itp"\n')
+    with open(os.path.join(include_dir, "amber99.ff",
+                           "ffnonbonded.itp"), "w") as itp_file:
+        itp_file.write("[ atomtypes ]\n")
+    topology_filename = os.path.join(tmp_path, "system.top")
+    with open(topology_filename, "w") as topology_file:
+        topology_file.write('#include "amber99.ff/forcefield.itp" ; FF\n')
+    monkeypatch.setenv("GMXDATA", gromacs_directory)
+
+    assert get_gromacs_include_dir("") == include_dir
+    assert get_gromacs_include_files(
+        topology_filename, get_gromacs_include_dir("")) == [
+        os.path.join(include_dir, "amber99.ff", "ffnonbonded.itp"),
+        os.path.join(include_dir, "amber99.ff", "forcefield.itp")]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = SystemCache(str(tmp_path))
+    positions = [openmm.Vec3(0, 0, 0)] * 100 * unit.nanometers
+    for age, key in enumerate(["a", "b", "c"]):
+        topology, system = create_particle_system(100)
+        cache.store(key, topology, system, positions, None)
+        last_used = 1000000 + age
+        os.utime(cache.get_entry_directory(key), (last_used, last_used))
+    assert sorted(cache.get_keys()) == ["a", "b", "c"]
+
+    # Using "a" makes "b" the least recently used entry.
+    assert cache.load("a") is not None
+    cache.max_size_bytes = 2 * get_directory_size(
+        cache.get_entry_directory("a"))
+    assert cache.evict() == ["b"]
+    assert cache.load("b") is None
+    assert sorted(cache.get_keys()) == ["a", "c"]
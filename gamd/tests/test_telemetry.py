@@ -0,0 +1,76 @@
+"""
+test_telemetry.py
+
+Test the telemetry.py module.
+"""
+
+import json
+import os
+
+import openmm.unit as unit
+import pytest
+
+from gamd import gamdSimulation
+from gamd.runners import Runner
+from gamd.telemetry import RunMetrics
+from gamd.tests.helpers import create_small_gamd_config
+
+
+def test_chunks_are_split_across_stages():
+    run_metrics = RunMetrics(0.002 * unit.picoseconds, 0,
+                             [[1, 1, 10], [2, 11, 40], [5, 41, 60]])
+    run_metrics.add_time("reporters", 0.5)
+    run_metrics.add_chunk(20, 2.5)
+    run_metrics.add_chunk(60, 4.0)
+    metrics = run_metrics.get_metrics()
+    assert metrics["step"] == 60
+    assert metrics["steps"] == 60
+    assert metrics["seconds"]["reporters"] == pytest.approx(0.5)
+    assert metrics["seconds"]["simulation-step"] == pytest.approx(6.0)
+    stages = metrics["stages"]
+    assert {stage: values["steps"] for stage, values in stages.items()} \
+        == {"1": 10, "2": 30, "5": 20}
+    assert stages["1"]["seconds"] == pytest.approx(1.0)
+    assert stages["2"]["seconds"] == pytest.approx(1.0 + 2.0)
+    assert stages["5"]["seconds"] == pytest.approx(2.0)
+    assert stages["5"]["steps_per_second"] == pytest.approx(10.0)
+    assert stages["5"]["ns_per_day"] == pytest.approx(
+        10.0 * 0.002e-3 * 3600 * 24)
+
+
+def test_unknown_metrics_format():
+    with pytest.raises(ValueError):
+        RunMetrics(0.002 * unit.picoseconds, file_format="csv")
+
+
+def test_prometheus_metrics_file(tmp_path):
+    filename = os.path.join(tmp_path, "metrics.prom")
+    run_metrics = RunMetrics(0.002 * unit.picoseconds, 0, [[5, 1, 100]],
+                             filename=filename, file_format="prometheus")
+    run_metrics.add_chunk(100, 1.0)
+    run_metrics.write()
+    with open(filename) as metrics_file:
+        lines = metrics_file.read().splitlines()
+    directory_label = 'directory="%s"' % str(tmp_path)
+    assert "gamd_step{%s} 100.0" % directory_label in lines
+    assert ('gamd_stage_steps_total{%s,stage="5"} 100.0' % directory_label
+            in lines)
+    assert not os.path.exists(filename + ".tmp")
+
+
+def test_runner_writes_metrics_file(tmp_path):
+    config = create_small_gamd_config(str(tmp_path))
+    config.outputs.reporting.metrics_wall_clock_seconds = 60.0
+    gamd_simulation = gamdSimulation.GamdSimulationFactory() \
+        .createGamdSimulation(config, "CPU", "0")
+    runner = Runner(config, gamd_simulation, False)
+    runner.run()
+    with open(os.path.join(config.outputs.directory,
+                           "metrics.json")) as metrics_file:
+        metrics = json.load(metrics_file)
+    assert metrics["step"] == 100
+    assert sorted(metrics["stages"]) == ["1", "2", "3", "4", "5"]
+    assert sum(values["steps"] for values in metrics["stages"].values()) \
+        == 100
+    assert metrics["seconds"]["simulation-step"] > 0.0
+    assert runner.metrics.get_metrics()["step"] == 100
@@ -0,0 +1,42 @@
+"""
+test_utils.py
+
+Test the utils.py module.
+"""
+
+import io
+
+import pytest
+import openmm.unit as unit
+
+from gamd import utils
+from gamd.tests.helpers import create_small_gamd_simulation
+
+
+def test_expanded_state_data_reporter_breaks_out_force_groups():
+    simulation, unused_result = create_small_gamd_simulation(
+        "lower-dual-nonbonded-dihedral")
+    system = simulation.system
+    output = io.StringIO()
+    reporter = utils.ExpandedStateDataReporter(
+        system, output, 1, step=True, brokenOutForceEnergies=True)
+    simulation.reporters.append(reporter)
+    simulation.step(1)
+
+    # The step, the potential energy and then the breakdown.
+    header, values = output.getvalue().splitlines()
+    assert "Potential Energy" in header.split(",")[1]
+    columns = header.split(",")[2:]
+    potential_energy, *energies = [float(value)
+                                   for value in values.split(",")[1:]]
+    assert sum(energies) == pytest.approx(potential_energy, abs=1.0e-3)
+    groups = sorted(set(force.getForceGroup() for force in system.getForces()))
+    assert groups == [0, 1, 2]
+    assert len(columns) == len(groups)
+    assert "PeriodicTorsionForce" in columns[2].strip('"')
+    assert "NonbondedForce" in columns[1].strip('"')
+    for group, energy in zip(groups, energies):
+        expected = simulation.context.getState(
+            getEnergy=True, groups={group}).getPotentialEnergy() \
+            .value_in_unit(unit.kilojoules_per_mole)
+        assert abs(energy - expected) < 1.0e-3 * max(1.0, abs(expected))